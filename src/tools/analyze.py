@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+
+# Note:   Analyse the measurements of a run or a whole campaign
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import argparse
+import functools
+import json
+import os
+import resource
+import sys
+import time
+
+import pandas as pd
+
+from libs import cachelib
+from libs import campaignlib
+from libs import logger as blade_logger
+from libs import tools
+
+##################################################################
+# MAIN
+##################################################################
+
+
+def main(args):
+
+    start_time = time.perf_counter()
+
+    # log output to a logfile if enabled
+    if args.log_output:
+        filename = os.path.join(args.output, "log.txt")
+        tools.ensure_path(args.output, clear=True)
+        blade_logger.add_file_handler(log_file=filename)
+
+    # set log-level if specified
+    if args.log_level:
+        blade_logger.set_logging_level(level=args.log_level)
+
+    blade_logger.logger.info("Analyze")
+
+    if not os.path.isdir(args.path):
+        blade_logger.logger.critical(f"Error: '{args.path}' is not a directory.")
+        sys.exit(1)
+
+    # cache results across invocations, unless disabled
+    cache = None
+    if not args.no_cache:
+        cache = cachelib.AnalysisCache(path=args.cache_path, content_hash=args.content_hash)
+
+    # works for a single run too, as the run directory is discovered as the only run
+    analyze_func = functools.partial(campaignlib.analyze_run, include_stages=True)
+    summary = campaignlib.analyze_campaign(args.path, workers=args.workers, analyze_func=analyze_func, cache=cache)
+
+    # split per-stage breakdowns into their own table
+    stage_rows = []
+    if "stage_breakdown" in summary.columns:
+        for stage_breakdown in summary["stage_breakdown"].dropna():
+            stage_rows.extend(stage_breakdown)
+        summary = summary.drop(columns=["stage_breakdown"])
+    stages = pd.DataFrame(stage_rows)
+
+    # write outputs
+    tools.ensure_path(args.output)
+    summary_file = __write_table(summary, args.output, "summary", args.format)
+    stages_file = __write_table(stages, args.output, "stages", args.format)
+
+    # report analysis cost
+    wall_time = time.perf_counter() - start_time
+    peak_memory_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # in MB (Linux reports KB)
+    peak_memory_workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024  # in MB (largest worker)
+
+    cost = {
+        "runs": len(summary),
+        "failed_runs": int(summary["error"].notna().sum()) if len(summary) > 0 else 0,
+        "wall_time_sec": wall_time,
+        "peak_memory_mb": peak_memory_self,
+        "peak_worker_memory_mb": peak_memory_workers,
+    }
+    cost_file = os.path.join(args.output, "analysis_cost.json")
+    with open(cost_file, "w", encoding="utf-8") as f:
+        json.dump(cost, f, indent=4)
+
+    blade_logger.logger.info(f"Summary: {summary_file}")
+    blade_logger.logger.info(f"Stages: {stages_file}")
+    blade_logger.logger.info(f"Done! Analysed {cost['runs']} runs in {wall_time:.2f} secs (peak memory: {peak_memory_self:.1f} MB, workers: {peak_memory_workers:.1f} MB).")
+
+
+# write a table in the chosen format, returns the filename
+def __write_table(df, output_path, name, format):
+
+    filename = os.path.join(output_path, f"{name}.{format}")
+
+    if format == "csv":
+        df.to_csv(filename, index=False)
+
+    elif format == "json":
+        df.to_json(filename, orient="records", indent=4)
+
+    return filename
+
+
+# argument parser
+def __parse_arguments(args):
+
+    parser = argparse.ArgumentParser(
+        description="Analyse the measurements (energy, discharge, stages, CPU and memory) of a run or a whole campaign."
+    )
+
+    parser.add_argument(
+        dest="path",
+        help="Run directory, or campaign directory containing multiple runs (discovered recursively).",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="analysis",
+        help="Output folder for the summary and stages tables. Default is 'analysis'.",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["csv", "json"],
+        default="csv",
+        help="Output file format. Default is 'csv'.",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of parallel worker processes. Default is the number of CPUs.",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write cached analysis results.",
+    )
+
+    parser.add_argument(
+        "--cache-path",
+        default=cachelib.DEFAULT_CACHE_PATH,
+        help=f"Folder of the analysis cache. Default is '{cachelib.DEFAULT_CACHE_PATH}'.",
+    )
+
+    parser.add_argument(
+        "--content-hash",
+        action="store_true",
+        help="Detect changed files by hashing their content instead of comparing size and modification time (slower).",
+    )
+
+    parser.add_argument(
+        "--log-output",
+        required=False,
+        action='store_true',
+        help="Set flag to write logging output to a log file located in the output folder. Default is False.",
+    )
+
+    parser.add_argument(
+        "--log-level",
+        choices=["debug", "info", "warning", "error", "critical"],
+        default="",
+        help="This flag allows to change the log-level. By default only levels higher than warning will be written to the log.",
+    )
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    # parse args
+    arguments = __parse_arguments(sys.argv[1:])
+    main(arguments)
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+
+# Note:   Check and benchmark the dumpsys parsers against the fixtures corpus (one folder per Android version)
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from libs import dumpsyslib
+from libs import logger as blade_logger
+
+# get current file path
+__location__ = os.path.dirname(os.path.realpath(__file__))
+
+PARSERS = {
+    "battery": dumpsyslib.parse_battery,
+    "meminfo": dumpsyslib.parse_meminfo,
+    "netstats": dumpsyslib.parse_netstats,
+    "display": dumpsyslib.parse_display,
+    "activity": dumpsyslib.parse_activity,
+    "gfxinfo": dumpsyslib.parse_gfxinfo,
+}
+
+##################################################################
+# MAIN
+##################################################################
+
+
+def main(args):
+
+    # set log-level if specified
+    if args.log_level:
+        blade_logger.set_logging_level(level=args.log_level)
+
+    if not os.path.isdir(args.fixtures):
+        blade_logger.logger.critical(f"Error: '{args.fixtures}' is not a directory.")
+        sys.exit(1)
+
+    failures = 0
+    print(f"{'version':<12} {'service':<10} {'size (KB)':>10} {'time (us)':>10} {'MB/s':>8}  result")
+
+    for version in sorted(os.listdir(args.fixtures)):
+        path = os.path.join(args.fixtures, version)
+        if not os.path.isdir(path):
+            continue
+
+        expected = __read_expected(path)
+        for service, parser in PARSERS.items():
+
+            filename = os.path.join(path, f"{service}.txt")
+            if not os.path.exists(filename):
+                continue
+
+            with open(filename) as f:
+                text = f.read()
+
+            # compare with the expected output (json round trip, so that e.g. tuples and int keys match)
+            parsed = json.loads(json.dumps(parser(text)))
+            if service not in expected:
+                result = "no expected output"
+            elif parsed == expected[service]:
+                result = "ok"
+            else:
+                result = "MISMATCH"
+                failures += 1
+                blade_logger.logger.error(f"Error: {version}/{service}: expected {expected[service]}, parsed {parsed}")
+
+            start_time = time.perf_counter()
+            for _ in range(args.repeat):
+                parser(text)
+            elapsed_time = (time.perf_counter() - start_time) / args.repeat
+
+            size = len(text.encode())
+            print(f"{version:<12} {service:<10} {size / 1024:>10.1f} {elapsed_time * 1e6:>10.1f} {size / elapsed_time / 1e6:>8.1f}  {result}")
+
+    if failures > 0:
+        blade_logger.logger.error(f"Error: {failures} parser output(s) do not match the expected ones.")
+        sys.exit(1)
+
+
+# read the expected parser outputs of an Android version, if available
+def __read_expected(path):
+
+    filename = os.path.join(path, "expected.json")
+    if not os.path.exists(filename):
+        return {}
+
+    with open(filename) as f:
+        return json.load(f)
+
+
+# argument parser
+def __parse_arguments(args):
+
+    parser = argparse.ArgumentParser(
+        description="Check the dumpsys parsers against the fixtures corpus and measure their parsing time."
+    )
+
+    parser.add_argument(
+        "--fixtures",
+        default=os.path.join(__location__, "fixtures", "dumpsys"),
+        help="Fixtures folder, containing one folder per Android version with '<service>.txt' dumpsys outputs "
+             "and an 'expected.json' file. Default is 'fixtures/dumpsys'.",
+    )
+
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1000,
+        help="Number of times each fixture is parsed when measuring the parsing time. Default is 1000.",
+    )
+
+    parser.add_argument(
+        "--log-level",
+        choices=["debug", "info", "warning", "error", "critical"],
+        default="",
+        help="This flag allows to change the log-level. By default only levels higher than warning will be written to the log.",
+    )
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    # parse args
+    arguments = __parse_arguments(sys.argv[1:])
+    main(arguments)
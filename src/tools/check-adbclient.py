@@ -0,0 +1,341 @@
+#!/usr/bin/python3
+
+# Note:   Check the adb server protocol client (adbclientlib) and the 'native' adb_commands backend against a local
+#         fake adb server, which runs device commands in a host shell and serves sync requests from a host folder
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import argparse
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+from libs import adbclientlib
+from libs.automation import adb_commands
+from libs import logger as blade_logger
+
+FAKE_DEVICE_SERIAL = "FAKE0001"
+
+
+class FakeAdbServer:
+
+    def __init__(self, root_path):
+        """
+        Minimal adb server, implementing the requests used by adbclientlib: host:version, host:devices,
+        host:connect, host:disconnect, host-serial forwards, host:transport (for a single device) with
+        shell v2, exec and sync (STAT, RECV, SEND).
+
+        Args:
+            root_path (str): Host folder used as the device's file system root by the sync requests
+        """
+        self.root_path = root_path
+        self.devices = {FAKE_DEVICE_SERIAL: "device"}
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self.__serve, name="fake-adb-server", daemon=True).start()
+
+    def stop(self):
+        self.sock.close()
+
+    def __serve(self):
+        while True:
+            try:
+                connection, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.__handle, args=(connection,), daemon=True).start()
+
+    def __handle(self, connection):
+        with connection:
+            try:
+                self.__handle_request(connection, self.__read_request(connection))
+            except (EOFError, OSError):
+                pass
+
+    def __handle_request(self, connection, request):
+
+        if request == "host:version":
+            self.__send_okay(connection, b"0029")
+        elif request == "host:devices":
+            self.__send_okay(connection, "".join(f"{serial}\t{state}\n" for serial, state in self.devices.items()).encode())
+        elif request.startswith("host:connect:"):
+            self.__send_okay(connection, f"connected to {request[len('host:connect:'):]}".encode())
+        elif request.startswith("host:disconnect:"):
+            self.__send_okay(connection, f"disconnected {request[len('host:disconnect:'):]}".encode())
+        elif request.startswith("host-serial:") and ":forward:" in request:
+            connection.sendall(b"OKAYOKAY")
+        elif request.startswith("host:transport:"):
+            if self.devices.get(request[len("host:transport:"):]) != "device":
+                self.__send_fail(connection, "device not found")
+                return
+            connection.sendall(b"OKAY")
+            self.__handle_device_request(connection, self.__read_request(connection))
+        else:
+            self.__send_fail(connection, f"unknown request '{request}'")
+
+    def __handle_device_request(self, connection, request):
+
+        if request.startswith("shell,v2,raw:"):
+            connection.sendall(b"OKAY")
+            stdin = b""
+            while True:
+                packet_id, length = struct.unpack("<BI", _read_exact(connection, 5))
+                data = _read_exact(connection, length)
+                if packet_id == adbclientlib.SHELL_ID_STDIN:
+                    stdin += data
+                elif packet_id == adbclientlib.SHELL_ID_CLOSE_STDIN:
+                    break
+
+            process = subprocess.run(["sh", "-c", request[len("shell,v2,raw:"):]], input=stdin, capture_output=True)
+            for packet_id, data in [(adbclientlib.SHELL_ID_STDOUT, process.stdout), (adbclientlib.SHELL_ID_STDERR, process.stderr)]:
+                if data:
+                    connection.sendall(struct.pack("<BI", packet_id, len(data)) + data)
+            connection.sendall(struct.pack("<BIB", adbclientlib.SHELL_ID_EXIT, 1, process.returncode & 0xFF))
+
+        elif request.startswith("exec:"):
+            connection.sendall(b"OKAY")
+            connection.sendall(subprocess.run(["sh", "-c", request[len("exec:"):]], capture_output=True).stdout)
+
+        elif request == "sync:":
+            connection.sendall(b"OKAY")
+            self.__handle_sync_request(connection)
+
+        else:
+            self.__send_fail(connection, f"unknown device request '{request}'")
+
+    def __handle_sync_request(self, connection):
+
+        sync_id, length = struct.unpack("<4sI", _read_exact(connection, 8))
+        argument = _read_exact(connection, length).decode()
+
+        if sync_id == b"STAT":
+            path = self.__get_path(argument)
+            if os.path.exists(path):
+                st = os.stat(path)
+                connection.sendall(b"STAT" + struct.pack("<III", st.st_mode, st.st_size, int(st.st_mtime)))
+            else:
+                connection.sendall(b"STAT" + struct.pack("<III", 0, 0, 0))
+
+        elif sync_id == b"RECV":
+            path = self.__get_path(argument)
+            if not os.path.isfile(path):
+                message = f"remote object '{argument}' does not exist".encode()
+                connection.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                return
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(adbclientlib.SYNC_DATA_MAX_SIZE), b""):
+                    connection.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+            connection.sendall(b"DONE" + struct.pack("<I", 0))
+
+        elif sync_id == b"SEND":
+            path = self.__get_path(argument.rsplit(",", 1)[0])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                while True:
+                    sync_id, length = struct.unpack("<4sI", _read_exact(connection, 8))
+                    if sync_id == b"DONE":
+                        break
+                    f.write(_read_exact(connection, length))
+            connection.sendall(b"OKAY" + struct.pack("<I", 0))
+
+    def __get_path(self, remote_path):
+        return os.path.join(self.root_path, remote_path.lstrip("/"))
+
+    def __read_request(self, connection):
+        length = int(_read_exact(connection, 4), 16)
+        return _read_exact(connection, length).decode()
+
+    def __send_okay(self, connection, payload):
+        connection.sendall(b"OKAY" + f"{len(payload):04x}".encode() + payload)
+
+    def __send_fail(self, connection, message):
+        connection.sendall(b"FAIL" + f"{len(message):04x}".encode() + message.encode())
+
+
+# read exactly length bytes from a socket
+def _read_exact(connection, length):
+    data = b""
+    while len(data) < length:
+        chunk = connection.recv(length - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+
+##################################################################
+# CHECKS
+##################################################################
+
+
+# returns a list of (name, check) tuples. Each check raises (e.g. AssertionError) on failure.
+def __get_checks(client, slow_client, root_path):
+
+    device = {"adb_identifier": FAKE_DEVICE_SERIAL}
+    local_filename = os.path.join(root_path, "local.bin")
+    data = os.urandom(3 * adbclientlib.SYNC_DATA_MAX_SIZE + 123)
+
+    def check_host_commands():
+        assert client.version() == 0x29
+        assert client.devices() == {FAKE_DEVICE_SERIAL: "device"}
+        assert client.connect("10.0.0.2:5555") == "connected to 10.0.0.2:5555"
+        client.forward(FAKE_DEVICE_SERIAL, "tcp:7100", "tcp:7100")
+
+    def check_unknown_device():
+        try:
+            client.shell("UNKNOWN", "true")
+        except adbclientlib.AdbClientError as e:
+            assert not e.command_sent
+            return
+        raise AssertionError("no error raised")
+
+    def check_shell():
+        assert client.shell(FAKE_DEVICE_SERIAL, "echo out; echo err >&2; exit 3") == (b"out\n", b"err\n", 3)
+        assert client.shell(FAKE_DEVICE_SERIAL, "cat", stdin=data)[0] == data
+
+    def check_exec_out():
+        assert client.exec_out(FAKE_DEVICE_SERIAL, "printf '\\000\\001\\002'") == b"\x00\x01\x02"
+
+        # streamed to a file object
+        with open(local_filename, "w+b") as f:
+            assert client.exec_out(FAKE_DEVICE_SERIAL, f"head -c {len(data)} /dev/zero", output=f) == len(data)
+            f.seek(0)
+            assert f.read() == bytes(len(data))
+
+    def check_sync():
+        with open(local_filename, "wb") as f:
+            f.write(data)
+        client.push(FAKE_DEVICE_SERIAL, local_filename, "/data/local/tmp/")
+        assert client.stat(FAKE_DEVICE_SERIAL, "/data/local/tmp/local.bin")[1] == len(data)
+        assert client.stat(FAKE_DEVICE_SERIAL, "/data/local/tmp/missing")[0] == 0
+
+        pulled_filename = os.path.join(root_path, "pulled.bin")
+        client.pull(FAKE_DEVICE_SERIAL, "/data/local/tmp/local.bin", pulled_filename)
+        with open(pulled_filename, "rb") as f:
+            assert f.read() == data
+
+    def check_pull_missing():
+        try:
+            client.pull(FAKE_DEVICE_SERIAL, "/data/local/tmp/missing", os.path.join(root_path, "missing"))
+        except adbclientlib.AdbClientError:
+            return
+        raise AssertionError("no error raised")
+
+    def check_shell_timeout():
+        try:
+            slow_client.shell(FAKE_DEVICE_SERIAL, "sleep 2")
+        except adbclientlib.AdbClientError as e:
+            assert e.command_sent
+            return
+        raise AssertionError("no error raised")
+
+    def check_native_backend():
+        assert adb_commands.run_adb_command(device, "usb", "shell echo hello") == "hello"
+        assert adb_commands.run_adb_batch(device, "usb", ["echo a", "false"]) == [("a", 0), ("", 1)]
+        try:
+            adb_commands.run_adb_command(device, "usb", "shell exit 2")
+        except subprocess.CalledProcessError as e:
+            assert e.returncode == 2
+            return
+        raise AssertionError("no error raised")
+
+    def check_native_backend_in_flight_error():
+        # a command that timed out on the device must not be run again with the adb binary
+        adb_commands.adb_client = slow_client
+        try:
+            adb_commands.run_adb_command(device, "usb", "shell sleep 2")
+        except adbclientlib.AdbClientError:
+            return
+        finally:
+            adb_commands.adb_client = client
+        raise AssertionError("no error raised")
+
+    return [
+        ("host commands", check_host_commands),
+        ("unknown device", check_unknown_device),
+        ("shell v2", check_shell),
+        ("exec-out", check_exec_out),
+        ("sync push/pull/stat", check_sync),
+        ("sync pull of a missing file", check_pull_missing),
+        ("shell timeout", check_shell_timeout),
+        ("native backend", check_native_backend),
+        ("native backend, in-flight error", check_native_backend_in_flight_error),
+    ]
+
+
+##################################################################
+# MAIN
+##################################################################
+
+
+def main(args):
+
+    # set log-level if specified
+    if args.log_level:
+        blade_logger.set_logging_level(level=args.log_level)
+
+    with tempfile.TemporaryDirectory() as root_path:
+        server = FakeAdbServer(root_path)
+        server.start()
+
+        client = adbclientlib.AdbClient(port=server.port)
+        slow_client = adbclientlib.AdbClient(port=server.port, timeout=args.timeout)
+        adb_commands.adb_client = client
+        adb_commands.set_backend("native")
+
+        failures = 0
+        for name, check in __get_checks(client, slow_client, root_path):
+            try:
+                check()
+                result = "ok"
+            except Exception as e:
+                result = "FAILED"
+                failures += 1
+                blade_logger.logger.error(f"Error: {name}: {e!r}")
+            print(f"{name:<40} {result}")
+
+        server.stop()
+
+    if failures > 0:
+        blade_logger.logger.error(f"Error: {failures} check(s) failed.")
+        sys.exit(1)
+
+
+# argument parser
+def __parse_arguments(args):
+
+    parser = argparse.ArgumentParser(
+        description="Check the adb server protocol client and the 'native' adb backend against a local fake adb server."
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=0.5,
+        help="Socket timeout of the client used in the timeout checks, in seconds. Default is 0.5 sec.",
+    )
+
+    parser.add_argument(
+        "--log-level",
+        choices=["debug", "info", "warning", "error", "critical"],
+        default="",
+        help="This flag allows to change the log-level. By default only levels higher than warning will be written to the log.",
+    )
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    # parse args
+    arguments = __parse_arguments(sys.argv[1:])
+    main(arguments)
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+
+# Note:   Collect SW-based measurements (CPU utilization and frequency, battery current and voltage) from an Android device,
+#         using a single long-running sampling loop on the device (see adbsamplerlib)
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import argparse
+import os
+import signal
+import sys
+
+from libs import adbregistrylib
+from libs import adbsamplerlib
+from libs import constants
+from libs import logger as blade_logger
+
+##################################################################
+# MAIN
+##################################################################
+
+
+def main(args):
+
+    # set log-level if specified
+    if args.log_level:
+        blade_logger.set_logging_level(level=args.log_level)
+
+    if args.interval <= 0:
+        blade_logger.logger.critical("Error: Interval must be positive.")
+        sys.exit(1)
+
+    if args.mode == "cores" and not args.output.endswith(".parquet"):
+        blade_logger.logger.critical("Error: Output of the 'cores' mode must be a .parquet file.")
+        sys.exit(1)
+
+    sampler = adbsamplerlib.AdbSampler(args.device_id, interval=args.interval, sw_power_enabled=args.sw_power,
+                                       mode=args.mode, cpuidle=args.cpuidle)
+
+    # stop sampling on SIGTERM as well as on SIGINT
+    signal.signal(signal.SIGTERM, lambda signum, frame: sampler.stop())
+
+    # follow the adb connection during the run, and save its drops next to the output file
+    adbregistrylib.get_registry()
+
+    try:
+        stopped = sampler.run(args.output)
+    except KeyboardInterrupt:
+        sampler.stop()
+        stopped = True
+    finally:
+        adbregistrylib.save_run_events(os.path.dirname(os.path.abspath(args.output)))
+
+    if not stopped:
+        sys.exit(1)
+
+
+# argument parser
+def __parse_arguments(args):
+
+    parser = argparse.ArgumentParser(
+        description="Collect CPU utilization and battery current/voltage from an Android device into a csv file, "
+                    "or per-core CPU utilization and frequency into a parquet file."
+    )
+
+    parser.add_argument("device_id", help="Device serial or ip:port.")
+    parser.add_argument("output", help="Output file (csv in 'aggregate' mode, parquet in 'cores' mode).")
+
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=constants.ADB_MEASUREMENTS_DEFAULT_SAMPLE_DELAY,
+        help=f"Delay between samples in seconds (sub-second values are supported). Default is {constants.ADB_MEASUREMENTS_DEFAULT_SAMPLE_DELAY} sec.",
+    )
+
+    parser.add_argument(
+        "--sw-power",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Sample the battery current and voltage. Enabled by default.",
+    )
+
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=constants.ADB_SAMPLER_MODES,
+        default="aggregate",
+        help="'aggregate' for the overall CPU utilization, 'cores' for the utilization of every core and the frequency of every cpufreq policy. Default is 'aggregate'.",
+    )
+
+    parser.add_argument(
+        "--cpuidle",
+        action="store_true",
+        help="Also sample the cpuidle residency of every core ('cores' mode only).",
+    )
+
+    parser.add_argument(
+        "--log-level",
+        choices=["debug", "info", "warning", "error", "critical"],
+        default="",
+        help="This flag allows to change the log-level. By default only levels higher than warning will be written to the log.",
+    )
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    # parse args
+    arguments = __parse_arguments(sys.argv[1:])
+    main(arguments)
@@ -10,6 +10,7 @@ import csv
 import argparse
 
 from libs import constants
+from libs import dumpsyslib
 
 # Set up argument parsing
 parser = argparse.ArgumentParser(description="Monitor Android app memory usage.")
@@ -44,16 +45,9 @@ with open(output_file, "w", newline="") as csvfile:
             epoch_timestamp = int(time.time() * 1000)  # Get current time in milliseconds
 
             # Parse PSS and RSS totals
-            pss_total = rss_total = None
-            lines = result.stdout.splitlines()
-            for line in lines:
-                if "TOTAL PSS:" in line and "TOTAL RSS:" in line:
-                    parts = line.split()
-                    try:
-                        pss_total = int(parts[2])  # Extract the value after "TOTAL PSS:"
-                        rss_total = int(parts[5])  # Extract the value after "TOTAL RSS:"
-                    except (IndexError, ValueError):
-                        continue
+            meminfo = dumpsyslib.parse_meminfo(result.stdout)
+            pss_total = meminfo["total_pss"]
+            rss_total = meminfo["total_rss"]
 
             # Log to CSV if data is found
             if pss_total is not None and rss_total is not None:
@@ -10,6 +10,8 @@ import sys
 import logging
 
 from libs import devicelib
+from libs import latencylib
+from libs import constants
 from libs import logger as blade_logger
 from libs import tools
 
@@ -35,6 +37,11 @@ def main(args):
 
     blade_logger.logger.info("Control-Device")
 
+    # expose the live latency of the automation operations (e.g. while waiting for an auto-recharge)
+    if args.latency_server is not None:
+        port = latencylib.recorder.start_server(port=args.latency_server)
+        blade_logger.logger.info(f"Latency server listening at http://127.0.0.1:{port}/ (/json, /csv)")
+
     # list devices
     if args.list_devices:
         blade_logger.logger.info("Available devices:\n")
@@ -88,11 +95,12 @@ def main(args):
             output_path = args.output
 
             blade_logger.logger.info(f"Started measuring device '{args.device_name}'...")
-            devicelib.start_measuring(device, output_path, auto_recharge_battery_level=args.auto_recharge)
+            devicelib.start_measuring(device, output_path, auto_recharge_battery_level=args.auto_recharge,
+                                      per_core=args.per_core or args.cpuidle, cpuidle=args.cpuidle)
 
         elif args.measuring == "stop":
             blade_logger.logger.info(f"Stopped measuring device '{args.device_name}'...")
-            devicelib.stop_measuring(device)
+            devicelib.stop_measuring(device, output_path=args.output)
 
         return
 
@@ -219,6 +227,28 @@ def __parse_arguments(args):
         help="Enable auto-recharge for the device, until the given battery level ratio is reached. 'None' means no auto-recharge. Only available for Android devices. Default threshold is None."
     )
 
+    parser.add_argument(
+        "--per-core",
+        action="store_true",
+        help="When starting measuring, also sample the utilization of every core and the frequency of every cpufreq policy into 'measurements_adb_cores.parquet' (Android only).",
+    )
+
+    parser.add_argument(
+        "--cpuidle",
+        action="store_true",
+        help="Also sample the cpuidle residency of every core (implies --per-core).",
+    )
+
+    parser.add_argument(
+        "--latency-server",
+        type=int,
+        nargs="?",
+        const=constants.LATENCY_SERVER_DEFAULT_PORT,
+        default=None,
+        metavar="PORT",
+        help=f"Serve the live latency of the automation operations (adb commands, etc.) over http while running. Default port is {constants.LATENCY_SERVER_DEFAULT_PORT}.",
+    )
+
     parser.add_argument(
         "--log-output",
         required=False,
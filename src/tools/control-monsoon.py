@@ -10,6 +10,7 @@ import sys
 import logging
 
 from libs import monsoonlib
+from libs import powerlib
 from libs import logger as blade_logger
 from libs import tools
 from libs import constants
@@ -82,6 +83,18 @@ def main(args):
         start_time = monsoon.collect_measurements(output, format=format, duration=duration, granularity=granularity)
         blade_logger.logger.info(f"Done! .t_monsoon: {start_time}")
 
+        # post-process into a summary pyramid sidecar if needed
+        if args.summary_pyramid:
+            blade_logger.logger.info("Writing summary pyramid...")
+            pyramid_path = powerlib.write_summary_pyramid(output)
+            blade_logger.logger.info(f"Done! Summary pyramid: {pyramid_path}")
+
+        # export a resampled power profile if needed
+        if args.export_profile is not None:
+            blade_logger.logger.info(f"Exporting power profile ({args.export_profile} sec intervals)...")
+            profile_file = powerlib.export_power_profile(output, interval=args.export_profile)
+            blade_logger.logger.info(f"Done! Power profile: {profile_file}")
+
     # disconnect from monsoon
     monsoon.disconnect()
 
@@ -158,6 +171,22 @@ def __parse_arguments(args):
         help="Output file format. Default is 'csv'.",
     )
 
+    parser.add_argument(
+        "-sp",
+        "--summary-pyramid",
+        action="store_true",
+        help=f"After collecting measurements, write a sidecar `<output>{constants.ANALYSIS_PYRAMID_SUFFIX}` with min/max/mean power and energy precomputed at {', '.join(f'{r:g}' for r in constants.ANALYSIS_PYRAMID_RESOLUTIONS)} sec resolutions, for fast plotting and exploration.",
+    )
+
+    parser.add_argument(
+        "-ep",
+        "--export-profile",
+        type=float,
+        metavar="[sec]",
+        default=None,
+        help="After collecting measurements, export a resampled power profile (mean power, energy, mean/max current per interval) with the given interval in seconds (e.g. 1 for 1 Hz, 0.1 for 10 Hz), as a Parquet file next to the output. Default is None (no export).",
+    )
+
     parser.add_argument(
         "-o",
         "--output",
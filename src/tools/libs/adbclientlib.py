@@ -0,0 +1,429 @@
+# Note:   In-process client for the local adb server's socket protocol (no adb binary spawned per command)
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import os
+import socket
+import stat
+import struct
+import time
+
+from libs import constants
+from libs import latencylib
+from libs import logger as blade_logger
+
+# shell v2 packet ids
+SHELL_ID_STDIN = 0
+SHELL_ID_STDOUT = 1
+SHELL_ID_STDERR = 2
+SHELL_ID_EXIT = 3
+SHELL_ID_CLOSE_STDIN = 4
+
+SYNC_DATA_MAX_SIZE = 64 * 1024
+
+
+class AdbClientError(Exception):
+    """Raised when the adb server or the device refuses a request, or the connection fails (e.g. times out).
+
+    Attributes:
+        command_sent (bool): Whether the command may have reached the device (and must not be run again)
+    """
+
+    def __init__(self, message, command_sent=False):
+        super().__init__(message)
+        self.command_sent = command_sent
+
+
+class AdbClient:
+
+    def __init__(self, host=constants.ADB_SERVER_DEFAULT_HOST, port=constants.ADB_SERVER_DEFAULT_PORT, timeout=constants.ADB_CLIENT_DEFAULT_TIMEOUT):
+        """
+        Initialize a client for an adb server (started by the adb binary, e.g. with 'adb start-server').
+
+        Args:
+            host (str): adb server host. Defaults to 127.0.0.1
+            port (int): adb server port. Defaults to 5037
+            timeout (float): Socket timeout in seconds, or None to block
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    ##################################################################
+    # HOST COMMANDS
+    ##################################################################
+
+    def version(self):
+        """
+        Returns:
+            int: Version of the adb server protocol
+        """
+        return int(self.__host_query("host:version"), 16)
+
+    def devices(self):
+        """
+        Returns:
+            dict: Device serial (or ip:port) to state ('device', 'offline', 'unauthorized', etc.)
+        """
+        return parse_device_list(self.__host_query("host:devices"))
+
+    def connect(self, address):
+        """
+        Connect to a device over TCP/IP (as 'adb connect').
+
+        Args:
+            address (str): ip:port of the device
+
+        Returns:
+            str: Message of the adb server (e.g. 'connected to ...' or 'already connected to ...')
+        """
+        return self.__host_query(f"host:connect:{address}")
+
+    def disconnect(self, address):
+        """
+        Disconnect from a device over TCP/IP (as 'adb disconnect').
+
+        Args:
+            address (str): ip:port of the device
+
+        Returns:
+            str: Message of the adb server
+        """
+        return self.__host_query(f"host:disconnect:{address}")
+
+    def forward(self, serial, local, remote):
+        """
+        Forward a host socket to a device socket (as 'adb forward').
+
+        Args:
+            serial (str): Device serial or ip:port
+            local (str): Host socket, e.g. 'tcp:7100'
+            remote (str): Device socket, e.g. 'tcp:7100' or 'localabstract:name'
+        """
+        with self.__open() as sock:
+            self.__send_request(sock, f"host-serial:{serial}:forward:{local};{remote}")
+            self.__read_status(sock)
+            # a second status is sent once the forward is established
+            self.__read_status(sock)
+
+    def remove_forward(self, serial, local):
+        """
+        Remove a forward created by forward().
+
+        Args:
+            serial (str): Device serial or ip:port
+            local (str): Host socket, e.g. 'tcp:7100'
+        """
+        with self.__open() as sock:
+            self.__send_request(sock, f"host-serial:{serial}:killforward:{local}")
+            self.__read_status(sock)
+
+    def track_devices(self):
+        """
+        Stream device state changes (as 'adb track-devices').
+
+        Yields:
+            dict: Full device list (serial to state), on connection and after every change
+        """
+        sock = self.__open(timeout=None)
+        try:
+            self.__send_request(sock, "host:track-devices")
+            self.__read_status(sock)
+            while True:
+                yield parse_device_list(self.__read_length_prefixed(sock).decode())
+        finally:
+            sock.close()
+
+    ##################################################################
+    # DEVICE COMMANDS
+    ##################################################################
+
+    def shell(self, serial, command, stdin=None):
+        """
+        Run a shell command on a device, using the shell v2 protocol (separate stdout, stderr and exit code).
+
+        Args:
+            serial (str): Device serial or ip:port
+            command (str): Shell command
+            stdin (bytes, optional): Data written to the command's stdin
+
+        Returns:
+            tuple: (stdout, stderr, exit_code), with stdout and stderr as bytes
+        """
+        with self.__open_transport(serial) as sock:
+            return self.__run_shell(sock, command, stdin)
+
+    def exec_out(self, serial, command, output=None):
+        """
+        Run a command on a device and return its raw stdout (as 'adb exec-out'). Suitable for binary output.
+
+        Args:
+            serial (str): Device serial or ip:port
+            command (str): Command
+            output (file, optional): Binary file object to stream the stdout to, instead of returning it
+
+        Returns:
+            bytes: Raw stdout of the command, or its size in bytes if streamed to output
+        """
+        with self.open_exec_stream(serial, command, timeout=self.timeout) as sock:
+            chunks = []
+            size = 0
+            while True:
+                try:
+                    chunk = self.__recv(sock, SYNC_DATA_MAX_SIZE)
+                except AdbClientError as e:
+                    raise AdbClientError(str(e), command_sent=True)
+                if not chunk:
+                    return b"".join(chunks) if output is None else size
+                if output is None:
+                    chunks.append(chunk)
+                else:
+                    output.write(chunk)
+                size += len(chunk)
+
+    def open_exec_stream(self, serial, command, timeout=None):
+        """
+        Run a command on a device and return a socket streaming its raw stdout. The caller must close it.
+
+        Args:
+            serial (str): Device serial or ip:port
+            command (str): Command
+            timeout (float, optional): Socket timeout in seconds. Defaults to None (block)
+
+        Returns:
+            socket.socket: Socket to read the command's stdout from (EOF when the command exits)
+        """
+        sock = self.__open_transport(serial, timeout=timeout)
+        try:
+            self.__send_request(sock, f"exec:{command}")
+            self.__read_request_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def __run_shell(self, sock, command, stdin):
+
+        self.__send_request(sock, f"shell,v2,raw:{command}")
+        self.__read_request_status(sock)
+
+        try:
+            if stdin:
+                for offset in range(0, len(stdin), SYNC_DATA_MAX_SIZE):
+                    self.__send_shell_packet(sock, SHELL_ID_STDIN, stdin[offset:offset + SYNC_DATA_MAX_SIZE])
+            self.__send_shell_packet(sock, SHELL_ID_CLOSE_STDIN, b"")
+
+            stdout = []
+            stderr = []
+            while True:
+                header = self.__read_exact(sock, 5, allow_eof=True)
+                if header is None:
+                    blade_logger.logger.error("Error: Shell stream ended without an exit code.")
+                    raise AdbClientError("Shell stream ended without an exit code.")
+
+                packet_id, length = struct.unpack("<BI", header)
+                data = self.__read_exact(sock, length)
+
+                if packet_id == SHELL_ID_STDOUT:
+                    stdout.append(data)
+                elif packet_id == SHELL_ID_STDERR:
+                    stderr.append(data)
+                elif packet_id == SHELL_ID_EXIT:
+                    return b"".join(stdout), b"".join(stderr), data[0]
+
+        except AdbClientError as e:
+            raise AdbClientError(str(e), command_sent=True)
+
+    def stat(self, serial, remote_path):
+        """
+        Args:
+            serial (str): Device serial or ip:port
+            remote_path (str): Path on the device
+
+        Returns:
+            tuple: (mode, size, mtime). mode is 0 if the path does not exist
+        """
+        with self.__open_sync(serial) as sock:
+            self.__send_sync_request(sock, b"STAT", remote_path.encode())
+            response = self.__read_exact(sock, 16)
+            if response[:4] != b"STAT":
+                raise AdbClientError(f"Unexpected sync response: {response[:4]!r}")
+            return struct.unpack("<III", response[4:])
+
+    def pull(self, serial, remote_path, local_path=None):
+        """
+        Copy a file from the device (as 'adb pull').
+
+        Args:
+            serial (str): Device serial or ip:port
+            remote_path (str): Path of the file on the device
+            local_path (str, optional): Destination path (or folder). Defaults to the current folder
+        """
+        if local_path is None:
+            local_path = os.path.basename(remote_path)
+        elif os.path.isdir(local_path):
+            local_path = os.path.join(local_path, os.path.basename(remote_path))
+
+        with self.__open_sync(serial) as sock:
+            self.__send_sync_request(sock, b"RECV", remote_path.encode())
+
+            with open(local_path, "wb") as f:
+                while True:
+                    sync_id, length = struct.unpack("<4sI", self.__read_exact(sock, 8))
+                    if sync_id == b"DATA":
+                        f.write(self.__read_exact(sock, length))
+                    elif sync_id == b"DONE":
+                        break
+                    elif sync_id == b"FAIL":
+                        message = self.__read_exact(sock, length).decode(errors="replace")
+                        raise AdbClientError(f"Could not pull '{remote_path}': {message}")
+                    else:
+                        raise AdbClientError(f"Unexpected sync response: {sync_id!r}")
+
+    def push(self, serial, local_path, remote_path):
+        """
+        Copy a file to the device (as 'adb push').
+
+        Args:
+            serial (str): Device serial or ip:port
+            local_path (str): Path of the local file
+            remote_path (str): Destination path (or folder, if it ends with '/') on the device
+        """
+        if remote_path.endswith("/"):
+            remote_path += os.path.basename(local_path)
+
+        mode = stat.S_IMODE(os.stat(local_path).st_mode) | stat.S_IFREG
+
+        with self.__open_sync(serial) as sock:
+            self.__send_sync_request(sock, b"SEND", f"{remote_path},{mode}".encode())
+
+            with open(local_path, "rb") as f:
+                for chunk in iter(lambda: f.read(SYNC_DATA_MAX_SIZE), b""):
+                    self.__sendall(sock, b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+
+            self.__sendall(sock, b"DONE" + struct.pack("<I", int(time.time())))
+            sync_id, length = struct.unpack("<4sI", self.__read_exact(sock, 8))
+            if sync_id == b"FAIL":
+                message = self.__read_exact(sock, length).decode(errors="replace")
+                raise AdbClientError(f"Could not push '{local_path}': {message}")
+            if sync_id != b"OKAY":
+                raise AdbClientError(f"Unexpected sync response: {sync_id!r}")
+
+    ##################################################################
+    # PRIVATE
+    ##################################################################
+
+    def __open(self, timeout=-1):
+        timeout = self.timeout if timeout == -1 else timeout
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        except OSError as e:
+            raise AdbClientError(f"Could not connect to the adb server at {self.host}:{self.port}: {e}")
+        sock.settimeout(timeout)
+        return sock
+
+    def __open_transport(self, serial, timeout=-1):
+        start_time = time.perf_counter()
+        sock = self.__open(timeout=timeout)
+        try:
+            self.__send_request(sock, f"host:transport:{serial}")
+            self.__read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        latencylib.add_time("spawn", time.perf_counter() - start_time)
+        return sock
+
+    def __open_sync(self, serial):
+        sock = self.__open_transport(serial)
+        try:
+            self.__send_request(sock, "sync:")
+            self.__read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def __host_query(self, request):
+        with self.__open() as sock:
+            self.__send_request(sock, request)
+            self.__read_status(sock)
+            return self.__read_length_prefixed(sock).decode()
+
+    def __send_request(self, sock, request):
+        request = request.encode()
+        self.__sendall(sock, f"{len(request):04x}".encode() + request)
+
+    def __send_sync_request(self, sock, sync_id, data):
+        self.__sendall(sock, sync_id + struct.pack("<I", len(data)) + data)
+
+    def __send_shell_packet(self, sock, packet_id, data):
+        self.__sendall(sock, struct.pack("<BI", packet_id, len(data)) + data)
+
+    # status of a device command request: a refusal (FAIL) means that nothing ran, but any other error leaves
+    # the command possibly running on the device
+    def __read_request_status(self, sock):
+        try:
+            status = self.__read_exact(sock, 4)
+        except AdbClientError as e:
+            raise AdbClientError(str(e), command_sent=True)
+        self.__check_status(sock, status)
+
+    def __read_status(self, sock):
+        self.__check_status(sock, self.__read_exact(sock, 4))
+
+    def __check_status(self, sock, status):
+        if status == b"OKAY":
+            return
+
+        if status == b"FAIL":
+            message = self.__read_length_prefixed(sock).decode(errors="replace")
+            raise AdbClientError(message)
+
+        raise AdbClientError(f"Unexpected status from the adb server: {status!r}")
+
+    def __read_length_prefixed(self, sock):
+        length = int(self.__read_exact(sock, 4), 16)
+        return self.__read_exact(sock, length)
+
+    # socket I/O errors (including timeouts) are raised as AdbClientError, so that callers can fall back
+    def __sendall(self, sock, data):
+        try:
+            sock.sendall(data)
+        except OSError as e:
+            raise AdbClientError(f"Connection to the adb server failed: {e!r}")
+
+    def __recv(self, sock, size):
+        try:
+            return sock.recv(size)
+        except OSError as e:
+            raise AdbClientError(f"Connection to the adb server failed: {e!r}")
+
+    def __read_exact(self, sock, length, allow_eof=False):
+        data = bytearray()
+        while len(data) < length:
+            chunk = self.__recv(sock, length - len(data))
+            if not chunk:
+                if allow_eof and len(data) == 0:
+                    return None
+                raise AdbClientError("Connection closed by the adb server.")
+            data.extend(chunk)
+        return bytes(data)
+
+
+def parse_device_list(text):
+    """
+    Parse the device list of 'host:devices' / 'host:track-devices'.
+
+    Args:
+        text (str): Lines of '<serial>\\t<state>'
+
+    Returns:
+        dict: Device serial (or ip:port) to state
+    """
+    devices = {}
+    for line in text.splitlines():
+        if "\t" in line:
+            serial, state = line.split("\t", 1)
+            devices[serial] = state.strip()
+    return devices
@@ -3,14 +3,20 @@
 # Date:   04/03/2023
 
 import os
-import time
+import re
+import shlex
+import subprocess
 from subprocess import PIPE, Popen
 
+from libs import tools
+from libs import adbclientlib
+from libs import adbregistrylib
 from libs import constants
+from libs import latencylib
+from libs import dumpsyslib
+from libs.automation import adb_commands
 from libs import logger as blade_logger
 
-# get current file path
-__location__ = os.path.dirname(os.path.realpath(__file__))
 TCPDUMP_PATH = "/data/local/tmp/tcpdump"
 
 
@@ -26,158 +32,257 @@ def __get_adb_identifier(device, connection, port=constants.ADB_OVER_WIFI_DEFAUL
     raise Exception(f"Error: Unknown connection '{connection}'.")
 
 
+# run an adb command using the selected backend (see adb_commands.set_backend), printing its output as os.system
+# would. Failures are logged, not raised, and fail the measurement of the calling helper (see latencylib.measured).
+# Returns the exit code.
+def __run_adb_command(device, connection, command):
+
+    output, exit_code = adb_commands.try_adb_command(device, connection, command)
+    if output:
+        print(output, flush=True)
+    if exit_code != 0:
+        blade_logger.logger.warning(f"Warning: Command 'adb {command}' failed (exit code {exit_code}).")
+        latencylib.set_failed()
+
+    return exit_code
+
+
+# run an adb shell command using the selected backend and return its output, whatever its exit code (as os.popen)
+def __read_adb_command(device, connection, command):
+    output, _ = adb_commands.try_adb_command(device, connection, command)
+    return output
+
+
+# keep the lines matching a pattern (as `| grep <pattern>`)
+def __grep(output, pattern):
+    return "\n".join(line for line in output.splitlines() if re.search(pattern, line))
+
+
 # enable adb over wifi
+@latencylib.measured
 def enable_adb_over_wifi(device, port=constants.ADB_OVER_WIFI_DEFAULT_PORT):
 
-    adb_identifier = device["adb_identifier"]
     ip = device["ip"]
 
     # enable adb over wifi
-    os.system(f"adb -s {adb_identifier} tcpip {port}")
-    time.sleep(constants.ADB_COMMANDS_EXECUTION_TIMEOUT)
+    __run_adb_command(device, "usb", f"tcpip {port}")
 
-    # disconnect and reconnect over wifi, ignoring the expected error
-    with Popen(
-        ["adb", "disconnect", "{ip}:{port}"], stdout=PIPE, stderr=PIPE
-    ) as process:
-        output, _ = process.communicate()
-        if output:
-            print(output)
-    time.sleep(constants.ADB_COMMANDS_EXTENDED_EXECUTION_TIMEOUT)
+    # disconnect any stale connection, ignoring the expected error
+    output = __run_adb_host_command("disconnect", f"{ip}:{port}")
+    if output:
+        print(output)
+
+    # reconnect over wifi, retrying while adbd restarts in tcpip mode
+    connected = tools.wait_until(lambda: __connect_over_wifi(ip, port), timeout=constants.ADB_OVER_WIFI_CONNECT_TIMEOUT)
+    if not connected:
+        blade_logger.logger.warning(f"Warning: Could not connect to '{ip}:{port}' over wifi.")
+
+
+# connect to the device over wifi. Returns True once the transport is listed as 'device'.
+def __connect_over_wifi(ip, port):
 
-    os.system(f"adb connect {ip}:{port}")
-    time.sleep(constants.ADB_COMMANDS_EXECUTION_TIMEOUT)
+    output = __run_adb_host_command("connect", f"{ip}:{port}")
+    if "connected to" not in output:
+        return False
+
+    return __get_transport_state(f"{ip}:{port}") == "device"
 
 
 # disable adb over wifi
+@latencylib.measured
 def disable_adb_over_wifi(device, port=constants.ADB_OVER_WIFI_DEFAULT_PORT):
 
     ip = device["ip"]
 
     # disable adb over wifi
-    os.system(f"adb disconnect {ip}:{port}")
-    time.sleep(constants.SWITCH_ADB_CONNECTION_STATE_TIMEOUT)
+    output = __run_adb_host_command("disconnect", f"{ip}:{port}")
+    if output:
+        print(output)
 
+    registry = adbregistrylib.get_registry()
+    if registry is not None:
+        disconnected = registry.wait_for_state(f"{ip}:{port}", [None], timeout=constants.SWITCH_ADB_CONNECTION_STATE_TIMEOUT)
+    else:
+        disconnected = tools.wait_until(lambda: __get_transport_state(f"{ip}:{port}") is None,
+                                        timeout=constants.SWITCH_ADB_CONNECTION_STATE_TIMEOUT)
 
-def get_device_adb_connection_state(device, port=constants.ADB_OVER_WIFI_DEFAULT_PORT):
+    if not disconnected:
+        blade_logger.logger.warning(f"Warning: '{ip}:{port}' is still listed by adb after disconnecting.")
+
+
+# run 'adb connect' or 'adb disconnect' over the adb server protocol if selected (see adb_commands.set_backend),
+# or with the adb binary. Returns the message of the adb server.
+def __run_adb_host_command(command, address):
+
+    if adb_commands.backend == "native":
+        try:
+            return getattr(adb_commands.adb_client, command)(address)
+        except adbclientlib.AdbClientError as e:
+            blade_logger.logger.warning(f"Warning: {e} Falling back to the adb binary.")
+
+    with Popen(["adb", command, address], stdout=PIPE, stderr=PIPE) as process:
+        output, _ = process.communicate()
+
+    return output.decode(errors="replace").strip()
+
+
+# returns the state of an adb transport (e.g. 'device', 'offline', 'unauthorized'), or None if not listed
+def __get_transport_state(adb_identifier):
+    return __get_transport_states().get(adb_identifier)
+
+
+# returns all adb transports and their states, from the live device registry (or 'adb devices' if unavailable)
+def __get_transport_states():
+
+    registry = adbregistrylib.get_registry()
+    if registry is not None:
+        return registry.get_states()
 
-    # list adb devices and check if given device is listed (either identifier or ip:port)
+    # host query over the adb server protocol, if selected
+    if adb_commands.backend == "native":
+        try:
+            return adb_commands.adb_client.devices()
+        except adbclientlib.AdbClientError as e:
+            blade_logger.logger.warning(f"Warning: {e} Falling back to the adb binary.")
+
+    states = {}
     output = os.popen("adb devices").read()
-    for line in output.splitlines():
-        if device["adb_identifier"] in line:
-            return "usb"
-        elif f"{device['ip']}:{port}" in line:
-            return "wifi"
+    for line in output.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) == 2:
+            states[fields[0]] = fields[1]
+
+    return states
+
+
+@latencylib.measured
+def get_device_adb_connection_state(device, port=constants.ADB_OVER_WIFI_DEFAULT_PORT):
+
+    # check if given device is listed (either identifier or ip:port)
+    states = __get_transport_states()
+    if device["adb_identifier"] in states:
+        return "usb"
+    elif f"{device['ip']}:{port}" in states:
+        return "wifi"
 
     return None
 
 
+@latencylib.measured
 def power_off_device(device, connection):
 
-    adb_identifier = __get_adb_identifier(device, connection)
-    os.system(f"adb -s {adb_identifier} reboot -p")
+    adb_commands.metadata_cache.invalidate(device)
+    __run_adb_command(device, connection, "reboot -p")
 
 
+@latencylib.measured
 def reboot_device(device, connection):
 
-    adb_identifier = __get_adb_identifier(device, connection)
-    os.system(f"adb -s {adb_identifier} reboot")
+    adb_commands.metadata_cache.invalidate(device)
+    __run_adb_command(device, connection, "reboot")
 
 
-def get_device_traffic(device, connection):
+@latencylib.measured
+def get_device_traffic(device, connection, netstats=None):
 
     if device["os"] != "Android":
         return 0, 0
 
-    adb_identifier = __get_adb_identifier(device, connection)
-    script = os.path.join(__location__, "../get_data_usage.sh")
-    output = os.popen(f"{script} {adb_identifier}").read()
-    results = output.split(",")
-    rx = int(results[0].split("=")[1])
-    tx = int(results[1].split("=")[1])
-    return rx, tx
+    if netstats is None:
+        netstats = get_netstats(device, connection)
+
+    return netstats["rx_bytes"], netstats["tx_bytes"]
+
+
+# returns a parsed `dumpsys netstats` snapshot (see dumpsyslib.parse_netstats), to be shared between
+# get_device_traffic and get_data_usage_per_package calls
+@latencylib.measured
+def get_netstats(device, connection):
+
+    output = adb_commands.run_adb_command(device, connection, "shell dumpsys netstats")
+    return dumpsyslib.parse_netstats(output)
 
 
 # install Android apk on device
+@latencylib.measured
 def install_application(device, apk_path):
 
-    adb_identifier = device["adb_identifier"]
-    os.system(f"adb -s {adb_identifier} install {apk_path}")
+    __run_adb_command(device, "usb", f"install {apk_path}")
+    adb_commands.metadata_cache.invalidate(device)
 
 
 # uninstall Android apk on device
+@latencylib.measured
 def uninstall_application(device, apk_name):
 
-    adb_identifier = device["adb_identifier"]
-    os.system(f"adb -s {adb_identifier} uninstall {apk_name}")
+    __run_adb_command(device, "usb", f"uninstall {apk_name}")
+    adb_commands.metadata_cache.invalidate(device)
 
 
 # check if apk exists on device
+@latencylib.measured
 def apk_exists(device, apk_name):
 
-    adb_identifier = device["adb_identifier"]
-    output = os.popen(
-        f"adb -s {adb_identifier} shell pm list packages | grep {apk_name}"
-    ).read()
-    return output != ""
+    packages = adb_commands.metadata_cache.get_packages(device, "usb")
+    return any(apk_name in package for package in packages)
 
 
+@latencylib.measured
 def start_tcpdump(device, filename, interface="any"):
 
+    # runs until stop_tcpdump: always uses the adb binary, so that it does not hold a pooled shell session
     adb_identifier = device["adb_identifier"]
     os.system(
         f'adb -s {adb_identifier} shell "su -c {TCPDUMP_PATH} -i {interface} ip6 or ip -w {filename}"'
     )
 
 
+@latencylib.measured
 def stop_tcpdump(device):
 
-    adb_identifier = device["adb_identifier"]
-    os.system(f'adb -s {adb_identifier} shell "su -c pkill tcpdump"')
+    __run_adb_command(device, "usb", 'shell "su -c pkill tcpdump"')
 
 
+@latencylib.measured
 def netstat(device, grep_filter=None):
 
-    adb_identifier = device["adb_identifier"]
-    command = f'adb -s {adb_identifier} shell "su -c netstat -tup"'
+    output = __read_adb_command(device, "usb", 'shell "su -c netstat -tup"')
 
     if grep_filter is not None:
-        command += f' | grep {grep_filter}"'
+        output = __grep(output, grep_filter)
 
-    output = os.popen(command).read()
     return output
 
 
+@latencylib.measured
 def ss(device, grep_filter=None):
 
-    adb_identifier = device["adb_identifier"]
-    command = f'adb -s {adb_identifier} shell "su -c ss -tup"'
+    output = __read_adb_command(device, "usb", 'shell "su -c ss -tup"')
 
     if grep_filter is not None:
-        command += f' | grep {grep_filter}"'
+        output = __grep(output, grep_filter)
 
-    output = os.popen(command).read()
     return output
 
 
+@latencylib.measured
 def proc_net(device, socket):
 
     if socket not in ["tcp", "tcp6", "udp", "udp6"]:
         blade_logger.logger.error(f"Error: Invalid socket type: {socket}")
         raise Exception(f"Error: Invalid socket type: {socket}")
 
-    adb_identifier = device["adb_identifier"]
-    output = os.popen(
-        f'adb -s {adb_identifier} shell "su -c cat /proc/net/{socket}"'
-    ).read()
-    return output
+    return __read_adb_command(device, "usb", f'shell "su -c cat /proc/net/{socket}"')
 
+@latencylib.measured
 def get_user_id(device, connection, package_name):
 
-    adb_identifier = __get_adb_identifier(device, connection)
-    output = os.popen(
-        f'adb -s {adb_identifier} shell dumpsys package {package_name} | grep userId='
-    ).read()
+    # served from the cached package list if possible
+    user_id = adb_commands.metadata_cache.get_package_uid(device, connection, package_name)
+    if user_id is not None:
+        return user_id
+
+    output = __grep(__read_adb_command(device, connection, f"shell dumpsys package {package_name}"), "userId=")
 
     if output == "":
         return None
@@ -189,61 +294,170 @@ def get_user_id(device, connection, package_name):
 
     return None
 
-def get_data_usage(device, connection, package_name):
+@latencylib.measured
+def get_data_usage(device, connection, package_name, netstats=None):
+    return get_data_usage_per_package(device, connection, [package_name], netstats)[package_name]
 
-    app_id = get_user_id(device, connection, package_name)
-    if app_id is None:
-        blade_logger.logger.warning(f"Warning: Could not find app_id for package '{package_name}', might have not been opened since boot. Reporting (0, 0).")
-        return 0, 0
-    
-    adb_identifier = __get_adb_identifier(device, connection)
-    script = os.path.join(__location__, "../get_data_usage_per_app.sh")
-    with Popen(
-        [script, adb_identifier, app_id], stdout=PIPE, stderr=PIPE
-    ) as process:
-        output, error = process.communicate()
-        if error or process.returncode != 0:
+
+# returns {package_name: (rx, tx)} for multiple packages, from a single netstats snapshot
+@latencylib.measured
+def get_data_usage_per_package(device, connection, package_names, netstats=None):
+
+    if netstats is None:
+        netstats = get_netstats(device, connection)
+
+    data_usage = {}
+    for package_name in package_names:
+
+        app_id = get_user_id(device, connection, package_name)
+        if app_id is None:
+            blade_logger.logger.warning(f"Warning: Could not find app_id for package '{package_name}', might have not been opened since boot. Reporting (0, 0).")
+            data_usage[package_name] = (0, 0)
+            continue
+
+        if int(app_id) not in netstats["uids"]:
             blade_logger.logger.warning(f"Warning: Could not get data usage for package '{package_name}'. Reporting 0 for all relevant metrics.")
-            rx, tx = 0, 0
+            data_usage[package_name] = (0, 0)
+            continue
+
+        data_usage[package_name] = netstats["uids"][int(app_id)]
+
+    return data_usage
 
-        else:
-            results = output.decode().split(",")
-            rx = int(results[0].split("=")[1])
-            tx = int(results[1].split("=")[1])
-    
-    return rx, tx
 
+@latencylib.measured
 def lsof(device, pid):
 
-    adb_identifier = device["adb_identifier"]
-    output = os.popen(
-        f'adb -s {adb_identifier} shell "su -c lsof -p {pid}"').read()
-    return output
+    return __read_adb_command(device, "usb", f'shell "su -c lsof -p {pid}"')
 
 
+@latencylib.measured
 def pull(device, remote_path, local_path=None):
 
-    adb_identifier = device["adb_identifier"]
-    command = f"adb -s {adb_identifier} pull {remote_path}"
+    command = f"pull {remote_path}"
     if local_path is not None:
         command += f" {local_path}"
-    os.system(command)
+    __run_adb_command(device, "usb", command)
 
 
+@latencylib.measured
 def push(device, local_path, remote_path):
 
-    adb_identifier = device["adb_identifier"]
-    command = f"adb -s {adb_identifier} push {local_path} {remote_path}"
-    os.system(command)
+    __run_adb_command(device, "usb", f"push {local_path} {remote_path}")
 
 
-def get_memory_usage(device, connection, package_name):
+@latencylib.measured
+def get_memory_usage(device, connection, package_name, mode=constants.MEMORY_USAGE_DEFAULT_MODE):
     """
     Collects memory information for all processes of a package.
-    Returns: (total_pss, total_private_dirty, total_private_clean, main_process_rss)
+
+    Modes:
+        'per_process': one `dumpsys meminfo <pid>` adb call per process
+        'batched': all `dumpsys meminfo <pid>` calls in a single adb call
+        'smaps': reads /proc/<pid>/smaps_rollup of all processes in a single adb call (requires root and
+                 Linux 4.14+, falls back to 'batched' otherwise). Much faster, but heap_alloc is not available (reported as 0).
+
+    Returns: dict with accumulated_pss, accumulated_private_dirty, accumulated_private_clean,
+             accumulated_heap_alloc and main_process_rss.
     All values are in kilobytes.
     """
 
+    if mode not in constants.MEMORY_USAGE_MODES:
+        blade_logger.logger.error(f"Error: Unknown memory usage mode '{mode}'. Supported modes: {constants.MEMORY_USAGE_MODES}")
+        raise ValueError(f"Error: Unknown memory usage mode '{mode}'. Supported modes: {constants.MEMORY_USAGE_MODES}")
+
+    if mode == "per_process":
+        return __get_memory_usage_per_process(device, connection, package_name)
+
+    memory_dict = {
+        "accumulated_pss": 0,
+        "accumulated_private_dirty": 0,
+        "accumulated_private_clean": 0,
+        "accumulated_heap_alloc": 0,
+        "main_process_rss": 0,
+    }
+
+    # list the package's processes and dump the memory of each one, in a single on-device invocation
+    marker = "__BLADE_PROCESS__"
+    if mode == "smaps":
+        dump_command = "cat /proc/$2/smaps_rollup 2>/dev/null"
+    else:
+        dump_command = "dumpsys meminfo $2 | grep -m 1 -E \"^ *TOTAL \""
+    script = f"ps -A | grep {package_name} | while read -r line; do echo \"{marker} $line\"; set -- $line; {dump_command}; done"
+    if mode == "smaps":
+        script = f"su -c {shlex.quote(script)}"
+
+    # an unreachable device reports no processes (zeros and a warning, as with the adb binary)
+    try:
+        results = adb_commands.run_adb_batch(device, connection, [script])
+    except subprocess.CalledProcessError:
+        results = []
+    output = results[0][0] if results else ""
+    processes = [block.strip().splitlines() for block in output.split(marker)[1:]]
+
+    if len(processes) == 0:
+        blade_logger.logger.warning(f"Warning: Could not get memory usage for package '{package_name}'. Reporting 0 for all relevant metrics.")
+        return memory_dict
+
+    parsed_processes = 0
+    for lines in processes:
+        parts = lines[0].split()
+        if len(parts) < 9:  # ps output should have at least 9 columns
+            continue
+
+        pid = parts[1]
+        is_main_process = parts[8] == package_name
+
+        if mode == "smaps":
+            memory = __parse_smaps_rollup(lines[1:])
+        else:
+            memory = dumpsyslib.parse_meminfo_total_row(lines[1] if len(lines) > 1 else "")
+
+        # the process might have exited in the meantime
+        if memory is None:
+            blade_logger.logger.warning(f"Warning: error parsing {mode} memory output for PID {pid}")
+            continue
+
+        parsed_processes += 1
+
+        memory_dict["accumulated_pss"] += memory["pss"]
+        memory_dict["accumulated_private_dirty"] += memory["private_dirty"]
+        memory_dict["accumulated_private_clean"] += memory["private_clean"]
+        memory_dict["accumulated_heap_alloc"] += memory["heap_alloc"]
+        if is_main_process:
+            memory_dict["main_process_rss"] = memory["rss"] or 0  # not reported before Android 10
+
+    # smaps_rollup is not available (e.g. no root access or Linux < 4.14)
+    if mode == "smaps" and parsed_processes == 0:
+        blade_logger.logger.warning("Warning: Could not read smaps_rollup of any process. Falling back to 'batched' mode.")
+        return get_memory_usage(device, connection, package_name, mode="batched")
+
+    return memory_dict
+
+
+# parse the content of /proc/<pid>/smaps_rollup (values in kB). Returns None if unavailable.
+def __parse_smaps_rollup(lines):
+
+    fields = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+            fields[parts[0][:-1]] = int(parts[1])
+
+    if "Pss" not in fields:
+        return None
+
+    return {
+        "pss": fields["Pss"],
+        "private_dirty": fields.get("Private_Dirty", 0),
+        "private_clean": fields.get("Private_Clean", 0),
+        "rss": fields.get("Rss", 0),
+        "heap_alloc": 0,
+    }
+
+
+def __get_memory_usage_per_process(device, connection, package_name):
+
     memory_dict = {
         "accumulated_pss": 0,
         "accumulated_private_dirty": 0,
@@ -251,12 +465,9 @@ def get_memory_usage(device, connection, package_name):
         "accumulated_heap_alloc": 0,
         "main_process_rss": 0,
     }
-    
-    adb_identifier = __get_adb_identifier(device, connection)
     
     # Get all process IDs for the package
-    ps_cmd = f'adb -s {adb_identifier} shell "ps -A | grep {package_name}"'
-    ps_output = os.popen(ps_cmd).read().strip()
+    ps_output = __read_adb_command(device, connection, f'shell "ps -A | grep {package_name}"').strip()
     
     if not ps_output or len(ps_output) == 0:
         blade_logger.logger.warning(f"Warning: Could not get memory usage for package '{package_name}'. Reporting 0 for all relevant metrics.")
@@ -273,31 +484,19 @@ def get_memory_usage(device, connection, package_name):
         is_main_process = process_name == package_name
         
         # Run dumpsys meminfo for this PID
-        meminfo_cmd = f'adb -s {adb_identifier} shell dumpsys meminfo {pid}'
-        meminfo_output = os.popen(meminfo_cmd).read()
+        meminfo_output = __read_adb_command(device, connection, f"shell dumpsys meminfo {pid}")
         
         # Parse the TOTAL line
-        for line in meminfo_output.splitlines():
-            if line.strip().startswith('TOTAL'):
-                parts = line.split()
-                if len(parts) == 9:  # Ensure output format is correct
-                    try:
-                        pss = int(parts[1])
-                        private_dirty = int(parts[2])
-                        private_clean = int(parts[3])
-                        rss = int(parts[5])
-                        heap_alloc = int(parts[7])
-                        
-                        memory_dict["accumulated_pss"] += pss
-                        memory_dict["accumulated_private_dirty"] += private_dirty
-                        memory_dict["accumulated_private_clean"] += private_clean
-                        memory_dict["accumulated_heap_alloc"] += heap_alloc
-                        if is_main_process:
-                            memory_dict["main_process_rss"] = rss
-                            
-                    except (IndexError, ValueError):
-                        blade_logger.logger.warning(f"Warning: error parsing meminfo output for PID {pid}")
-                        continue
-                break
+        memory = dumpsyslib.parse_meminfo(meminfo_output)
+        if memory["pss"] is None:
+            blade_logger.logger.warning(f"Warning: error parsing meminfo output for PID {pid}")
+            continue
+
+        memory_dict["accumulated_pss"] += memory["pss"]
+        memory_dict["accumulated_private_dirty"] += memory["private_dirty"]
+        memory_dict["accumulated_private_clean"] += memory["private_clean"]
+        memory_dict["accumulated_heap_alloc"] += memory["heap_alloc"]
+        if is_main_process:
+            memory_dict["main_process_rss"] = memory["rss"] or 0
 
     return memory_dict
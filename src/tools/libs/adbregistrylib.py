@@ -0,0 +1,221 @@
+# Note:   Live registry of adb devices and their states, fed by the adb server's device-tracking stream
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import collections
+import json
+import os
+import threading
+import time
+
+from libs import adbclientlib
+from libs import constants
+from libs import logger as blade_logger
+
+# registry shared by all callers of this process (see get_registry)
+__shared_registry = None
+__shared_registry_lock = threading.Lock()
+
+
+class AdbDeviceRegistry:
+
+    def __init__(self, client=None, max_events=constants.ADB_DEVICE_REGISTRY_MAX_EVENTS):
+        """
+        Keep an in-memory map of adb devices (serial or ip:port) to their state ('device', 'offline',
+        'unauthorized', etc.), updated by a background thread following the adb server's track-devices stream.
+
+        State changes are recorded as events with timestamps, e.g. for diagnosing connection drops during a run.
+
+        Args:
+            client (adbclientlib.AdbClient, optional): Client of the adb server. Defaults to the local adb server
+            max_events (int): Maximum number of state change events kept (oldest are dropped first)
+        """
+        self.client = client if client is not None else adbclientlib.AdbClient()
+        self.states = {}
+        self.events = collections.deque(maxlen=max_events)
+        self.is_tracking = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self, timeout=constants.ADB_DEVICE_REGISTRY_STARTUP_TIMEOUT):
+        """
+        Start following the adb server in a background thread and wait for the initial device list.
+
+        Args:
+            timeout (float): Seconds to wait for the initial device list
+
+        Returns:
+            bool: True if the registry is tracking the adb server (otherwise it keeps retrying in the background)
+        """
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__track, name="adb-device-registry", daemon=True)
+                self.thread.start()
+
+            self.condition.wait_for(lambda: self.is_tracking, timeout=timeout)
+            return self.is_tracking
+
+    def stop(self):
+        """
+        Stop following the adb server. The tracking thread exits with the next update of the stream.
+        """
+        with self.condition:
+            self.is_tracking = False
+            self.thread = None
+            self.condition.notify_all()
+
+    def get_state(self, serial):
+        """
+        Args:
+            serial (str): Device serial or ip:port
+
+        Returns:
+            str: Current state of the device, or None if not listed by the adb server
+        """
+        with self.condition:
+            return self.states.get(serial)
+
+    def get_states(self):
+        """
+        Returns:
+            dict: Copy of the current device serial (or ip:port) to state map
+        """
+        with self.condition:
+            return dict(self.states)
+
+    def wait_for_state(self, serial, states, timeout=constants.WAIT_UNTIL_DEFAULT_TIMEOUT):
+        """
+        Block until a device reaches one of the given states, without polling the adb server.
+
+        Args:
+            serial (str): Device serial or ip:port
+            states (list): Accepted states, e.g. ['device']. Include None to wait until the device is no longer listed
+            timeout (float): Seconds to wait
+
+        Returns:
+            bool: True if the device reached one of the states before the timeout
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.states.get(serial) in states, timeout=timeout)
+
+    def get_events(self, since=None):
+        """
+        Args:
+            since (float, optional): Only return events after this epoch timestamp
+
+        Returns:
+            list: State change events as dicts (timestamp, serial, previous_state, state), oldest first.
+                  previous_state is None when a device appears, and state is None when it disappears.
+        """
+        with self.condition:
+            return [event for event in self.events if since is None or event["timestamp"] > since]
+
+    def get_drop_events(self, since=None):
+        """
+        Args:
+            since (float, optional): Only return events after this epoch timestamp
+
+        Returns:
+            list: Events where a device left the 'device' state (disconnected, offline, etc.)
+        """
+        return [event for event in self.get_events(since) if event["previous_state"] == "device"]
+
+    def append_events(self, filename, since=None):
+        """
+        Append the state change events to a json lines file (one event per line), so that the processes of a
+        run (e.g. starting and stopping the measurements, and the sampler) collect theirs in the same file.
+
+        Args:
+            filename (str): Output json lines file
+            since (float, optional): Only write events after this epoch timestamp
+        """
+        with open(filename, "a") as f:
+            f.write("".join(json.dumps(event) + "\n" for event in self.get_events(since)))
+
+    def __track(self):
+
+        # a thread exits once it is no longer the registry's tracking thread (i.e. after stop())
+        thread = threading.current_thread()
+
+        while True:
+            try:
+                for devices in self.client.track_devices():
+                    if self.thread is not thread:
+                        return
+                    self.__update(devices)
+
+            except adbclientlib.AdbClientError as e:
+                blade_logger.logger.debug(f"adb device registry: {e}")
+
+            # the adb server is not running or went away: the known states are no longer reliable
+            with self.condition:
+                if self.thread is not thread:
+                    return
+                self.is_tracking = False
+                self.__update_states({})
+                self.condition.notify_all()
+
+            time.sleep(constants.ADB_DEVICE_REGISTRY_RECONNECT_INTERVAL)
+
+    def __update(self, devices):
+        with self.condition:
+            self.__update_states(devices)
+            self.is_tracking = True
+            self.condition.notify_all()
+
+    def __update_states(self, devices):
+
+        timestamp = time.time()
+        for serial in sorted(set(self.states) | set(devices)):
+            previous_state = self.states.get(serial)
+            state = devices.get(serial)
+            if previous_state != state:
+                self.events.append({
+                    "timestamp": timestamp,
+                    "serial": serial,
+                    "previous_state": previous_state,
+                    "state": state,
+                })
+
+                if previous_state == "device":
+                    blade_logger.logger.info(f"Device '{serial}' changed state from 'device' to '{state}'.")
+
+        self.states = dict(devices)
+
+
+def get_registry():
+    """
+    Returns the registry shared within this process, started on first use.
+
+    Returns:
+        AdbDeviceRegistry: Shared registry, or None if the adb server cannot be tracked (e.g. it is not running)
+    """
+    global __shared_registry
+
+    with __shared_registry_lock:
+        # the tracking thread keeps retrying in the background if the adb server is not available
+        if __shared_registry is None:
+            __shared_registry = AdbDeviceRegistry()
+            __shared_registry.start()
+
+        return __shared_registry if __shared_registry.is_tracking else None
+
+
+def save_run_events(output_path):
+    """
+    Append the events of the registry shared within this process (if started) to the events file of a run
+    (see ADB_DEVICE_REGISTRY_EVENTS_FILENAME), and warn about connection drops.
+
+    Args:
+        output_path (str): Output folder of the run
+    """
+    with __shared_registry_lock:
+        registry = __shared_registry
+
+    if registry is None:
+        return
+
+    registry.append_events(os.path.join(output_path, constants.ADB_DEVICE_REGISTRY_EVENTS_FILENAME))
+    for event in registry.get_drop_events():
+        blade_logger.logger.warning(f"Warning: Device '{event['serial']}' dropped from 'device' to '{event['state']}' "
+                                    f"at {event['timestamp']:.3f}.")
@@ -0,0 +1,456 @@
+# Note:   Streaming sampler of device measurements (CPU utilization and frequency, battery current and voltage), running as a single on-device loop
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import bisect
+import csv
+import os
+import shlex
+import subprocess
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from fastparquet import write as write_parquet
+from libs import adbsessionlib
+from libs import constants
+from libs import logger as blade_logger
+
+ADB_MEASUREMENTS_COLUMNS = ["timestamp", "current", "voltage", "cpu_util"]
+
+SYSFS_CPU_PATH = "/sys/devices/system/cpu"
+
+# on-device sampling loop (sh/mksh). Only shell builtins run per sample, except `sleep`. Every sample is one line:
+#   S <uptime> <user> <nice> <system> <idle> <iowait> <irq> <softirq> <steal> [<current> <voltage>]
+# with uptime from /proc/uptime, the aggregated cpu line of /proc/stat (in clock ticks), and the current (uA) and
+# voltage (uV) of the power supply uevent file, if given.
+SAMPLER_SCRIPT = """
+power_supply={power_supply}
+while true; do
+    read -r uptime _ < /proc/uptime
+    read -r _ user nice system idle iowait irq softirq steal _ < /proc/stat
+    sample="S $uptime $user $nice $system $idle $iowait $irq $softirq $steal"
+    if [ -n "$power_supply" ]; then
+        current=-1; voltage=-1
+        while IFS== read -r key value; do
+            case "$key" in
+                POWER_SUPPLY_CURRENT_NOW) current=$value;;
+                POWER_SUPPLY_VOLTAGE_NOW) voltage=$value;;
+            esac
+        done < "$power_supply"
+        sample="$sample $current $voltage"
+    fi
+    echo "$sample"
+    sleep {interval}
+done
+"""
+
+# on-device sampling loop of the 'cores' mode. Every sample is a block of lines:
+#   T <uptime>
+#   C <cpu|cpuN> <user> <nice> <system> <idle> <iowait> <irq> <softirq> <steal>   (one per online core, and the aggregate)
+#   F <policyN> <scaling_cur_freq>                                               (one per cpufreq policy, in kHz)
+#   I <cpuN> <time of state0> <time of state1> ...                               (cpuidle residency in us, if enabled)
+# Unreadable values (e.g. of an offline core) are left out of F lines and written as '-' in I lines, and parsed
+# as NaN.
+#   P <current> <voltage>                                                        (if a power supply is given)
+#   E
+CORES_SAMPLER_SCRIPT = """
+power_supply={power_supply}
+while true; do
+    read -r uptime _ < /proc/uptime
+    echo "T $uptime"
+    while read -r name user nice system idle iowait irq softirq steal _; do
+        case "$name" in
+            cpu*) echo "C $name $user $nice $system $idle $iowait $irq $softirq $steal";;
+            *) break;;
+        esac
+    done < /proc/stat
+    for policy in {policies}; do
+        frequency=; read -r frequency < "{sysfs_cpu_path}/cpufreq/$policy/scaling_cur_freq"
+        echo "F $policy $frequency"
+    done
+{cpuidle}
+    if [ -n "$power_supply" ]; then
+        current=-1; voltage=-1
+        while IFS== read -r key value; do
+            case "$key" in
+                POWER_SUPPLY_CURRENT_NOW) current=$value;;
+                POWER_SUPPLY_VOLTAGE_NOW) voltage=$value;;
+            esac
+        done < "$power_supply"
+        echo "P $current $voltage"
+    fi
+    echo E
+    sleep {interval}
+done
+"""
+
+# cpuidle residency of one core, within CORES_SAMPLER_SCRIPT
+CORES_SAMPLER_CPUIDLE_SCRIPT = """
+    line="I {cpu}"
+    for state in {states}; do
+        residency=; read -r residency < "{sysfs_cpu_path}/{cpu}/cpuidle/$state/time"
+        line="$line ${{residency:--}}"
+    done
+    echo "$line"
+"""
+
+
+class AdbSampler:
+
+    def __init__(self, adb_identifier, interval=constants.ADB_MEASUREMENTS_DEFAULT_SAMPLE_DELAY, sw_power_enabled=True,
+                 mode="aggregate", cpuidle=False):
+        """
+        Sample CPU utilization and battery current/voltage with a single long-running `adb shell` loop on the device,
+        instead of one adb round trip per value.
+
+        Samples are timestamped on the device (/proc/uptime, 10 ms resolution) and mapped to host epoch time, so
+        that they can be aligned with host-side measurements (e.g. Monsoon) independently of the adb latency. The
+        clock offset is re-calibrated periodically and at the end of a run (clocks drift, and NTP slews the host
+        clock), and every calibration is saved next to the output file (see run).
+
+        Modes:
+            aggregate: csv file with the overall CPU utilization (timestamp, current, voltage, cpu_util)
+            cores:     parquet file with the utilization of every core, the frequency of every cpufreq policy
+                       and optionally the cpuidle residency of every core and state (see run)
+
+        Args:
+            adb_identifier (str): Device serial or ip:port
+            interval (float): Delay between samples, in seconds (sub-second values are supported)
+            sw_power_enabled (bool): Sample the battery current and voltage
+            mode (str): 'aggregate' or 'cores'
+            cpuidle (bool): Sample the cpuidle residency ('cores' mode only)
+        """
+        if mode not in constants.ADB_SAMPLER_MODES:
+            blade_logger.logger.error(f"Error: Unknown sampler mode '{mode}'. Supported modes: {constants.ADB_SAMPLER_MODES}")
+            raise ValueError(f"Error: Unknown sampler mode '{mode}'. Supported modes: {constants.ADB_SAMPLER_MODES}")
+
+        self.adb_identifier = adb_identifier
+        self.interval = interval
+        self.sw_power_enabled = sw_power_enabled
+        self.mode = mode
+        self.cpuidle = cpuidle
+        self.clock_offset = None
+        self.clock_calibrations = []  # (device uptime, offset), sorted by uptime
+        self.clock_lock = threading.Lock()
+        self.calibration_stopped = threading.Event()
+        self.process = None
+        self.stopped = False
+
+    def calibrate_clock(self, probes=constants.ADB_SAMPLER_CLOCK_PROBES):
+        """
+        Estimate the offset between the device uptime and the host epoch time, using the probe with the shortest
+        round trip (as in NTP), and add it to the calibrations used by get_timestamp.
+
+        Args:
+            probes (int): Number of uptime probes
+
+        Returns:
+            float: Offset in seconds (host epoch time = device uptime + offset)
+        """
+        session = adbsessionlib.AdbShellSession(self.adb_identifier)
+        try:
+            best_round_trip_time = None
+            uptime = None
+            for _ in range(probes):
+                start_time = time.time()
+                output, exit_code = session.run("cat /proc/uptime")
+                end_time = time.time()
+
+                if exit_code != 0:
+                    blade_logger.logger.error(f"Error: Could not read the uptime of device '{self.adb_identifier}'.")
+                    raise Exception(f"Error: Could not read the uptime of device '{self.adb_identifier}'.")
+
+                round_trip_time = end_time - start_time
+                if best_round_trip_time is None or round_trip_time < best_round_trip_time:
+                    best_round_trip_time = round_trip_time
+                    uptime = float(output.split()[0])
+                    clock_offset = (start_time + end_time) / 2 - uptime
+
+        finally:
+            session.close()
+
+        with self.clock_lock:
+            self.clock_offset = clock_offset
+            bisect.insort(self.clock_calibrations, (uptime, clock_offset))
+
+        blade_logger.logger.info(f"Device clock offset: {clock_offset:.3f} sec (+/- {best_round_trip_time / 2:.3f} sec)")
+        return clock_offset
+
+    def get_timestamp(self, uptime):
+        """
+        Map a device uptime to host epoch time, interpolating the offset linearly between the calibrations around
+        it. Outside of the calibrated range, the offset of the nearest calibration is used (extrapolating the drift
+        would amplify the 10 ms resolution of the uptime).
+
+        Args:
+            uptime (float): Device uptime in seconds
+
+        Returns:
+            float: Host epoch time in seconds
+        """
+        with self.clock_lock:
+            calibrations = self.clock_calibrations
+            index = bisect.bisect(calibrations, (uptime,))
+
+            if index == 0:
+                return uptime + calibrations[0][1]
+            if index == len(calibrations):
+                return uptime + calibrations[-1][1]
+
+            (uptime1, offset1), (uptime2, offset2) = calibrations[index - 1], calibrations[index]
+
+        return uptime + offset1 + (offset2 - offset1) * (uptime - uptime1) / (uptime2 - uptime1)
+
+    def run(self, output_file):
+        """
+        Sample until stop() is called (or the adb connection ends).
+
+        In 'aggregate' mode, a row per sample is written to a csv file (timestamp in epoch seconds, current in uA,
+        voltage in uV, cpu_util in %).
+
+        In 'cores' mode, a row per sample is written to a parquet file, with the columns:
+            timestamp                      epoch seconds (host clock, as Monsoon's start_time)
+            cpu_util, cpu<N>_util          utilization of all cores and of every core in % (NaN if offline)
+            policy<N>_freq                 current frequency of every cpufreq policy, in kHz
+            cpu<N>_idle_state<M>           cpuidle residency since the previous sample, in us (if enabled)
+            current, voltage               in uA and uV (if enabled)
+        Utilization and residency are NaN in the first row.
+
+        Samples are timestamped as they arrive, i.e. with the offset of the latest calibration. Every calibration,
+        including a final one at the end of the run, is saved as a csv file (uptime, offset) next to the output
+        file (see ADB_SAMPLER_CLOCK_FILE_SUFFIX), so that timestamps can be re-interpolated afterwards.
+
+        Args:
+            output_file (str): Output csv or parquet file
+
+        Returns:
+            bool: True if stopped by stop(), False if the adb connection ended
+        """
+        if self.clock_offset is None:
+            self.calibrate_clock()
+
+        power_supply = self.__find_power_supply() if self.sw_power_enabled else ""
+
+        calibration_thread = threading.Thread(target=self.__recalibrate_clock, name="adb-sampler-clock", daemon=True)
+        calibration_thread.start()
+        try:
+            if self.mode == "cores":
+                self.__run_cores(output_file, power_supply)
+            else:
+                self.__run_aggregate(output_file, power_supply)
+
+        finally:
+            self.calibration_stopped.set()
+            calibration_thread.join()
+            self.__finish_clock_calibration(output_file)
+
+        exit_code = self.process.wait()
+        if not self.stopped:
+            blade_logger.logger.error(f"Error: adb sampler of device '{self.adb_identifier}' ended (exit code {exit_code}).")
+
+        return self.stopped
+
+    def stop(self):
+        """
+        Stop the sampling loop.
+        """
+        self.stopped = True
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def __recalibrate_clock(self):
+
+        while not self.calibration_stopped.wait(constants.ADB_SAMPLER_CLOCK_CALIBRATION_INTERVAL):
+            try:
+                self.calibrate_clock()
+            except Exception as e:
+                blade_logger.logger.warning(f"Warning: Could not re-calibrate the clock of device '{self.adb_identifier}': {e}")
+
+    def __finish_clock_calibration(self, output_file):
+
+        # final calibration, bounding the interpolation of the last samples (the device may be gone already)
+        try:
+            self.calibrate_clock()
+        except Exception as e:
+            blade_logger.logger.warning(f"Warning: Could not re-calibrate the clock of device '{self.adb_identifier}': {e}")
+
+        with self.clock_lock:
+            calibrations = list(self.clock_calibrations)
+
+        with open(output_file + constants.ADB_SAMPLER_CLOCK_FILE_SUFFIX, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["uptime", "offset"])
+            writer.writerows(calibrations)
+
+    def __run_aggregate(self, output_file, power_supply):
+
+        script = SAMPLER_SCRIPT.format(power_supply=shlex.quote(power_supply), interval=self.interval)
+        self.process = self.__start_script(script)
+
+        with open(output_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(ADB_MEASUREMENTS_COLUMNS)
+
+            # the first sample is computed against a zero baseline (i.e. the average since boot)
+            previous_cpu = (0, 0)
+            for line in self.process.stdout:
+                fields = line.split()
+                if len(fields) < 10 or fields[0] != "S":
+                    blade_logger.logger.debug(f"Skipping unexpected sampler output: {line.strip()}")
+                    continue
+
+                timestamp = self.get_timestamp(float(fields[1]))
+                cpu_ticks = [int(value) for value in fields[2:10]]
+                cpu = (sum(cpu_ticks), cpu_ticks[3])
+                cpu_util = get_cpu_util(previous_cpu, cpu)
+                previous_cpu = cpu
+
+                current, voltage = (fields[10], fields[11]) if len(fields) >= 12 else (-1, -1)
+                writer.writerow([f"{timestamp:.3f}", current, voltage, "" if cpu_util is None else cpu_util])
+                f.flush()
+
+    def __run_cores(self, output_file, power_supply):
+
+        cpus, policies, idle_states = self.__discover_cpus()
+
+        cpuidle_script = "".join(
+            CORES_SAMPLER_CPUIDLE_SCRIPT.format(cpu=cpu, states=" ".join(idle_states[cpu]), sysfs_cpu_path=SYSFS_CPU_PATH)
+            for cpu in cpus if idle_states.get(cpu)
+        )
+        script = CORES_SAMPLER_SCRIPT.format(power_supply=shlex.quote(power_supply), policies=" ".join(policies),
+                                             cpuidle=cpuidle_script, sysfs_cpu_path=SYSFS_CPU_PATH, interval=self.interval)
+
+        # fixed set of columns, so that every flushed batch has the same schema
+        columns = ["timestamp", "cpu_util"] + [f"{cpu}_util" for cpu in cpus] + [f"{policy}_freq" for policy in policies]
+        columns += [f"{cpu}_idle_{state}" for cpu in cpus for state in idle_states.get(cpu, [])]
+        if power_supply:
+            columns += ["current", "voltage"]
+
+        metadata = {
+            "device": self.adb_identifier,
+            "interval": str(self.interval),
+            # timestamps use the calibrations saved in this file (see run), not a single offset
+            "clock_file": os.path.basename(output_file + constants.ADB_SAMPLER_CLOCK_FILE_SUFFIX),
+        }
+        write_parquet(output_file, pd.DataFrame(columns=columns, dtype=np.float64),
+                      compression=constants.ADB_SAMPLER_PARQUET_COMPRESSION, write_index=False, custom_metadata=metadata)
+
+        self.process = self.__start_script(script)
+
+        rows = []
+        previous_cpu_ticks = {}
+        previous_residencies = {}
+        row = None
+        # flush the buffered samples also when interrupted (e.g. KeyboardInterrupt)
+        try:
+            for line in self.process.stdout:
+                fields = line.split()
+                if len(fields) == 0:
+                    continue
+
+                if fields[0] == "T":
+                    row = dict.fromkeys(columns, np.nan)
+                    row["timestamp"] = self.get_timestamp(float(fields[1]))
+
+                elif row is None:
+                    continue
+
+                elif fields[0] == "C" and len(fields) >= 10:
+                    cpu_ticks = [int(value) for value in fields[2:10]]
+                    cpu = (sum(cpu_ticks), cpu_ticks[3])
+                    column = "cpu_util" if fields[1] == "cpu" else f"{fields[1]}_util"
+                    if fields[1] in previous_cpu_ticks and column in row:
+                        cpu_util = get_cpu_util(previous_cpu_ticks[fields[1]], cpu)
+                        row[column] = np.nan if cpu_util is None else cpu_util
+                    previous_cpu_ticks[fields[1]] = cpu
+
+                elif fields[0] == "F" and len(fields) == 3 and fields[2].isdigit():
+                    row[f"{fields[1]}_freq"] = int(fields[2])
+
+                elif fields[0] == "I" and len(fields) >= 2:
+                    for state, residency in zip(idle_states.get(fields[1], []), fields[2:]):
+                        key = (fields[1], state)
+                        if not residency.isdigit():
+                            previous_residencies.pop(key, None)
+                            continue
+                        if key in previous_residencies:
+                            row[f"{fields[1]}_idle_{state}"] = int(residency) - previous_residencies[key]
+                        previous_residencies[key] = int(residency)
+
+                elif fields[0] == "P" and len(fields) == 3 and power_supply:
+                    row["current"], row["voltage"] = int(fields[1]), int(fields[2])
+
+                elif fields[0] == "E":
+                    rows.append(row)
+                    row = None
+                    if len(rows) >= constants.ADB_SAMPLER_PARQUET_BUFFER_SIZE:
+                        self.__flush_rows(output_file, rows, columns)
+                        rows = []
+
+        finally:
+            if rows:
+                self.__flush_rows(output_file, rows, columns)
+
+    def __flush_rows(self, output_file, rows, columns):
+        write_parquet(output_file, pd.DataFrame(rows, columns=columns, dtype=np.float64),
+                      compression=constants.ADB_SAMPLER_PARQUET_COMPRESSION, write_index=False, append=True)
+
+    def __start_script(self, script):
+        return subprocess.Popen(["adb", "-s", self.adb_identifier, "shell", script], stdout=subprocess.PIPE, text=True)
+
+    def __discover_cpus(self):
+
+        # cores, cpufreq policies and cpuidle states, in a single round trip
+        command = (f"cd {SYSFS_CPU_PATH} && echo cpus: cpu[0-9]* && echo policies: $(cd cpufreq 2>/dev/null && echo policy*)"
+                   " && for cpu in cpu[0-9]*; do echo idle: $cpu $(cd $cpu/cpuidle 2>/dev/null && echo state*); done")
+        output = subprocess.run(["adb", "-s", self.adb_identifier, "shell", command],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+
+        cpus = []
+        policies = []
+        idle_states = {}
+        for line in output.splitlines():
+            fields = line.split()
+            # unmatched globs are echoed as-is
+            values = [value for value in fields[1:] if "*" not in value]
+
+            if fields[:1] == ["cpus:"]:
+                cpus = sorted(values, key=lambda name: int(name[3:]))
+            elif fields[:1] == ["policies:"]:
+                policies = sorted(values, key=lambda name: int(name[6:]))
+            elif fields[:1] == ["idle:"] and self.cpuidle and len(values) > 1:
+                idle_states[values[0]] = sorted(values[1:], key=lambda name: int(name[5:]))
+
+        if len(cpus) == 0:
+            blade_logger.logger.error(f"Error: Could not list the cores of device '{self.adb_identifier}'.")
+            raise Exception(f"Error: Could not list the cores of device '{self.adb_identifier}'.")
+
+        blade_logger.logger.info(f"Sampling {len(cpus)} cores, policies {policies}, cpuidle {'enabled' if idle_states else 'disabled'}")
+        return cpus, policies, idle_states
+
+    def __find_power_supply(self):
+
+        # the battery's uevent file, or else the first one reporting a current
+        output = subprocess.run(
+            ["adb", "-s", self.adb_identifier, "shell", "grep -l POWER_SUPPLY_CURRENT_NOW /sys/class/power_supply/*/uevent"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        ).stdout.split()
+
+        if len(output) == 0:
+            blade_logger.logger.warning("Warning: No power supply reports a current. Skipping SW-based power measurements.")
+            return ""
+
+        return next((path for path in output if "/battery/" in path), output[0])
+
+
+# returns the CPU utilization (in %) between two (total, idle) clock tick readings, or None if no time passed
+def get_cpu_util(previous, current):
+
+    total = current[0] - previous[0]
+    if total <= 0:
+        return None
+
+    return (1 - (current[1] - previous[1]) / total) * 100
@@ -0,0 +1,259 @@
+# Note:   Pool of long-lived `adb shell` sessions, to run device commands without spawning adb every time
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import atexit
+import os
+import select
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+
+from libs import constants
+from libs import latencylib
+from libs import logger as blade_logger
+
+
+class AdbSessionError(Exception):
+    """Raised when an adb shell session dies or becomes unusable.
+
+    Attributes:
+        command_sent (bool): Whether the command may have reached the device (and must not be run again)
+    """
+
+    def __init__(self, message, command_sent=False):
+        super().__init__(message)
+        self.command_sent = command_sent
+
+
+class AdbShellSession:
+
+    def __init__(self, adb_identifier, timeout=constants.ADB_SHELL_SESSION_OPEN_TIMEOUT):
+        """
+        Start a long-lived `adb shell` session to a device.
+
+        Commands are written to the session's stdin and their output is delimited by a unique
+        sentinel line carrying the command's exit code. stderr is passed through to the host's stderr. Every
+        command runs in its own subshell, so that commands do not share any shell state.
+
+        Args:
+            adb_identifier (str): Device serial or ip:port
+            timeout (float): Seconds to wait for the session to become usable
+
+        Raises:
+            AdbSessionError: If the session could not be started (e.g. device offline or unauthorized)
+        """
+        self.adb_identifier = adb_identifier
+        self.sentinel = f"__BLADE_{uuid.uuid4().hex}__".encode()
+        self.buffer = b""
+        self.process = subprocess.Popen(
+            ["adb", "-s", adb_identifier, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0,
+        )
+
+        # make sure that the device shell answers before any command is sent, so that a failing session
+        # can be replaced safely (nothing was run on the device yet)
+        try:
+            deadline = time.monotonic() + timeout
+            self.process.stdin.write(f"echo {self.sentinel.decode()}:0::\n".encode())
+            while not self.__read_line(deadline).startswith(self.sentinel):
+                pass
+
+        except (AdbSessionError, OSError) as e:
+            self.close()
+            raise AdbSessionError(f"Could not open a session to '{adb_identifier}': {e}")
+
+    def run(self, command, timeout=constants.ADB_SHELL_SESSION_READ_TIMEOUT):
+        """
+        Run a command in the session.
+
+        Args:
+            command (str): Shell command, as it would be passed to `adb shell`
+            timeout (float): Seconds to wait for the command to finish, or None to wait forever. The session is
+                closed on timeout, since its output can no longer be matched to commands
+
+        Returns:
+            tuple: (output, exit_code), with output as bytes
+
+        Raises:
+            AdbSessionError: If the session is no longer usable (command_sent tells whether the command may have run)
+        """
+        # the command runs in a subshell, so that the state it leaves behind (cd, variables, set, umask, trap)
+        # does not carry over to the following commands, and 'exit' or 'exec' cannot end the session (as in
+        # run_adb_batch). eval keeps syntax errors inside the command from breaking the session, and stdin is
+        # detached so that the command cannot consume the following ones. The sentinel also carries the
+        # on-device start and end time of the command ($EPOCHREALTIME, empty if the shell does not support it).
+        script = (
+            "__blade_start_time=$EPOCHREALTIME\n"
+            f"(eval {shlex.quote(command)}) </dev/null\n"
+            "__blade_exit_code=$?\n"
+            f"echo; echo {self.sentinel.decode()}:$__blade_exit_code:$__blade_start_time:$EPOCHREALTIME\n"
+        )
+
+        try:
+            self.process.stdin.write(script.encode())
+        except (BrokenPipeError, OSError) as e:
+            raise AdbSessionError(f"Session to '{self.adb_identifier}' is closed: {e}")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        lines = []
+        while True:
+            try:
+                line = self.__read_line(deadline)
+            except AdbSessionError as e:
+                self.close()
+                raise AdbSessionError(str(e), command_sent=True)
+
+            if line.startswith(self.sentinel):
+                fields = line[len(self.sentinel) + 1:].strip().split(b":")
+                exit_code = int(fields[0] or -1)
+                if len(fields) == 3 and fields[1] and fields[2]:
+                    latencylib.set_time("execution", float(fields[2]) - float(fields[1]))
+                break
+
+            lines.append(line)
+
+        # drop the newline added before the sentinel
+        output = b"".join(lines)
+        if output.endswith(b"\n"):
+            output = output[:-1]
+
+        return output, exit_code
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        """
+        Terminate the session.
+        """
+        if self.is_alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=constants.ADB_SHELL_SESSION_CLOSE_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+    def __read_line(self, deadline):
+
+        # stdout is unbuffered: read whatever is available, so that the deadline also applies within a line
+        while b"\n" not in self.buffer:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise AdbSessionError(f"Session to '{self.adb_identifier}' timed out.")
+
+            readable, _, _ = select.select([self.process.stdout], [], [], remaining)
+            if not readable:
+                continue
+
+            chunk = os.read(self.process.stdout.fileno(), constants.ADB_SHELL_SESSION_READ_SIZE)
+            if not chunk:
+                raise AdbSessionError(f"Session to '{self.adb_identifier}' ended unexpectedly.")
+            self.buffer += chunk
+
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line + b"\n"
+
+
+class AdbShellSessionPool:
+
+    def __init__(self, max_sessions_per_device=constants.ADB_SHELL_SESSION_POOL_MAX_SESSIONS_PER_DEVICE):
+        """
+        Initialize a pool of adb shell sessions, created lazily per device.
+
+        Args:
+            max_sessions_per_device (int): Maximum number of concurrent sessions per device
+        """
+        self.max_sessions_per_device = max_sessions_per_device
+        self.idle_sessions = {}
+        self.session_counts = {}
+        self.condition = threading.Condition()
+        atexit.register(self.close)
+
+    def run(self, adb_identifier, command, timeout=constants.ADB_SHELL_SESSION_READ_TIMEOUT):
+        """
+        Run a command on a device, over one of its pooled sessions.
+
+        Args:
+            adb_identifier (str): Device serial or ip:port
+            command (str): Shell command, as it would be passed to `adb shell`
+            timeout (float): Seconds to wait for the command to finish, or None to wait forever
+
+        Returns:
+            tuple: (output, exit_code), with output as bytes
+
+        Raises:
+            AdbSessionError: If no session could be opened, or the session died (or timed out) while running the
+                command (command_sent is set)
+        """
+        start_time = time.perf_counter()
+        session = self.__acquire(adb_identifier)
+        latencylib.add_time("spawn", time.perf_counter() - start_time)
+
+        try:
+            result = session.run(command, timeout)
+
+        except AdbSessionError:
+            self.__release(session, discard=True)
+            raise
+
+        self.__release(session)
+        return result
+
+    def close(self, adb_identifier=None):
+        """
+        Close the idle sessions of a device, or of all devices.
+
+        Args:
+            adb_identifier (str, optional): Device serial or ip:port. Defaults to all devices
+        """
+        with self.condition:
+            identifiers = list(self.idle_sessions.keys()) if adb_identifier is None else [adb_identifier]
+            for identifier in identifiers:
+                for session in self.idle_sessions.pop(identifier, []):
+                    session.close()
+                    self.session_counts[identifier] -= 1
+
+    def __acquire(self, adb_identifier):
+        with self.condition:
+            while True:
+                idle_sessions = self.idle_sessions.setdefault(adb_identifier, [])
+
+                # reuse an idle session, dropping the ones that died in the meantime (e.g. device disconnected)
+                while idle_sessions:
+                    session = idle_sessions.pop()
+                    if session.is_alive():
+                        return session
+                    self.session_counts[adb_identifier] -= 1
+
+                if self.session_counts.get(adb_identifier, 0) < self.max_sessions_per_device:
+                    self.session_counts[adb_identifier] = self.session_counts.get(adb_identifier, 0) + 1
+                    break
+
+                self.condition.wait()
+
+        try:
+            blade_logger.logger.debug(f"Opening adb shell session to '{adb_identifier}'")
+            return AdbShellSession(adb_identifier)
+
+        except (AdbSessionError, OSError) as e:
+            with self.condition:
+                self.session_counts[adb_identifier] -= 1
+                self.condition.notify()
+            if isinstance(e, AdbSessionError):
+                raise
+            raise AdbSessionError(f"Could not open a session to '{adb_identifier}': {e}")
+
+    def __release(self, session, discard=False):
+        with self.condition:
+            if discard or not session.is_alive():
+                session.close()
+                self.session_counts[session.adb_identifier] -= 1
+            else:
+                self.idle_sessions.setdefault(session.adb_identifier, []).append(session)
+            self.condition.notify()
+
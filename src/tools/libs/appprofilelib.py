@@ -0,0 +1,289 @@
+# Note:   Host-side, content-addressed store of app profile (app data) snapshots
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from libs import tools
+from libs.automation import adb_commands
+from libs import constants
+from libs import logger as blade_logger
+
+# compression -> (file extension, open function)
+COMPRESSIONS = {
+    "none": (".tar", open),
+    "gzip": (".tar.gz", gzip.open),
+    "lzma": (".tar.xz", lzma.open),
+}
+
+
+class AppProfileStore:
+
+    def __init__(self, path, compression=constants.APP_PROFILE_STORE_DEFAULT_COMPRESSION):
+        """
+        Keep app profile snapshots (tar archives of /data/data/<package>) on the host, keyed by the SHA-256 of
+        the uncompressed archive, with optional named references (e.g. 'warm-profile').
+
+        Archives are never compressed on the device: they are streamed uncompressed to the host and compressed
+        there. A restore only pushes the archive if the device does not already hold the same snapshot.
+
+        Layout:
+            <path>/objects/<hash>.tar[.gz|.xz]   snapshot archive
+            <path>/objects/<hash>.json           snapshot metadata (package, size, created)
+            <path>/refs/<name>                   snapshot hash
+
+        Args:
+            path (str): Folder of the store
+            compression (str): Compression of newly saved snapshots ('none', 'gzip' or 'lzma')
+        """
+        if compression not in COMPRESSIONS:
+            blade_logger.logger.error(f"Error: Unknown compression '{compression}'. Supported: {list(COMPRESSIONS)}")
+            raise ValueError(f"Error: Unknown compression '{compression}'. Supported: {list(COMPRESSIONS)}")
+
+        self.path = path
+        self.compression = compression
+        self.objects_path = os.path.join(path, "objects")
+        self.refs_path = os.path.join(path, "refs")
+        tools.ensure_path(self.objects_path)
+        tools.ensure_path(self.refs_path)
+
+    def save(self, device, connection, package, name=None):
+        """
+        Snapshot the app data of a package. Identical snapshots are stored once. Requires root access.
+
+        Args:
+            device (dict): Device
+            connection (str): 'usb' or 'wifi'
+            package (str): App package
+            name (str, optional): Reference name to point to the snapshot
+
+        Returns:
+            str: Hash of the snapshot
+        """
+        extension, open_function = COMPRESSIONS[self.compression]
+
+        # stream the archive to a temporary file (hashing it on the way), so that it is never held in memory and
+        # an interrupted save leaves no partial snapshot
+        fd, temporary_filename = tempfile.mkstemp(suffix=extension + ".tmp", dir=self.objects_path)
+        os.close(fd)
+        try:
+            with open_function(temporary_filename, "wb") as f:
+                writer = _HashingWriter(f)
+                adb_commands.export_app_data(device, connection, package, writer)
+            snapshot_hash = writer.get_hash()
+
+            if self.get_object_filename(snapshot_hash) is None:
+                metadata = {"package": package, "size": writer.size, "created": time.time()}
+                with open(os.path.join(self.objects_path, snapshot_hash + ".json"), "w") as f:
+                    json.dump(metadata, f, indent=4)
+
+                os.replace(temporary_filename, os.path.join(self.objects_path, snapshot_hash + extension))
+
+        finally:
+            if os.path.exists(temporary_filename):
+                os.remove(temporary_filename)
+
+        if name is not None:
+            self.set_ref(name, snapshot_hash)
+
+        return snapshot_hash
+
+    def restore(self, device, connection, package, snapshot):
+        """
+        Restore the app data of a package from a snapshot. Requires root access.
+
+        Args:
+            device (dict): Device
+            connection (str): 'usb' or 'wifi'
+            package (str): App package
+            snapshot (str): Reference name or hash of the snapshot
+        """
+        snapshot_hash = self.resolve(snapshot)
+        with _LocalArchive(self, snapshot_hash) as archive:
+            self.__restore(device, connection, package, snapshot_hash, archive)
+
+    def restore_devices(self, devices, connection, package, snapshot, max_workers=None):
+        """
+        Restore the app data of a package on multiple devices in parallel, so that a failing device does not
+        stop the others. Requires root access.
+
+        Args:
+            devices (list): Devices
+            connection (str): 'usb' or 'wifi'
+            package (str): App package
+            snapshot (str): Reference name or hash of the snapshot
+            max_workers (int, optional): Maximum number of devices restored at the same time. Defaults to all
+
+        Returns:
+            list: One result per device (None, or the raised exception)
+        """
+        snapshot_hash = self.resolve(snapshot)
+        with _LocalArchive(self, snapshot_hash) as archive:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or max(len(devices), 1)) as executor:
+                futures = [executor.submit(self.__restore, device, connection, package, snapshot_hash, archive)
+                           for device in devices]
+
+        results = []
+        for device, future in zip(devices, futures):
+            exception = future.exception()
+            if exception is not None:
+                blade_logger.logger.error(f"Error: Could not restore app profile on device '{device['adb_identifier']}': {exception}")
+            results.append(exception)
+
+        return results
+
+    def resolve(self, snapshot):
+        """
+        Args:
+            snapshot (str): Reference name or hash of a snapshot
+
+        Returns:
+            str: Hash of the snapshot
+        """
+        ref_filename = os.path.join(self.refs_path, snapshot)
+        if os.path.isfile(ref_filename):
+            with open(ref_filename) as f:
+                snapshot = f.read().strip()
+
+        if self.get_object_filename(snapshot) is None:
+            blade_logger.logger.error(f"Error: Unknown app profile snapshot '{snapshot}'.")
+            raise Exception(f"Error: Unknown app profile snapshot '{snapshot}'.")
+
+        return snapshot
+
+    def set_ref(self, name, snapshot_hash):
+        """
+        Point a reference name to a snapshot.
+
+        Args:
+            name (str): Reference name
+            snapshot_hash (str): Hash of the snapshot
+        """
+        if os.path.basename(name) != name or name.startswith("."):
+            blade_logger.logger.error(f"Error: Invalid reference name '{name}'.")
+            raise ValueError(f"Error: Invalid reference name '{name}'.")
+
+        with open(os.path.join(self.refs_path, name), "w") as f:
+            f.write(snapshot_hash + "\n")
+
+    def get_refs(self):
+        """
+        Returns:
+            dict: Reference name to snapshot hash
+        """
+        refs = {}
+        for name in sorted(os.listdir(self.refs_path)):
+            with open(os.path.join(self.refs_path, name)) as f:
+                refs[name] = f.read().strip()
+
+        return refs
+
+    def get_metadata(self, snapshot):
+        """
+        Args:
+            snapshot (str): Reference name or hash of a snapshot
+
+        Returns:
+            dict: Package, size of the uncompressed archive (in bytes) and creation timestamp of the snapshot
+        """
+        with open(os.path.join(self.objects_path, self.resolve(snapshot) + ".json")) as f:
+            return json.load(f)
+
+    def get_object_filename(self, snapshot_hash):
+        """
+        Args:
+            snapshot_hash (str): Hash of a snapshot
+
+        Returns:
+            str: Filename of the snapshot archive, or None if not in the store
+        """
+        for extension, _ in COMPRESSIONS.values():
+            filename = os.path.join(self.objects_path, snapshot_hash + extension)
+            if os.path.isfile(filename):
+                return filename
+
+        return None
+
+    def __restore(self, device, connection, package, snapshot_hash, archive):
+
+        size = self.get_metadata(snapshot_hash)["size"]
+        remote_path = f"{constants.APP_PROFILE_STORE_DEVICE_PATH}/{package}-{snapshot_hash}.tar"
+
+        # the device already holds this snapshot: restore without any transfer
+        if adb_commands.restore_app_data(device, connection, package, remote_path, size):
+            return
+
+        # keep a single snapshot per package on the device
+        adb_commands.run_adb_batch(device, connection, [
+            f"mkdir -p {constants.APP_PROFILE_STORE_DEVICE_PATH}",
+            f"rm -f {constants.APP_PROFILE_STORE_DEVICE_PATH}/{package}-*.tar",
+        ])
+        adb_commands.run_adb_command(device, connection, f"push {archive.get_filename()} {remote_path}")
+
+        if not adb_commands.restore_app_data(device, connection, package, remote_path, size):
+            blade_logger.logger.error(f"Error: Could not push app profile snapshot '{snapshot_hash}'.")
+            raise Exception(f"Error: Could not push app profile snapshot '{snapshot_hash}'.")
+
+
+class _HashingWriter:
+
+    # binary file object wrapper, computing the SHA-256 and the size of the data written through it
+    def __init__(self, file):
+        self.file = file
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def get_hash(self):
+        return self.hash.hexdigest()
+
+
+class _LocalArchive:
+
+    # uncompressed archive of a snapshot, ready to be pushed. Decompressed on first use only (i.e. not at all when
+    # every device already holds the snapshot), once for all devices, and removed on exit.
+    def __init__(self, store, snapshot_hash):
+        self.store = store
+        self.snapshot_hash = snapshot_hash
+        self.filename = None
+        self.temporary_path = None
+        self.lock = threading.Lock()
+
+    def get_filename(self):
+
+        with self.lock:
+            if self.filename is None:
+                object_filename = self.store.get_object_filename(self.snapshot_hash)
+                if object_filename.endswith(COMPRESSIONS["none"][0]):
+                    self.filename = object_filename
+
+                else:
+                    open_function = next(function for extension, function in COMPRESSIONS.values()
+                                         if object_filename.endswith(extension))
+                    self.temporary_path = tempfile.mkdtemp()
+                    filename = os.path.join(self.temporary_path, self.snapshot_hash + ".tar")
+                    with open_function(object_filename, "rb") as source, open(filename, "wb") as destination:
+                        shutil.copyfileobj(source, destination)
+                    self.filename = filename
+
+            return self.filename
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.temporary_path is not None:
+            shutil.rmtree(self.temporary_path, ignore_errors=True)
@@ -18,35 +18,34 @@ __location__ = os.path.dirname(os.path.realpath(__file__))
 
 
 # start collecting adb measurements
-def collect_adb_measurements(adb_identifier, sleep_time, sw_power_enabled, output_file):
+def collect_adb_measurements(adb_identifier, sleep_time, sw_power_enabled, output_file, mode="aggregate", cpuidle=False):
 
     # collect measurements
-    script = os.path.join(__location__, "../collect_adb_measurements.sh")
-    process = subprocess.Popen(
-        [
-            script,
-            adb_identifier,
-            str(sleep_time),
-            str(int(sw_power_enabled)),
-            output_file,
-        ]
-    )
+    script = os.path.join(__location__, "../collect_adb_measurements.py")
+    command = [script, adb_identifier, output_file, f"--interval={sleep_time}", f"--mode={mode}"]
+    if not sw_power_enabled:
+        command.append("--no-sw-power")
+    if cpuidle:
+        command.append("--cpuidle")
+    process = subprocess.Popen(command)
 
-    # save pid to file
-    filename = ".adb_measurements_pid"
+    # save pid to file (one per mode, so that both modes can run at the same time)
+    filename = f".adb_measurements_{mode}_pid"
     tools.save_value_to_file(process.pid, filename)
 
 
-# stop collecting adb measurements
+# stop collecting adb measurements (of all modes)
 def stop_collecting_adb_measurements():
 
-    pid = tools.read_value_from_file(".adb_measurements_pid")
-    if pid:
+    for mode in constants.ADB_SAMPLER_MODES:
+        pid = tools.read_value_from_file(f".adb_measurements_{mode}_pid")
+        if pid:
 
-        try:
-            os.kill(int(pid), signal.SIGKILL)
-        except OSError:
-            blade_logger.logger.warning("Warning: Could not stop adb measurements. Process already stopped.")
+            # SIGINT, so that the sampler can stop its on-device loop
+            try:
+                os.kill(int(pid), signal.SIGINT)
+            except OSError:
+                blade_logger.logger.warning(f"Warning: Could not stop adb measurements ('{mode}' mode). Process already stopped.")
 
 
 def collect_memory_measurements(adb_identifier, app_package, output_file, interval=constants.MEMORY_MEASUREMENTS_DEFAULT_INTERVAL):
@@ -2,20 +2,68 @@
 # Author: Kleomenis Katevas (kkatevas@brave.com)
 # Date:   04/03/2023
 
+import re
 import subprocess
 import sys
 import time
 import urllib.parse
 import shlex
-from ast import literal_eval
+import struct
+import uuid
 
 from libs import tools
+from libs import adbclientlib
+from libs import adbsessionlib
+from libs import devicemetadatalib
+from libs import dumpsyslib
+from libs import inputinjectorlib
+from libs import latencylib
+from libs import screenrecordlib
 from libs import constants
 from libs import logger as blade_logger
 
+ADB_COMMANDS_BACKENDS = ["cli", "session", "native"]
+
+# subcommands kept in command types (e.g. 'battery' of 'shell dumpsys battery'), unlike arguments such as
+# paths, packages, properties or numbers
+COMMAND_TYPE_SUBCOMMAND_PATTERN = re.compile(r"^[a-z][a-z_-]*$")
+
+# bytes per pixel of the raw `screencap` pixel formats (android.graphics.PixelFormat)
+SCREENCAP_PIXEL_FORMATS = {
+    1: ("RGBA_8888", 4),
+    2: ("RGBX_8888", 4),
+    3: ("RGB_888", 3),
+    4: ("RGB_565", 2),
+}
+
+# windows focused while the lock screen is shown (mCurrentFocus of `dumpsys window`), across Android versions
+KEYGUARD_FOCUS_WINDOWS = ["NotificationShade", "StatusBar", "Keyguard"]
+
+# backend used to execute adb commands (see set_backend)
+backend = constants.ADB_COMMANDS_DEFAULT_BACKEND
+
+# long-lived adb shell sessions ('session' backend) and adb server client ('native' backend), shared by all commands of this process
+shell_session_pool = adbsessionlib.AdbShellSessionPool()
+adb_client = adbclientlib.AdbClient()
+
+# resident input injectors, per adb identifier (see start_input_injector)
+input_injectors = {}
+
+
+# choose how adb commands are executed: 'cli' (adb binary), 'session' (pooled adb shell sessions) or 'native' (adb server protocol).
+# Commands that a backend cannot execute (e.g. relying on the host shell) always fall back to the adb binary.
+def set_backend(name):
+    global backend
+
+    if name not in ADB_COMMANDS_BACKENDS:
+        blade_logger.logger.error(f"Error: Unknown adb backend '{name}'. Supported backends: {ADB_COMMANDS_BACKENDS}")
+        raise Exception(f"Error: Unknown adb backend '{name}'. Supported backends: {ADB_COMMANDS_BACKENDS}")
+
+    backend = name
+
 
 # returns adb identifier base don the connection type
-def __get_adb_identifier(device, connection, port=constants.ADB_OVER_WIFI_DEFAULT_PORT):
+def get_adb_identifier(device, connection, port=constants.ADB_OVER_WIFI_DEFAULT_PORT):
 
     if connection == "usb":
         return device["adb_identifier"]
@@ -30,15 +78,35 @@ def __get_adb_identifier(device, connection, port=constants.ADB_OVER_WIFI_DEFAUL
 # execute an adb command to the device ('adb -s <device_id> ' prefix is included automatically)
 def run_adb_command(device, connection, command, min_duration=None):
 
-    adb_identifier = __get_adb_identifier(device, connection)
-    command = f"adb -s {adb_identifier} {command}"
-    print(f"\t{command}", flush=True)
+    adb_identifier = get_adb_identifier(device, connection)
+    adb_command = f"adb -s {adb_identifier} {command}"
+    print(f"\t{adb_command}", flush=True)
 
     # run the command
     start_time = time.time()
-    output = subprocess.check_output(command, shell=True).rstrip().decode()
+    with latencylib.measure(get_command_type(command)):
+        output = __execute_adb_command(adb_identifier, command)
+
+    __ensure_min_duration(adb_command, start_time, min_duration)
+
+    return output
+
+
+# execute an adb command using the selected backend without raising if it fails, as os.system / os.popen would.
+# Returns (output, exit_code).
+def try_adb_command(device, connection, command):
+
+    try:
+        return run_adb_command(device, connection, command), 0
+
+    except subprocess.CalledProcessError as e:
+        output = e.output.decode(errors="replace") if isinstance(e.output, bytes) else (e.output or "")
+        return output.rstrip(), e.returncode
+
+
+# guarantee that a command started at start_time will run for at least min_duration seconds
+def __ensure_min_duration(command, start_time, min_duration):
 
-    # guarantee that the command will run for at least min_duration seconds
     elapsed_time = time.time() - start_time
     if min_duration:
         if elapsed_time < min_duration:
@@ -46,27 +114,297 @@ def run_adb_command(device, connection, command, min_duration=None):
         else:
             blade_logger.logger.warning(f"Warning: Command '{command}' took longer than expected ({elapsed_time} sec).")
 
+
+# execute an adb command ('adb -s <device_id> ' prefix not included) using the selected backend
+def __execute_adb_command(adb_identifier, command):
+
+    adb_command = f"adb -s {adb_identifier} {command}"
+
+    try:
+        if backend == "session":
+            device_command = __get_device_shell_command(command)
+            if device_command is not None:
+                output, exit_code = shell_session_pool.run(adb_identifier, device_command)
+                if exit_code != 0:
+                    raise subprocess.CalledProcessError(exit_code, adb_command, output=output)
+                return output.rstrip().decode()
+
+        elif backend == "native":
+            output = __execute_native_adb_command(adb_identifier, command)
+            if output is not None:
+                return output
+
+    except (adbsessionlib.AdbSessionError, adbclientlib.AdbClientError) as e:
+        __check_fallback(e)
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen(adb_command, shell=True, stdout=subprocess.PIPE)
+    latencylib.add_time("spawn", time.perf_counter() - start_time)
+
+    output, _ = process.communicate()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, adb_command, output=output)
+
+    return output.rstrip().decode()
+
+
+# fall back to the adb binary after a backend error, unless the command may already have run on the device
+# (running it again could repeat its effects, e.g. a tap, 'pm clear' or 'rm')
+def __check_fallback(error):
+
+    if error.command_sent:
+        blade_logger.logger.error(f"Error: {error} The command may have run on the device, not retrying.")
+        raise error
+
+    blade_logger.logger.warning(f"Warning: {error} Falling back to the adb binary.")
+    latencylib.add_retry()
+
+
+# returns the type of an adb command ('adb -s <device_id> ' prefix not included) for latency statistics, e.g.
+# 'shell dumpsys battery', 'shell input tap', 'shell getprop' or 'install' (arguments such as paths, packages or
+# numbers are dropped)
+def get_command_type(command):
+
+    tokens = command.split()
+    if len(tokens) == 0:
+        return "unknown"
+
+    if tokens[0] not in ["shell", "exec-out"] or len(tokens) == 1:
+        return tokens[0]
+
+    command_type = f"{tokens[0]} {tokens[1]}"
+    if len(tokens) > 2 and COMMAND_TYPE_SUBCOMMAND_PATTERN.match(tokens[2]):
+        command_type += f" {tokens[2]}"
+
+    return command_type
+
+
+# execute an adb command over the adb server protocol. Returns None if the command is not supported natively.
+def __execute_native_adb_command(adb_identifier, command):
+
+    device_command = __get_device_shell_command(command)
+    if device_command is not None:
+        stdout, stderr, exit_code = adb_client.shell(adb_identifier, device_command)
+        sys.stderr.write(stderr.decode(errors="replace"))
+        if exit_code != 0:
+            raise subprocess.CalledProcessError(exit_code, f"adb -s {adb_identifier} {command}", output=stdout, stderr=stderr)
+        return stdout.rstrip().decode()
+
+    tokens = __split_adb_command(command)
+    if tokens is None or any(token.startswith("-") for token in tokens):
+        return None
+
+    if tokens[0] == "pull" and len(tokens) in [2, 3]:
+        adb_client.pull(adb_identifier, *tokens[1:])
+        return ""
+
+    if tokens[0] == "push" and len(tokens) == 3:
+        adb_client.push(adb_identifier, *tokens[1:])
+        return ""
+
+    return None
+
+
+# split an adb command into the arguments adb would receive. Returns None if the command relies on the host
+# shell (pipes, redirections, variables, etc. outside quotes).
+def __split_adb_command(command):
+
+    if any(character in command for character in "$`\\\n"):
+        return None
+
+    try:
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return None
+
+    # host shell operators (e.g. '|', '>', '&&') are split into separate punctuation tokens
+    if len(tokens) == 0 or any(token and all(character in "();<>|&" for character in token) for token in tokens):
+        return None
+
+    return tokens
+
+
+# returns the device-side command of a plain 'shell <command>' invocation, or None for anything else
+def __get_device_shell_command(command):
+
+    tokens = __split_adb_command(command)
+    if tokens is None or len(tokens) < 2 or tokens[0] != "shell" or tokens[1].startswith("-"):
+        return None
+
+    # adb joins its arguments with spaces, the device shell parses them again
+    return " ".join(tokens[1:])
+
+
+# execute a list of shell commands on the device in a single round trip. Returns a list of (output, exit_code)
+# tuples, one per executed command. If stop_on_error is set, execution stops at the first failing command
+# (the returned list is shorter than commands). Raises subprocess.CalledProcessError if the batch did not run
+# (e.g. device offline) or was interrupted.
+def run_adb_batch(device, connection, commands, stop_on_error=False):
+
+    adb_identifier = get_adb_identifier(device, connection)
+    print(f"\tadb -s {adb_identifier} shell [batch] {'; '.join(commands)}", flush=True)
+
+    # every command runs in a subshell (so that e.g. 'exit' cannot end the batch) and is followed by a unique
+    # sentinel line carrying its exit code and its on-device start and end time ($EPOCHREALTIME, if supported)
+    sentinel = f"__BLADE_BATCH_{uuid.uuid4().hex}__"
+    script = (f'__blade_run() {{ __blade_start_time=$EPOCHREALTIME; (eval "$1") </dev/null; __blade_exit_code=$?; '
+              f'echo; echo "{sentinel}:$__blade_exit_code:$__blade_start_time:$EPOCHREALTIME"; return $__blade_exit_code; }}\n')
+    script += (" && " if stop_on_error else "; ").join(f"__blade_run {shlex.quote(command)}" for command in commands)
+
+    with latencylib.measure("batch"):
+        output, exit_code = __execute_device_shell_command(adb_identifier, script)
+
+        # split into [output_1, exit_code_1, start_time_1, end_time_1, output_2, ..., trailing]
+        parts = re.split(rb"\n" + sentinel.encode() + rb":(\d+):([\d.]*):([\d.]*)\n", output)
+        results = [(parts[i].rstrip().decode(), int(parts[i + 1])) for i in range(0, len(parts) - 1, 4)]
+
+        # on-device execution time of the commands themselves
+        durations = [float(parts[i + 3]) - float(parts[i + 2]) for i in range(0, len(parts) - 1, 4) if parts[i + 2] and parts[i + 3]]
+        if len(durations) == len(results) and len(results) > 0:
+            latencylib.set_time("execution", sum(durations))
+
+        # every command reports a sentinel, unless the batch stopped at a failing command
+        stopped_on_error = stop_on_error and len(results) > 0 and results[-1][1] != 0
+        if len(results) < len(commands) and not stopped_on_error:
+            adb_command = f"adb -s {adb_identifier} shell [batch]"
+            blade_logger.logger.error(f"Error: Batch on '{adb_identifier}' ran {len(results)} of {len(commands)} commands (exit code {exit_code}).")
+            raise subprocess.CalledProcessError(exit_code or 1, adb_command, output=output)
+
+    return results
+
+
+# device metadata (model, packages, etc.) cached per device and fetched with a single batch
+metadata_cache = devicemetadatalib.DeviceMetadataCache(run_adb_batch)
+
+
+# execute a device-side shell command (passed as-is, without host shell parsing) using the selected backend.
+# Returns (output, exit_code), with the raw output as bytes. The exit code is the one of the adb binary for the
+# 'cli' backend (non-zero if e.g. the device is offline), and of the command otherwise.
+def __execute_device_shell_command(adb_identifier, device_command):
+
+    try:
+        if backend == "session":
+            return shell_session_pool.run(adb_identifier, device_command)
+
+        if backend == "native":
+            stdout, stderr, exit_code = adb_client.shell(adb_identifier, device_command)
+            sys.stderr.write(stderr.decode(errors="replace"))
+            return stdout, exit_code
+
+    except (adbsessionlib.AdbSessionError, adbclientlib.AdbClientError) as e:
+        __check_fallback(e)
+
+    arguments = ["adb", "-s", adb_identifier, "shell", device_command]
+    start_time = time.perf_counter()
+    process = subprocess.Popen(arguments, stdout=subprocess.PIPE)
+    latencylib.add_time("spawn", time.perf_counter() - start_time)
+
+    output, _ = process.communicate()
+    return output, process.returncode
+
+
+# run the adb binary and return its stdout as bytes, recording its spawn time
+def __run_adb_process(arguments, check=False, output_file=None):
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen(arguments, stdout=subprocess.PIPE)
+    latencylib.add_time("spawn", time.perf_counter() - start_time)
+
+    # stream stdout to a file in chunks (returning its size), instead of holding it in memory
+    if output_file is not None:
+        output = 0
+        with process.stdout:
+            for chunk in iter(lambda: process.stdout.read(constants.ADB_EXEC_OUT_READ_SIZE), b""):
+                output_file.write(chunk)
+                output += len(chunk)
+        process.wait()
+    else:
+        output, _ = process.communicate()
+
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, arguments, output=None if output_file else output)
+
     return output
 
 
+# returns a device-side shell command that polls a shell condition until it holds or the timeout passes, to be
+# used within a batch (see run_adb_batch). Polling on the device costs no round trips, so no backoff is needed.
+# Its exit code is non-zero if the condition still does not hold at the timeout.
+def __wait_until_on_device(condition, timeout, interval=constants.ADB_ON_DEVICE_WAIT_INTERVAL):
+    checks = int(timeout / interval)
+    return f"i=0; until {condition} || [ $i -ge {checks} ]; do sleep {interval}; i=$((i+1)); done; {condition}"
+
+
+# returns a device-side shell command that waits until the app data folder of a package is cleared after
+# 'pm clear' (i.e. only the folders it keeps are left), to be used within a batch (see __wait_until_on_device)
+def __wait_until_app_data_cleared(package):
+    return __wait_until_on_device(f"[ -z \"$(su -c 'ls -A /data/data/{package}' | grep -v -x -E 'lib|cache|code_cache')\" ]",
+                                  timeout=constants.ADB_COMMANDS_EXTENDED_EXECUTION_TIMEOUT)
+
+
 # execute an adb shell su command to the device ('adb -s <device_id> shell su -c ' prefix is included automatically). Requires root access.
 def run_adb_shell_su_command(device, connection, command):
     command = f"shell su -c '{command}'"
     return run_adb_command(device, connection, command)
 
 
+# start a resident input injector on the device (see inputinjectorlib.InputInjector). Until stopped, gestures
+# (press_key, tap_screen, long_tap_screen, swipe_screen, roll and scroll) are injected through it, instead of
+# starting an `input` process for every event. While it runs, apps see ActivityManager.isUserAMonkey() as true.
+def start_input_injector(device, connection):
+
+    adb_identifier = get_adb_identifier(device, connection)
+    if adb_identifier in input_injectors:
+        return input_injectors[adb_identifier]
+
+    injector = inputinjectorlib.InputInjector(adb_identifier, client=adb_client if backend == "native" else None)
+    injector.start()
+    input_injectors[adb_identifier] = injector
+
+    return injector
+
+
+# stop the input injector of the device, if started
+def stop_input_injector(device, connection):
+
+    injector = input_injectors.pop(get_adb_identifier(device, connection), None)
+    if injector is not None:
+        injector.stop()
+
+
+# run a gesture program on the device's input injector. Returns False if no injector is started.
+def __run_input_program(device, connection, program, min_duration=None):
+
+    adb_identifier = get_adb_identifier(device, connection)
+    injector = input_injectors.get(adb_identifier)
+    if injector is None:
+        return False
+
+    print(f"\t[input injector {adb_identifier}] {'; '.join(program)}", flush=True)
+    start_time = time.time()
+    with latencylib.measure("input injector"):
+        injector.run(program)
+    __ensure_min_duration(f"[input injector {adb_identifier}] {'; '.join(program)}", start_time, min_duration)
+
+    return True
+
+
 def type_text(device, connection, text):
     run_adb_command(device, connection, f"shell input text {text}")
 
 
 # simulates a key press event
 def press_key(device, connection, key):
-    run_adb_command(device, connection, f"shell input keyevent {key}")
+    if not __run_input_program(device, connection, [f"press {key}"]):
+        run_adb_command(device, connection, f"shell input keyevent {key}")
 
 
 # tap at x, y coordinates
 def tap_screen(device, connection, x, y):
-    run_adb_command(device, connection, f"shell input tap {x} {y}")
+    if not __run_input_program(device, connection, inputinjectorlib.tap_program(x, y)):
+        run_adb_command(device, connection, f"shell input tap {x} {y}")
 
 
 # long tap at x, y coordinates (uses swipe command)
@@ -76,6 +414,11 @@ def long_tap_screen(device, connection, x, y):
 
 # swipe from (x, y) to (x, y) coordinates, with a duration in milliseconds
 def swipe_screen(device, connection, from_x, from_y, to_x, to_y, duration=1000, min_duration=None):
+
+    program = inputinjectorlib.swipe_program([(from_x, from_y), (to_x, to_y)], duration)
+    if __run_input_program(device, connection, program, min_duration=min_duration):
+        return
+
     run_adb_command(
         device,
         connection,
@@ -85,11 +428,13 @@ def swipe_screen(device, connection, from_x, from_y, to_x, to_y, duration=1000,
 
 
 def roll(device, connection, dx, dy, min_duration=None):
-    run_adb_command(device, connection, f"shell input roll {dx} {dy}", min_duration=min_duration)
+    if not __run_input_program(device, connection, [f"trackball {dx} {dy}"], min_duration=min_duration):
+        run_adb_command(device, connection, f"shell input roll {dx} {dy}", min_duration=min_duration)
 
 
-# simulate a scroll up or down gesture
-def scroll(device, connection, direction, length=1200, duration=1000, min_duration=None):
+# simulate a scroll up or down gesture. With an input injector started, count scrolls can be performed in a single
+# program, pausing pause milliseconds in between (timed on the device).
+def scroll(device, connection, direction, length=1200, duration=1000, min_duration=None, count=1, pause=0):
 
     if direction == "up":
         from_y = 600
@@ -103,20 +448,20 @@ def scroll(device, connection, direction, length=1200, duration=1000, min_durati
         blade_logger.logger.error(f"Error: Unsupported scroll direction.")
         raise Exception(f"Error: Unsupported scroll direction.")
 
-    swipe_screen(device, connection, 500, from_y, 500, to_y, duration, min_duration=min_duration)
+    program = inputinjectorlib.repeat_program(inputinjectorlib.swipe_program([(500, from_y), (500, to_y)], duration), count, pause)
+    if __run_input_program(device, connection, program, min_duration=min_duration):
+        return
+
+    for i in range(count):
+        if i > 0:
+            time.sleep(pause / 1000)
+        swipe_screen(device, connection, 500, from_y, 500, to_y, duration, min_duration=min_duration)
 
 
 # get the current battery info (e.g. level, status, etc.)
 def get_battery_details(device, connection):
     result = run_adb_command(device, connection, "shell dumpsys battery")
-
-    # Parse the output
-    battery_info = {}
-    for line in result.splitlines()[1:]:
-        if ":" in line:
-            key, value = line.split(":", 1)
-
-            battery_info[key.strip()] = __simplest_type(value.strip())
+    battery_info = dumpsyslib.parse_battery(result)
 
     # add battery level ratio
     battery_level_ratio = battery_info["level"] / battery_info["scale"]
@@ -125,27 +470,26 @@ def get_battery_details(device, connection):
     return battery_info
 
 
-def __simplest_type(s):
-    try:
-        return literal_eval(s)
-    except:
-        return s
-
-
 # returns foreground application
 def get_foreground_app(device, connection):
 
-    app = run_adb_command(
+    output = run_adb_command(
         device,
         connection,
-        "shell dumpsys activity activities | grep -E 'mCurrentFocus' | cut -d '/' -f1 | sed 's/.* //g'",
+        "shell dumpsys activity activities | grep -E 'mCurrentFocus|ResumedActivity'",
     )
-    return app
+    activity = dumpsyslib.parse_activity(output)
+    return activity["focused_package"] or activity["resumed_package"]
 
 
 # returns device model
 def get_device_model(device, connection):
-    return run_adb_command(device, connection, "shell getprop ro.product.model")
+    return metadata_cache.get_model(device, connection)
+
+
+# returns screen resolution as (width, height)
+def get_screen_resolution(device, connection):
+    return metadata_cache.get_screen_resolution(device, connection)
 
 
 # start an activity
@@ -192,31 +536,143 @@ def save_app_profile(device, connection, package, filename):
 
 def restore_app_profile(device, connection, package, filename):
 
-    # check if file exists
-    output = run_adb_shell_su_command(device, connection,
-                                           f"ls /data/local/tmp/{filename}").strip()
-    
-    # TODO: change into a more robust check, in a new function
-    if "No such file or directory" in output:
+    # check that the file exists, clear app data (waiting on the device until the data folder is empty) and
+    # restore it from the backup file, in a single round trip
+    results = run_adb_batch(device, connection, [
+        f"su -c 'ls /data/local/tmp/{filename}'",
+        f"pm clear {package}",
+        __wait_until_app_data_cleared(package),
+        f"su -c 'tar -xzvf /data/local/tmp/{filename} -C /data/data/{package}'",
+    ], stop_on_error=True)
+
+    if results[0][1] != 0:
         blade_logger.logger.error(f"Error: File /data/local/tmp/'{filename}' does not exist.")
         raise Exception(f"Error: File /data/local/tmp/'{filename}' does not exist.")
-    
-    # clear first
-    clear_app_data(device, connection, package)
-    time.sleep(constants.ADB_COMMANDS_EXTENDED_EXECUTION_TIMEOUT)
 
-    # Restore app data from the backup file
-    run_adb_shell_su_command(device, connection,
-                             f"tar -xzvf /data/local/tmp/{filename} -C /data/data/{package}")
+    if len(results) == 3:
+        blade_logger.logger.error(f"Error: App data of package '{package}' was not cleared in time.")
+        raise Exception(f"Error: App data of package '{package}' was not cleared in time.")
+
+    if len(results) < 4 or results[-1][1] != 0:
+        blade_logger.logger.error(f"Error: Could not restore app profile '{filename}' for package '{package}'.")
+        raise Exception(f"Error: Could not restore app profile '{filename}' for package '{package}'.")
+
+
+# stream the app data folder to the host as an uncompressed tar archive (no compression cost on the device),
+# written in chunks to a binary file object. Returns the size of the archive in bytes. Requires root access.
+def export_app_data(device, connection, package, output_file):
+
+    size = run_adb_exec_out(device, connection, f"su -c 'tar -cf - -C /data/data/{package} .'", output_file=output_file)
+    if size == 0:
+        blade_logger.logger.error(f"Error: Could not export app data of package '{package}'.")
+        raise Exception(f"Error: Could not export app data of package '{package}'.")
+
+    return size
+
+
+# restore the app data folder from an uncompressed tar archive already on the device, clearing the app data first,
+# in a single round trip. Returns False (leaving the app data untouched) if the archive is not on the device or its
+# size differs (e.g. after an interrupted push). Requires root access.
+def restore_app_data(device, connection, package, remote_path, size):
+
+    results = run_adb_batch(device, connection, [
+        f"[ \"$(stat -c %s {remote_path} 2>/dev/null)\" = \"{size}\" ]",
+        f"pm clear {package}",
+        __wait_until_app_data_cleared(package),
+        f"su -c 'tar -xf {remote_path} -C /data/data/{package}'",
+    ], stop_on_error=True)
+
+    if results[0][1] != 0:
+        return False
+
+    if len(results) == 3:
+        blade_logger.logger.error(f"Error: App data of package '{package}' was not cleared in time.")
+        raise Exception(f"Error: App data of package '{package}' was not cleared in time.")
+
+    if len(results) < 4 or results[-1][1] != 0:
+        blade_logger.logger.error(f"Error: Could not restore app data of package '{package}' from '{remote_path}'.")
+        raise Exception(f"Error: Could not restore app data of package '{package}' from '{remote_path}'.")
+
+    return True
+
+
+# execute a device-side command and return its raw stdout as bytes (as 'adb exec-out'), without the text
+# processing of the shell (suitable for binary output, e.g. images). If output_file (a binary file object) is
+# given, stdout is streamed to it in chunks instead, and its size in bytes is returned.
+def run_adb_exec_out(device, connection, command, output_file=None):
+
+    adb_identifier = get_adb_identifier(device, connection)
+    print(f"\tadb -s {adb_identifier} exec-out {command}", flush=True)
+
+    with latencylib.measure(get_command_type(f"exec-out {command}")):
+        if backend == "native":
+            try:
+                return adb_client.exec_out(adb_identifier, command, output=output_file)
+            except adbclientlib.AdbClientError as e:
+                # a partially streamed output cannot be retried
+                __check_fallback(e)
+
+        return __run_adb_process(["adb", "-s", adb_identifier, "exec-out", command], check=True,
+                                 output_file=output_file)
+
+
+# capture the screen, streamed directly to the host (nothing is written to the device storage). Returns the PNG
+# image as bytes, or if raw is set, a dict with width, height, format, bytes_per_pixel and pixels (bytes), which
+# skips the PNG encoding on the device.
+def capture_screen(device, connection, raw=False):
+
+    data = run_adb_exec_out(device, connection, "screencap" if raw else "screencap -p")
+    if not raw:
+        if not data.startswith(b"\x89PNG"):
+            blade_logger.logger.error("Error: Could not capture the screen.")
+            raise Exception("Error: Could not capture the screen.")
+        return data
+
+    # header: width, height, format (and colour space since Android 9), as little-endian uint32
+    if len(data) < 12:
+        blade_logger.logger.error("Error: Could not capture the screen.")
+        raise Exception("Error: Could not capture the screen.")
+
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    if pixel_format not in SCREENCAP_PIXEL_FORMATS:
+        blade_logger.logger.error(f"Error: Unsupported screencap pixel format '{pixel_format}'.")
+        raise Exception(f"Error: Unsupported screencap pixel format '{pixel_format}'.")
+
+    format_name, bytes_per_pixel = SCREENCAP_PIXEL_FORMATS[pixel_format]
+    header_size = len(data) - width * height * bytes_per_pixel
+    if header_size not in [12, 16]:
+        blade_logger.logger.error("Error: Unexpected size of the raw screen capture.")
+        raise Exception("Error: Unexpected size of the raw screen capture.")
+
+    return {
+        "width": width,
+        "height": height,
+        "format": format_name,
+        "bytes_per_pixel": bytes_per_pixel,
+        "pixels": data[header_size:],
+    }
 
 
 # take a screenshot and store it into a local file
 def take_screenshot(device, connection, filename):
-    run_adb_command(device, connection,
-                    f"shell screencap -p /sdcard/screenshot.png")
-    run_adb_command(device, connection,
-                    f"pull /sdcard/screenshot.png {filename}")
-    run_adb_command(device, connection, f"shell rm /sdcard/screenshot.png")
+
+    with open(filename, "wb") as f:
+        f.write(capture_screen(device, connection))
+
+
+# start recording the screen continuously into rolling h264 segments (see screenrecordlib.ScreenRecorder).
+# Returns the recorder; call its stop() method to end the recording.
+def start_screen_recording(device, connection, output_path, prefix="screenrecord",
+                           segment_duration=constants.SCREEN_RECORD_DEFAULT_SEGMENT_DURATION,
+                           max_segments=constants.SCREEN_RECORD_DEFAULT_MAX_SEGMENTS,
+                           bit_rate=None, size=None):
+
+    adb_identifier = get_adb_identifier(device, connection)
+    recorder = screenrecordlib.ScreenRecorder(adb_identifier, output_path, prefix, segment_duration, max_segments,
+                                              bit_rate, size, client=adb_client if backend == "native" else None)
+    recorder.start()
+
+    return recorder
 
 
 # open a url on an activity (e.g. browser)
@@ -238,38 +694,39 @@ def open_url_on_activity(device, connection, package, activity, url, min_duratio
     )
 
 
-# setup device for the experiment: disable notifications, disable screen timeout, etc.
-def setup_device(device, connection):
+# setup device for the experiment: disable notifications, disable screen timeout, etc. If input_injector is set,
+# gestures are injected through a resident input injector (see start_input_injector) until cleanup_device.
+def setup_device(device, connection, input_injector=False):
 
-    # disable notifications
-    run_adb_command(
-        device, connection, "shell settings put global heads_up_notifications_enabled 0"
-    )
-
-    # disable screen timeout
     default_screen_timeout = 2147483647
-    run_adb_command(
-        device,
-        connection,
-        f"shell settings put system screen_off_timeout {default_screen_timeout}",
-    )
+    __run_settings_batch(device, connection, [
+        "settings put global heads_up_notifications_enabled 0",  # disable notifications
+        f"settings put system screen_off_timeout {default_screen_timeout}",  # disable screen timeout
+    ])
+
+    if input_injector:
+        start_input_injector(device, connection)
 
 
 # cleanup device after the experiment: re-enable notifications, restore screen timeout, etc.
 def cleanup_device(device, connection):
 
-    # re-enable notifications
-    run_adb_command(
-        device, connection, "shell settings put global heads_up_notifications_enabled 1"
-    )
+    stop_input_injector(device, connection)
 
-    # restore screen timeout
     default_screen_timeout = 30000
-    run_adb_command(
-        device,
-        connection,
-        f"shell settings put system screen_off_timeout {default_screen_timeout}",
-    )
+    __run_settings_batch(device, connection, [
+        "settings put global heads_up_notifications_enabled 1",  # re-enable notifications
+        f"settings put system screen_off_timeout {default_screen_timeout}",  # restore screen timeout
+    ])
+
+
+# run a batch of settings commands, raising an error if any of them fails
+def __run_settings_batch(device, connection, commands):
+
+    for command, (output, exit_code) in zip(commands, run_adb_batch(device, connection, commands)):
+        if exit_code != 0:
+            blade_logger.logger.error(f"Error: Command '{command}' failed with exit code {exit_code}: {output}")
+            raise Exception(f"Error: Command '{command}' failed with exit code {exit_code}: {output}")
 
 
 # set device brightness level (0-255)
@@ -302,17 +759,17 @@ def switch_screen(device, connection, state):
     # switch screen if needed
     if state != current_state:
         press_key(device, connection, "KEYCODE_POWER")
+        return True
+
+    return False
 
 
 # returns screen state ('on' or 'off')
 def get_screen_state(device, connection):
 
     # get current screen state
-    current_state = run_adb_command(
-        device,
-        connection,
-        "shell dumpsys display | grep 'mScreenState' | cut -d '=' -f2 | sed 's/ //g'",
-    )
+    output = run_adb_command(device, connection, "shell dumpsys display | grep 'mScreenState'")
+    current_state = dumpsyslib.parse_display(output)["screen_state"]
 
     if current_state == "ON":
         return "on"
@@ -345,7 +802,8 @@ def get_screen_lock_state(device, connection):
 
 # returns the app_package of the current focus application
 def get_current_focus(device, connection):
-    return run_adb_command(device, connection, "shell dumpsys window displays | grep -E mCurrentFocus | cut -d '/' -f1 | sed 's/.* //g'")
+    output = run_adb_command(device, connection, "shell dumpsys window displays | grep -E mCurrentFocus")
+    return dumpsyslib.parse_activity(output)["focused_package"]
 
 
 # press power button
@@ -355,10 +813,22 @@ def power_button(device, connection):
 
 # unlock device
 def unlock_device(device, connection):
-    switch_screen(device, connection, "on")
-    time.sleep(constants.ADB_COMMANDS_EXECUTION_TIMEOUT)
+
+    # wake up the screen (if off) and wait until it is on
+    if switch_screen(device, connection, "on"):
+        tools.wait_until(lambda: get_screen_state(device, connection) == "on",
+                         timeout=constants.ADB_COMMANDS_EXECUTION_TIMEOUT)
+
+    # nothing to dismiss if the lock screen is not shown
+    if get_current_focus(device, connection) not in KEYGUARD_FOCUS_WINDOWS:
+        return
+
+    # dismiss the lock screen and wait until another window has the focus
     press_key(device, connection, "KEYCODE_MENU")
-    time.sleep(constants.ADB_COMMANDS_EXECUTION_TIMEOUT)
+    unlocked = tools.wait_until(lambda: get_current_focus(device, connection) not in KEYGUARD_FOCUS_WINDOWS + [None],
+                                timeout=constants.ADB_COMMANDS_EXECUTION_TIMEOUT)
+    if not unlocked:
+        blade_logger.logger.warning("Warning: Lock screen still shown (e.g. secure lock).")
 
 
 def enable_proxy(device, connection, port=constants.PROXY_DEFAULT_SERVER_PORT):
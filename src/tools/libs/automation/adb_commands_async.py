@@ -0,0 +1,213 @@
+# Note:   asyncio flavour of the ADB device-control functions (running adb_commands in worker threads), for preparing
+#         several devices concurrently
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import asyncio
+import functools
+import weakref
+
+from libs.automation import adb_commands
+from libs import constants
+from libs import logger as blade_logger
+
+
+class AdbCommandLimiter:
+
+    def __init__(self,
+                 max_concurrent_commands=constants.ADB_ASYNC_MAX_CONCURRENT_COMMANDS,
+                 max_concurrent_commands_per_device=constants.ADB_ASYNC_MAX_CONCURRENT_COMMANDS_PER_DEVICE):
+        """
+        Limit the number of adb operations (adb_commands calls) running at the same time, globally and per device.
+
+        Semaphores are created per event loop, so the same limiter can be used across
+        multiple `asyncio.run()` calls.
+
+        Args:
+            max_concurrent_commands (int): Maximum number of adb operations running across all devices
+            max_concurrent_commands_per_device (int): Maximum number of adb operations running on a single device
+        """
+        if max_concurrent_commands < 1 or max_concurrent_commands_per_device < 1:
+            blade_logger.logger.error("Error: Concurrency limits must be at least 1.")
+            raise ValueError("Error: Concurrency limits must be at least 1.")
+
+        self.max_concurrent_commands = max_concurrent_commands
+        self.max_concurrent_commands_per_device = max_concurrent_commands_per_device
+        self.__semaphores = weakref.WeakKeyDictionary()  # event loop -> (global semaphore, {adb_identifier: semaphore})
+
+    async def run(self, adb_identifier, coroutine_function, *args):
+        """
+        Await `coroutine_function(*args)` once a global and a per-device slot are available.
+
+        Args:
+            adb_identifier (str): Device serial or ip:port
+            coroutine_function (callable): Coroutine function to await
+            *args: Positional arguments passed to coroutine_function
+
+        Returns:
+            The result of the awaited coroutine.
+        """
+        global_semaphore, device_semaphores = self.__get_semaphores()
+        if adb_identifier not in device_semaphores:
+            device_semaphores[adb_identifier] = asyncio.Semaphore(self.max_concurrent_commands_per_device)
+
+        # acquire the device slot first, so queued commands of a busy device do not hold global slots
+        async with device_semaphores[adb_identifier]:
+            async with global_semaphore:
+                return await coroutine_function(*args)
+
+    def __get_semaphores(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.__semaphores:
+            self.__semaphores[loop] = (asyncio.Semaphore(self.max_concurrent_commands), {})
+        return self.__semaphores[loop]
+
+
+# concurrency limits shared by all commands of this process (see set_limits)
+limiter = AdbCommandLimiter()
+
+
+# change the global and per-device concurrency limits
+def set_limits(max_concurrent_commands=constants.ADB_ASYNC_MAX_CONCURRENT_COMMANDS,
+               max_concurrent_commands_per_device=constants.ADB_ASYNC_MAX_CONCURRENT_COMMANDS_PER_DEVICE):
+    global limiter
+    limiter = AdbCommandLimiter(max_concurrent_commands, max_concurrent_commands_per_device)
+
+
+# run a function of adb_commands (or any blocking function taking device and connection first) in a worker thread,
+# once a global and a per-device slot are available. The sync implementation is the single source of truth: the
+# selected backend, batching, metadata cache and latency statistics all apply.
+async def __run(function, device, connection, *args, **kwargs):
+    adb_identifier = adb_commands.get_adb_identifier(device, connection)
+    return await limiter.run(adb_identifier, asyncio.to_thread, functools.partial(function, device, connection, *args, **kwargs))
+
+
+# execute an adb command to the device ('adb -s <device_id> ' prefix is included automatically)
+async def run_adb_command(device, connection, command, min_duration=None):
+    return await __run(adb_commands.run_adb_command, device, connection, command, min_duration=min_duration)
+
+
+# execute a list of shell commands on the device in a single round trip (see adb_commands.run_adb_batch)
+async def run_adb_batch(device, connection, commands, stop_on_error=False):
+    return await __run(adb_commands.run_adb_batch, device, connection, commands, stop_on_error=stop_on_error)
+
+
+# execute an adb shell su command to the device ('adb -s <device_id> shell su -c ' prefix is included automatically). Requires root access.
+async def run_adb_shell_su_command(device, connection, command):
+    return await __run(adb_commands.run_adb_shell_su_command, device, connection, command)
+
+
+# simulates a key press event
+async def press_key(device, connection, key):
+    await __run(adb_commands.press_key, device, connection, key)
+
+
+# tap at x, y coordinates
+async def tap_screen(device, connection, x, y):
+    await __run(adb_commands.tap_screen, device, connection, x, y)
+
+
+# returns device model
+async def get_device_model(device, connection):
+    return await __run(adb_commands.get_device_model, device, connection)
+
+
+# force stop an application
+async def close_app(device, connection, package, min_duration=None):
+    await __run(adb_commands.close_app, device, connection, package, min_duration=min_duration)
+
+
+# clear app data
+async def clear_app_data(device, connection, package, min_duration=None):
+    await __run(adb_commands.clear_app_data, device, connection, package, min_duration=min_duration)
+
+
+# setup device for the experiment: disable notifications, disable screen timeout, etc. (and optionally start the
+# input injector, see adb_commands.setup_device)
+async def setup_device(device, connection, input_injector=False):
+    await __run(adb_commands.setup_device, device, connection, input_injector=input_injector)
+
+
+# cleanup device after the experiment: re-enable notifications, restore screen timeout, etc.
+async def cleanup_device(device, connection):
+    await __run(adb_commands.cleanup_device, device, connection)
+
+
+# set device brightness level (0-255)
+async def set_brightness(device, connection, brightness):
+    await __run(adb_commands.set_brightness, device, connection, brightness)
+
+
+async def enable_proxy(device, connection, port=constants.PROXY_DEFAULT_SERVER_PORT):
+    await __run(adb_commands.enable_proxy, device, connection, port)
+
+
+async def disable_proxy(device, connection):
+    await __run(adb_commands.disable_proxy, device, connection)
+
+
+# install Android apk on device
+async def install_application(device, connection, apk_path):
+    await run_adb_command(device, connection, f"install {apk_path}")
+    adb_commands.metadata_cache.invalidate(device)
+
+
+# uninstall Android apk on device
+async def uninstall_application(device, connection, apk_name):
+    await run_adb_command(device, connection, f"uninstall {apk_name}")
+    adb_commands.metadata_cache.invalidate(device)
+
+
+# unlock device
+async def unlock_device(device, connection):
+    await __run(adb_commands.unlock_device, device, connection)
+
+
+# prepare a single device for an experiment (setup, brightness, proxy and app install)
+async def prepare_device(device, connection, brightness=None, proxy_port=None, apk_path=None, input_injector=False):
+
+    await setup_device(device, connection, input_injector=input_injector)
+
+    if brightness is not None:
+        await set_brightness(device, connection, brightness)
+
+    if proxy_port is not None:
+        await enable_proxy(device, connection, proxy_port)
+
+    if apk_path is not None:
+        await install_application(device, connection, apk_path)
+
+
+# undo prepare_device on a single device
+async def teardown_device(device, connection, disable_proxy_settings=False, apk_name=None):
+
+    await cleanup_device(device, connection)
+
+    if disable_proxy_settings:
+        await disable_proxy(device, connection)
+
+    if apk_name is not None:
+        await uninstall_application(device, connection, apk_name)
+
+
+# prepare multiple devices concurrently. Returns a list with one result per device (None, or the raised exception).
+async def prepare_devices(devices, connection, brightness=None, proxy_port=None, apk_path=None, input_injector=False):
+    return await __gather_devices(devices, "prepare", prepare_device, connection, brightness, proxy_port, apk_path,
+                                  input_injector)
+
+
+# teardown multiple devices concurrently. Returns a list with one result per device (None, or the raised exception).
+async def teardown_devices(devices, connection, disable_proxy_settings=False, apk_name=None):
+    return await __gather_devices(devices, "teardown", teardown_device, connection, disable_proxy_settings, apk_name)
+
+
+# run a per-device coroutine function on all devices, so that a failing device does not cancel the others
+async def __gather_devices(devices, action, coroutine_function, *args):
+
+    results = await asyncio.gather(*[coroutine_function(device, *args) for device in devices], return_exceptions=True)
+
+    for device, result in zip(devices, results):
+        if isinstance(result, Exception):
+            blade_logger.logger.error(f"Error: Could not {action} device '{device['adb_identifier']}': {result}")
+
+    return results
@@ -0,0 +1,195 @@
+# Note:   On-disk cache for analysis results, keyed by the content of the analysed files
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+
+from libs import tools
+from libs import constants
+from libs import logger as blade_logger
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "blade", "analysis")
+
+
+class AnalysisCache:
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_size=constants.ANALYSIS_CACHE_DEFAULT_MAX_SIZE, content_hash=False):
+        """
+        Initialize a new on-disk analysis cache.
+
+        Args:
+            path (str): Cache directory. Defaults to '~/.cache/blade/analysis'
+            max_size (int): Maximum total size of cached results in bytes. Least recently used results are evicted first
+            content_hash (bool): Fingerprint input files by their sha256 content hash instead of size and mtime (slower, but robust to copies and touches)
+        """
+        self.path = path
+        self.max_size = max_size
+        self.content_hash = content_hash
+        tools.ensure_path(self.path)
+
+    def get_or_compute(self, filenames, func, *args, **kwargs):
+        """
+        Return the cached result of func(*args, **kwargs), computing and storing it on a miss.
+
+        Args:
+            filenames (str or list): Input file(s) the result depends on
+            func (callable): Function to compute the result
+            *args, **kwargs: Parameters passed to func (part of the cache key)
+
+        Returns:
+            Result of func(*args, **kwargs)
+        """
+        key = self.key(filenames, func, *args, **kwargs)
+
+        found, result = self.get(key)
+        if found:
+            return result
+
+        result = func(*args, **kwargs)
+        self.put(key, result)
+        return result
+
+    def cached(self, func):
+        """
+        Decorate a function whose first argument is the input filename, so that its results are cached.
+
+        Args:
+            func (callable): Function of the form func(filename, *args, **kwargs)
+
+        Returns:
+            callable: Cached version of func
+        """
+        @functools.wraps(func)
+        def wrapper(filename, *args, **kwargs):
+            return self.get_or_compute(filename, func, filename, *args, **kwargs)
+
+        return wrapper
+
+    def key(self, filenames, func, *args, **kwargs):
+        """
+        Build the cache key of a computation.
+
+        Args:
+            filenames (str or list): Input file(s) the result depends on
+            func (callable): Function computing the result
+            *args, **kwargs: Parameters passed to func
+
+        Returns:
+            str: Hex digest identifying the computation
+        """
+        if isinstance(filenames, str):
+            filenames = [filenames]
+
+        # partials are described by their wrapped function and bound parameters
+        if isinstance(func, functools.partial):
+            args = func.args + args
+            kwargs = {**func.keywords, **kwargs}
+            func = func.func
+
+        fingerprints = [fingerprint(filename, content_hash=self.content_hash) for filename in filenames]
+        description = repr((func.__module__, func.__qualname__, fingerprints, args, sorted(kwargs.items())))
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): Cache key (see key())
+
+        Returns:
+            tuple: (found, result). result is None if not found
+        """
+        filename = self.__entry_path(key)
+
+        try:
+            with open(filename, "rb") as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except (OSError, pickle.UnpicklingError, EOFError):
+            blade_logger.logger.warning(f"Warning: Ignoring corrupted cache entry '{filename}'.")
+            return False, None
+
+        # mark as recently used
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+
+        return True, result
+
+    def put(self, key, result):
+        """
+        Store a result, evicting least recently used results if the cache grows above max_size.
+
+        Args:
+            key (str): Cache key (see key())
+            result: Picklable result
+        """
+        # write atomically, as multiple processes may share the cache
+        fd, tmp_filename = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, self.__entry_path(key))
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used results until the cache fits into max_size.
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".pkl"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        """
+        Remove all cached results.
+        """
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".pkl"):
+                os.remove(entry.path)
+
+    def __entry_path(self, key):
+        return os.path.join(self.path, f"{key}.pkl")
+
+
+def fingerprint(filename, content_hash=False):
+    """
+    Fingerprint a file, so that cached results are invalidated when it changes.
+
+    Args:
+        filename (str): Path to the file
+        content_hash (bool): Use the sha256 of the content instead of size and mtime
+
+    Returns:
+        tuple: Fingerprint of the file
+    """
+    stat = os.stat(filename)
+
+    if not content_hash:
+        return (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
+    sha256 = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(constants.ANALYSIS_CACHE_HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+
+    return (stat.st_size, sha256.hexdigest())
@@ -0,0 +1,327 @@
+# Note:   Analyse all runs of a measurement campaign in parallel
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from libs import powerlib
+from libs import constants
+from libs import logger as blade_logger
+
+
+def discover_runs(root_path):
+    """
+    Discover all run directories under a campaign output tree.
+
+    A run directory is any directory holding a Monsoon capture or an ADB measurements file.
+
+    Args:
+        root_path (str): Root of the campaign output tree
+
+    Returns:
+        list: Sorted list of run directory paths
+    """
+    run_filenames = set(constants.ANALYSIS_MONSOON_FILENAMES + [constants.ANALYSIS_ADB_FILENAME])
+
+    runs = []
+    for path, _, filenames in os.walk(root_path):
+        if run_filenames.intersection(filenames):
+            runs.append(path)
+
+    return sorted(runs)
+
+
+def find_run_files(run_path):
+    """
+    Locate the measurement files of a single run.
+
+    Args:
+        run_path (str): Path to the run directory
+
+    Returns:
+        dict: Paths of the 'monsoon' capture and 'adb' measurements (or None if missing),
+              and lists of 'memory' csv files and 'tslogger' json files
+    """
+    run_files = {
+        "monsoon": None,
+        "adb": None,
+        "memory": [],
+        "tslogger": [],
+    }
+
+    for filename in constants.ANALYSIS_MONSOON_FILENAMES:
+        if os.path.exists(os.path.join(run_path, filename)):
+            run_files["monsoon"] = os.path.join(run_path, filename)
+            break
+
+    if os.path.exists(os.path.join(run_path, constants.ANALYSIS_ADB_FILENAME)):
+        run_files["adb"] = os.path.join(run_path, constants.ANALYSIS_ADB_FILENAME)
+
+    for filename in sorted(os.listdir(run_path)):
+        file_path = os.path.join(run_path, filename)
+
+        if filename.endswith(".csv") and __is_memory_file(file_path):
+            run_files["memory"].append(file_path)
+
+        elif filename.endswith(".json") and __is_tslogger_file(file_path):
+            run_files["tslogger"].append(file_path)
+
+    return run_files
+
+
+def analyze_run(run_path, include_stages=False):
+    """
+    Compute the summary metrics of a single run.
+
+    Args:
+        run_path (str): Path to the run directory
+        include_stages (bool): Also compute a per-stage breakdown from the run's TSLogger files
+
+    Returns:
+        dict: One summary row (energy, discharge, CPU and memory statistics). If include_stages is set,
+              the row also holds a 'stage_breakdown' list with one row per stage
+    """
+    run_files = find_run_files(run_path)
+
+    row = {
+        "run": run_path,
+        "duration_sec": None,
+        "samples": 0,
+        "energy_mWh": None,
+        "discharge_mAh": None,
+        "avg_power_mW": None,
+        "cpu_util_mean": None,
+        "cpu_util_max": None,
+        "pss_mean": None,
+        "pss_max": None,
+        "rss_mean": None,
+        "rss_max": None,
+        "stages": 0,
+    }
+
+    # stages (TSLogger)
+    stages = {}
+    for filename in run_files["tslogger"]:
+        with open(filename, encoding="utf-8") as f:
+            stages.update(json.load(f))
+    row["stages"] = len(stages)
+
+    # energy and discharge (Monsoon), of the whole run and of every complete stage in a single pass over the capture
+    stage_power = {}
+    if run_files["monsoon"] is not None:
+        windows = {}
+        if include_stages:
+            start_time = powerlib.read_monsoon_start_time(run_files["monsoon"])
+            if start_time is not None:
+                windows = {stage: (entry["time_start"] - start_time, entry["time_end"] - start_time)
+                           for stage, entry in stages.items() if entry.get("time_end") is not None}
+
+        (energy, discharge, duration, samples), window_results = powerlib.compute_capture_power_performance_windows(
+            run_files["monsoon"], list(windows.values()))
+        stage_power = dict(zip(windows, window_results))
+
+        row["duration_sec"] = duration
+        row["samples"] = samples
+        row["energy_mWh"] = energy
+        row["discharge_mAh"] = discharge
+        if duration > 0:
+            row["avg_power_mW"] = energy / (duration / 3600)
+
+    # CPU utilization (ADB). First sample is computed against a zero baseline, so it is skipped.
+    adb = None
+    if run_files["adb"] is not None:
+        adb = pd.read_csv(run_files["adb"], usecols=["timestamp", "cpu_util"]).iloc[1:]
+        adb["cpu_util"] = pd.to_numeric(adb["cpu_util"], errors="coerce")
+        adb = powerlib.normalize_timestamps(adb.dropna(), "adb")
+        row["cpu_util_mean"], row["cpu_util_max"] = __mean_max(adb["cpu_util"])
+
+    # memory (PSS and RSS, in kilobytes)
+    memory = None
+    if run_files["memory"]:
+        memory = pd.concat([pd.read_csv(filename) for filename in run_files["memory"]], ignore_index=True)
+        memory = powerlib.normalize_timestamps(memory, "memory")
+        row["pss_mean"], row["pss_max"] = __mean_max(memory["pss"])
+        row["rss_mean"], row["rss_max"] = __mean_max(memory["rss"])
+
+    if include_stages:
+        row["stage_breakdown"] = []
+        for stage, entry in sorted(stages.items(), key=lambda item: item[1]["time_start"]):
+            row["stage_breakdown"].append(__analyze_stage(run_path, stage, entry, stage_power.get(stage), adb, memory))
+
+    return row
+
+
+def analyze_campaign(root_path, workers=None, analyze_func=analyze_run, cache=None):
+    """
+    Analyse all runs of a campaign in parallel and collect a single summary table.
+
+    Each run is analysed in a separate process. A failing run does not stop the campaign; its
+    row is reported with the error message instead. Rows are always returned in discovery order,
+    independently of the order in which runs complete.
+
+    Args:
+        root_path (str): Root of the campaign output tree
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs
+        analyze_func (callable): Picklable function computing the summary row of a run. Defaults to analyze_run
+        cache (cachelib.AnalysisCache, optional): If provided, only runs whose files changed since the last analysis are recomputed
+
+    Returns:
+        pandas.DataFrame: One row per run, with an 'error' column (None for successful runs)
+    """
+    runs = discover_runs(root_path)
+    if len(runs) == 0:
+        blade_logger.logger.warning(f"Warning: No runs found at '{root_path}'.")
+        return pd.DataFrame(columns=["run", "error"])
+
+    rows = [None] * len(runs)
+    keys = [None] * len(runs)
+
+    # serve unchanged runs from the cache
+    if cache is not None:
+        for index, run in enumerate(runs):
+            keys[index] = cache.key(get_run_input_files(run), analyze_func, run)
+            found, row = cache.get(keys[index])
+            if found:
+                rows[index] = row
+        blade_logger.logger.info(f"{len(runs) - rows.count(None)} of {len(runs)} runs found in cache.")
+
+    pending = [index for index, row in enumerate(rows) if row is None]
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        blade_logger.logger.info(f"Analysing {len(pending)} runs using {workers} workers...")
+        start_time = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(__analyze_run_safely, analyze_func, runs[index]): index for index in pending}
+
+            for completed, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+
+                # a worker can still die (e.g. out of memory), isolate that run too
+                try:
+                    rows[index] = future.result()
+                except Exception as e:
+                    rows[index] = {"run": runs[index], "error": f"{type(e).__name__}: {e}"}
+
+                status = "failed" if rows[index].get("error") else "done"
+                if cache is not None and status == "done":
+                    cache.put(keys[index], rows[index])
+
+                elapsed_time = time.perf_counter() - start_time
+                blade_logger.logger.info(f"[{completed}/{len(pending)}] {runs[index]} ({status}, {elapsed_time:.1f}s elapsed)")
+
+    summary = pd.DataFrame(rows)
+    summary = summary[[column for column in summary.columns if column != "error"] + ["error"]]
+    failed = summary["error"].notna().sum()
+    if failed > 0:
+        blade_logger.logger.warning(f"Warning: {failed} of {len(runs)} runs failed to be analysed.")
+
+    return summary
+
+
+def get_run_input_files(run_path):
+    """
+    List all measurement files of a run, i.e. the files its analysis depends on.
+
+    Args:
+        run_path (str): Path to the run directory
+
+    Returns:
+        list: Paths of all measurement files of the run
+    """
+    run_files = find_run_files(run_path)
+
+    input_files = [run_files[name] for name in ("monsoon", "adb") if run_files[name] is not None]
+    input_files += run_files["memory"] + run_files["tslogger"]
+
+    # Monsoon capture start time is read from the sync barrier
+    t_monsoon = os.path.join(run_path, ".t_monsoon")
+    if os.path.exists(t_monsoon):
+        input_files.append(t_monsoon)
+
+    return input_files
+
+
+def __analyze_run_safely(analyze_func, run_path):
+    # runs in a worker process: never raises, reports the error as part of the row instead
+    try:
+        row = analyze_func(run_path)
+        row["error"] = None
+
+    except Exception as e:
+        row = {"run": run_path, "error": f"{type(e).__name__}: {e}"}
+
+    return row
+
+
+def __analyze_stage(run_path, stage, entry, power, adb, memory):
+    # computes the breakdown row of a single TSLogger stage (times are in epoch seconds). power holds the
+    # (energy_mWh, discharge_mAh) of the stage, or None if unknown (see analyze_run)
+    time_start = entry["time_start"]
+    time_end = entry.get("time_end")
+
+    stage_row = {
+        "run": run_path,
+        "stage": stage,
+        "time_start": time_start,
+        "time_end": time_end,
+        "duration_sec": None if time_end is None else time_end - time_start,
+        "energy_mWh": None,
+        "discharge_mAh": None,
+        "avg_power_mW": None,
+        "cpu_util_mean": None,
+        "pss_mean": None,
+        "rss_mean": None,
+    }
+
+    # incomplete stage (log_end was never called)
+    if time_end is None:
+        return stage_row
+
+    if power is not None:
+        energy, discharge = power
+        stage_row["energy_mWh"] = energy
+        stage_row["discharge_mAh"] = discharge
+        if time_end > time_start:
+            stage_row["avg_power_mW"] = energy / ((time_end - time_start) / 3600)
+
+    if adb is not None:
+        in_stage = adb["timestamp"].between(time_start, time_end)
+        stage_row["cpu_util_mean"], _ = __mean_max(adb.loc[in_stage, "cpu_util"])
+
+    if memory is not None:
+        in_stage = memory["timestamp"].between(time_start, time_end)
+        stage_row["pss_mean"], _ = __mean_max(memory.loc[in_stage, "pss"])
+        stage_row["rss_mean"], _ = __mean_max(memory.loc[in_stage, "rss"])
+
+    return stage_row
+
+
+def __mean_max(values):
+    # returns (mean, max) of a series, or (None, None) if empty
+    if len(values) == 0:
+        return None, None
+    return values.mean(), values.max()
+
+
+def __is_memory_file(filename):
+    # memory csv files are written by collect_memory_measurements.py
+    with open(filename, encoding="utf-8") as f:
+        header = f.readline().strip()
+    return header.split(",") == constants.ANALYSIS_MEMORY_COLUMN_NAMES
+
+
+def __is_tslogger_file(filename):
+    # TSLogger json files map stage names to dicts with timing information
+    try:
+        with open(filename, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    return isinstance(data, dict) and all(isinstance(stage, dict) and "time_start" in stage for stage in data.values())
@@ -36,9 +36,56 @@ USB_LIBRARY_GET_STATE_RETRY_TIMEOUT = 1
 # ADB constants
 SWITCH_ADB_CONNECTION_STATE_TIMEOUT = 3
 ADB_MEASUREMENTS_DEFAULT_SAMPLE_DELAY = 3  # delay between samples, in seconds
+ADB_SAMPLER_CLOCK_PROBES = 5  # uptime probes used to map the device clock to the host clock
+ADB_SAMPLER_CLOCK_CALIBRATION_INTERVAL = 60  # in seconds, re-calibration of the clock offset while sampling (drift, NTP slewing)
+ADB_SAMPLER_CLOCK_FILE_SUFFIX = ".clock.csv"  # calibrations (uptime, offset), next to the output file
+ADB_SAMPLER_MODES = ["aggregate", "cores"]  # overall CPU utilization (csv), or per-core utilization and frequency (parquet)
+ADB_SAMPLER_PARQUET_BUFFER_SIZE = 100  # samples written at once
+ADB_SAMPLER_PARQUET_COMPRESSION = 'SNAPPY'
 ADB_OVER_WIFI_DEFAULT_PORT = 5555
 ADB_COMMANDS_EXECUTION_TIMEOUT = 1
 ADB_COMMANDS_EXTENDED_EXECUTION_TIMEOUT = 2  # used in actions that take longer to complete (e.g. requiring UX actions, animations, etc.)
+ADB_ON_DEVICE_WAIT_INTERVAL = 0.1  # in seconds, polling interval of conditions checked on the device
+ADB_OVER_WIFI_CONNECT_TIMEOUT = 15  # in seconds, time for adbd to restart in tcpip mode and accept a connection
+ADB_COMMANDS_DEFAULT_BACKEND = "session"  # 'cli' (adb binary), 'session' (pooled adb shell sessions) or 'native' (adb server protocol)
+ADB_SHELL_SESSION_POOL_MAX_SESSIONS_PER_DEVICE = 4
+ADB_SHELL_SESSION_CLOSE_TIMEOUT = 2
+ADB_SHELL_SESSION_OPEN_TIMEOUT = 10  # in seconds
+ADB_SHELL_SESSION_READ_TIMEOUT = 300  # in seconds, per command
+ADB_SHELL_SESSION_READ_SIZE = 65536
+ADB_EXEC_OUT_READ_SIZE = 65536  # in bytes, when streaming the output of exec-out to a file
+ADB_SERVER_DEFAULT_HOST = "127.0.0.1"
+ADB_SERVER_DEFAULT_PORT = 5037
+ADB_CLIENT_DEFAULT_TIMEOUT = 60  # in seconds
+ADB_DEVICE_REGISTRY_STARTUP_TIMEOUT = 2  # in seconds, time to wait for the initial device list
+ADB_DEVICE_REGISTRY_RECONNECT_INTERVAL = 1  # in seconds
+ADB_DEVICE_REGISTRY_MAX_EVENTS = 10000
+ADB_DEVICE_REGISTRY_EVENTS_FILENAME = "adb_events.jsonl"  # state change events of a run, next to the measurements
+ADB_ASYNC_MAX_CONCURRENT_COMMANDS = 16  # across all devices
+ADB_ASYNC_MAX_CONCURRENT_COMMANDS_PER_DEVICE = 1
+DEVICE_METADATA_CACHE_BOOT_ID_TTL = 5  # in seconds, cached device metadata is re-validated against the boot id after this
+SCREEN_RECORD_DEFAULT_SEGMENT_DURATION = 60  # in seconds
+SCREEN_RECORD_DEFAULT_MAX_SEGMENTS = 10
+SCREEN_RECORD_READ_SIZE = 64 * 1024  # in bytes
+SCREEN_RECORD_STOP_TIMEOUT = 5  # in seconds
+
+# Latency instrumentation constants (see latencylib)
+LATENCY_HISTOGRAM_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 60]  # upper bounds, in seconds
+LATENCY_SERVER_DEFAULT_PORT = 8765
+LATENCY_START_MEASURING_FILENAME = "latency_start_measuring"  # .json and .csv, next to the measurements
+LATENCY_STOP_MEASURING_FILENAME = "latency_stop_measuring"
+
+# Input injector constants (see inputinjectorlib.InputInjector)
+INPUT_INJECTOR_DEVICE_PORT = 1080
+INPUT_INJECTOR_DEVICE_PID_FILENAME = "/data/local/tmp/blade_input_injector_{port}.pid"  # PID of the injector listening on port
+INPUT_INJECTOR_STARTUP_TIMEOUT = 10  # in seconds
+INPUT_INJECTOR_RESPONSE_TIMEOUT = 5  # in seconds, on top of the sleeps of a program
+INPUT_INJECTOR_EVENT_INTERVAL = 10  # in milliseconds, between the move events of a swipe
+INPUT_INJECTOR_LONG_TAP_DURATION = 2000  # in milliseconds
+
+# App profile store constants (see appprofilelib.AppProfileStore)
+APP_PROFILE_STORE_DEFAULT_COMPRESSION = "gzip"
+APP_PROFILE_STORE_DEVICE_PATH = "/data/local/tmp/blade_profiles"
 
 # Proxy constants
 PROXY_DEFAULT_BROWSER_NAME = "Unknown"
@@ -52,6 +99,35 @@ LIGHTHOUSE_COMMANDS_WAIT_TIME = 3
 
 # Memory measurements constants
 MEMORY_MEASUREMENTS_DEFAULT_INTERVAL = 1  # in seconds
+MEMORY_USAGE_MODES = ["per_process", "batched", "smaps"]
+MEMORY_USAGE_DEFAULT_MODE = "batched"  # 'per_process' (one adb call per process), 'batched' (one adb call) or 'smaps' (one adb call reading /proc/<pid>/smaps_rollup, requires root)
+
+# Analysis constants
+ANALYSIS_CSV_CHUNK_SIZE = 500000  # rows per chunk when streaming csv captures
+ANALYSIS_MONSOON_FILENAMES = ['measurements_monsoon.parquet', 'measurements_monsoon.csv']
+ANALYSIS_ADB_FILENAME = 'measurements_adb.csv'
+ANALYSIS_MEMORY_COLUMN_NAMES = ['timestamp', 'pss', 'rss']
+ANALYSIS_PYRAMID_RESOLUTIONS = [0.001, 0.01, 0.1, 1, 10]  # summary pyramid tiers, in seconds
+ANALYSIS_PYRAMID_SUFFIX = '.pyramid'
+ANALYSIS_PYRAMID_FIELDS = ['index', 'min_power', 'max_power', 'sum_power', 'energy', 'count']
+ANALYSIS_PROFILE_DEFAULT_INTERVAL = 1  # in seconds
+ANALYSIS_SEGMENTATION_DEFAULT_RESOLUTION = 1  # decimated profile used for segmentation, in seconds
+ANALYSIS_SEGMENTATION_DEFAULT_MIN_DURATION = 10  # in seconds
+ANALYSIS_SEGMENTATION_DEFAULT_MAX_PHASES = 20
+ANALYSIS_SEGMENTATION_STEADY_MAX_CV = 0.1  # max coefficient of variation of a steady phase
+ANALYSIS_CACHE_DEFAULT_MAX_SIZE = 1024 ** 3  # in bytes
+ANALYSIS_CACHE_HASH_BLOCK_SIZE = 1024 ** 2  # in bytes
+
+# Statistics constants
+STATS_DEFAULT_RESAMPLES = 10000
+STATS_DEFAULT_CONFIDENCE = 0.95
+STATS_MAX_BATCH_ELEMENTS = 10 ** 7  # upper bound of elements per resampling matrix
+
+# Wait-until constants (see tools.wait_until)
+WAIT_UNTIL_DEFAULT_TIMEOUT = 10  # in seconds
+WAIT_UNTIL_DEFAULT_INTERVAL = 0.05  # initial interval between checks, in seconds
+WAIT_UNTIL_DEFAULT_BACKOFF = 1.5
+WAIT_UNTIL_DEFAULT_MAX_INTERVAL = 1  # in seconds
 
 # Other constants
 CONTROL_DEVICE_WAIT_TIME_AFTER_ASYNC_CALLS = 5
@@ -9,10 +9,12 @@ import time
 
 from libs import tools
 from libs import adblib
+from libs import adbregistrylib
 from libs import monsoonlib
 from libs import usblib
 from libs import volswitchlib
 from libs import devicerechargelib
+from libs import latencylib
 from libs.automation import adb_commands
 
 from libs import async_calls as acalls
@@ -228,8 +230,24 @@ def read_state(device):
     return vs.read_state(channel)
 
 
-def start_measuring(device, output_path, auto_recharge_battery_level=None, granularity=1):
-    
+# start measuring, saving the latency of the automation operations (adb commands, etc.) it ran and the adb
+# connection events next to the measurements (see latencylib.saved and adbregistrylib.save_run_events). If
+# per_core is set, the utilization and frequency of every core (and the cpuidle residency, if cpuidle is set)
+# are also sampled into measurements_adb_cores.parquet (Android only).
+def start_measuring(device, output_path, auto_recharge_battery_level=None, granularity=1, per_core=False, cpuidle=False):
+
+    # ensure output path exists
+    tools.ensure_path(output_path)
+
+    with latencylib.saved(output_path, constants.LATENCY_START_MEASURING_FILENAME):
+        try:
+            __start_measuring(device, output_path, auto_recharge_battery_level, granularity, per_core, cpuidle)
+        finally:
+            adbregistrylib.save_run_events(output_path)
+
+
+def __start_measuring(device, output_path, auto_recharge_battery_level, granularity, per_core, cpuidle):
+
     # check granularity
     if granularity < 1 or granularity > constants.MONSOON_COLLECTED_SAMPLES_PER_BATCH:
         blade_logger.logger.error(f"Error: Granularity must be between 1 and {constants.MONSOON_COLLECTED_SAMPLES_PER_BATCH}")
@@ -240,9 +258,6 @@ def start_measuring(device, output_path, auto_recharge_battery_level=None, granu
         blade_logger.logger.error(f"Error: Auto-recharge battery level must be between 0.00 and 1.00")
         raise Exception(f"Error: Auto-recharge battery level must be between 0.00 and 1.00")
 
-    # ensure output path exists
-    tools.ensure_path(output_path)
-
     # check state first
     if read_state(device) == "off":
         blade_logger.logger.error("Error: Device is off.")
@@ -261,7 +276,6 @@ def start_measuring(device, output_path, auto_recharge_battery_level=None, granu
     # init device
     if device["os"] == "Android":
         adblib.enable_adb_over_wifi(device)
-        time.sleep(constants.SWITCH_ADB_CONNECTION_STATE_TIMEOUT)
 
         adb_identifier = f"{device['ip']}:{constants.ADB_OVER_WIFI_DEFAULT_PORT}"
 
@@ -271,6 +285,15 @@ def start_measuring(device, output_path, auto_recharge_battery_level=None, granu
         acalls.collect_adb_measurements(
             adb_identifier, constants.ADB_MEASUREMENTS_DEFAULT_SAMPLE_DELAY, sw_power_enabled, output_file
         )
+
+        # per-core measuring (power is already sampled by the aggregate sampler)
+        if per_core:
+            output_file = os.path.join(output_path, "measurements_adb_cores.parquet")
+            acalls.collect_adb_measurements(
+                adb_identifier, constants.ADB_MEASUREMENTS_DEFAULT_SAMPLE_DELAY, False, output_file,
+                mode="cores", cpuidle=cpuidle
+            )
+
         time.sleep(constants.CONTROL_DEVICE_DEFAULT_WAIT_TIME)
 
     elif device["os"] == "iOS":
@@ -298,7 +321,22 @@ def start_measuring(device, output_path, auto_recharge_battery_level=None, granu
         time.sleep(constants.CONTROL_DEVICE_WAIT_TIME_AFTER_ASYNC_CALLS)
 
 
-def stop_measuring(device):
+# stop measuring. If output_path is set, the latency of the automation operations it ran and the adb connection
+# events are saved there, next to the measurements (see latencylib.saved and adbregistrylib.save_run_events).
+def stop_measuring(device, output_path=None):
+
+    if output_path is None:
+        __stop_measuring(device)
+        return
+
+    with latencylib.saved(output_path, constants.LATENCY_STOP_MEASURING_FILENAME):
+        try:
+            __stop_measuring(device)
+        finally:
+            adbregistrylib.save_run_events(output_path)
+
+
+def __stop_measuring(device):
 
     # check state first
     if read_state(device) == "off":
@@ -0,0 +1,168 @@
+# Note:   Per-device cache of metadata that only changes on reboot or app install (model, packages, etc.)
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import threading
+import time
+
+from libs import constants
+from libs import logger as blade_logger
+
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+
+class DeviceMetadataCache:
+
+    def __init__(self, runner, boot_id_ttl=constants.DEVICE_METADATA_CACHE_BOOT_ID_TTL):
+        """
+        Cache device metadata (model, installed packages and their UIDs, screen resolution) per device.
+
+        All metadata of a device is fetched in a single adb round trip. Cached entries are validated
+        against the device's boot id (at most once every boot_id_ttl seconds) and can be invalidated
+        explicitly, e.g. after installing or uninstalling an app.
+
+        Args:
+            runner (callable): Function (device, connection, commands) -> [(output, exit_code), ...]
+                               running a batch of shell commands on the device (e.g. adb_commands.run_adb_batch)
+            boot_id_ttl (float): Seconds during which a cached entry is used without checking the boot id
+        """
+        self.runner = runner
+        self.boot_id_ttl = boot_id_ttl
+        self.entries = {}  # adb_identifier -> metadata dict
+        self.lock = threading.Lock()
+
+    def get_model(self, device, connection):
+        """
+        Returns:
+            str: Device model (ro.product.model)
+        """
+        return self.__get_entry(device, connection)["model"]
+
+    def get_packages(self, device, connection):
+        """
+        Returns:
+            list: Names of the installed packages
+        """
+        return list(self.__get_entry(device, connection)["packages"])
+
+    def get_package_uid(self, device, connection, package):
+        """
+        Returns:
+            str: UID of the given package, or None if the package is not installed or the UID is unknown
+        """
+        return self.__get_entry(device, connection)["packages"].get(package)
+
+    def get_screen_resolution(self, device, connection):
+        """
+        Returns:
+            tuple: (width, height) in pixels, taking any override (`wm size <w>x<h>`) into account, or None if unknown
+        """
+        return self.__get_entry(device, connection)["screen_resolution"]
+
+    def invalidate(self, device=None):
+        """
+        Drop the cached metadata of a device, or of all devices if device is None.
+
+        Args:
+            device (dict): Device, as returned by devicelib.get_devices()
+        """
+        with self.lock:
+            if device is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(device["adb_identifier"], None)
+
+    def __get_entry(self, device, connection):
+
+        adb_identifier = device["adb_identifier"]
+        with self.lock:
+            entry = self.entries.get(adb_identifier)
+
+        # validate a stale entry against the current boot id. Entries are never modified once published: a
+        # validated copy replaces the entry, unless it was invalidated in the meantime.
+        if entry is not None and time.time() - entry["validated_at"] > self.boot_id_ttl:
+            (output, exit_code), = self.__run(device, connection, [f"cat {BOOT_ID_PATH}"])
+            if exit_code == 0 and output.strip() == entry["boot_id"]:
+                validated_entry = dict(entry, validated_at=time.time())
+                with self.lock:
+                    if self.entries.get(adb_identifier) is entry:
+                        self.entries[adb_identifier] = validated_entry
+                entry = validated_entry
+            else:
+                entry = None
+
+        if entry is None:
+            entry = self.__load_entry(device, connection)
+            with self.lock:
+                self.entries[adb_identifier] = entry
+
+        return entry
+
+    # run a batch, making sure that every command ran (e.g. not the case if the device is offline)
+    def __run(self, device, connection, commands):
+
+        results = self.runner(device, connection, commands)
+        if len(results) != len(commands):
+            blade_logger.logger.error(f"Error: Could not read the metadata of device '{device['adb_identifier']}' "
+                                      f"({len(results)} of {len(commands)} commands ran).")
+            raise Exception(f"Error: Could not read the metadata of device '{device['adb_identifier']}'.")
+
+        return results
+
+    def __load_entry(self, device, connection):
+
+        commands = [
+            f"cat {BOOT_ID_PATH}",
+            "getprop ro.product.model",
+            "pm list packages -U",
+            "wm size",
+        ]
+        (boot_id, _), (model, _), (packages, packages_exit_code), (screen_size, _) = self.__run(device, connection, commands)
+
+        if packages_exit_code != 0:
+            blade_logger.logger.warning(f"Warning: Could not list packages of device '{device['adb_identifier']}'.")
+
+        return {
+            "boot_id": boot_id.strip(),
+            "validated_at": time.time(),
+            "model": model.strip(),
+            "packages": parse_package_list(packages) if packages_exit_code == 0 else {},
+            "screen_resolution": parse_screen_size(screen_size),
+        }
+
+
+# parse the output of `pm list packages -U` into a {package: uid} dict (uid is None if not listed)
+def parse_package_list(text):
+
+    packages = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith("package:"):
+            continue
+
+        # e.g. 'package:com.brave.browser uid:10123'
+        fields = line.split()
+        package = fields[0][len("package:"):]
+        uid = None
+        for field in fields[1:]:
+            if field.startswith("uid:"):
+                uid = field[len("uid:"):].split(",")[0]
+        packages[package] = uid
+
+    return packages
+
+
+# parse the output of `wm size` into (width, height), preferring the override size
+def parse_screen_size(text):
+
+    sizes = {}
+    for line in text.splitlines():
+        if ":" in line and "x" in line:
+            kind, size = line.split(":", 1)
+            try:
+                width, height = size.strip().split("x")
+                sizes[kind.strip()] = (int(width), int(height))
+            except ValueError:
+                continue
+
+    return sizes.get("Override size", sizes.get("Physical size"))
@@ -0,0 +1,249 @@
+# Note:   Parsers for the output of Android's `dumpsys` services
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import re
+
+# dumpsys battery
+BATTERY_FIELD_PATTERN = re.compile(r"^[ \t]+([^:\n]+):[ \t]*(.*?)[ \t]*$", re.MULTILINE)
+INTEGER_PATTERN = re.compile(r"^-?\d+$")
+FLOAT_PATTERN = re.compile(r"^-?\d+\.\d+$")
+
+# dumpsys meminfo
+MEMINFO_TOTAL_ROW_PATTERN = re.compile(r"^[ \t]*TOTAL(?:[ \t]+\d+){7,8}[ \t]*$", re.MULTILINE)
+MEMINFO_SUMMARY_PATTERN = re.compile(r"TOTAL( PSS| RSS| SWAP PSS)?:\s+(\d+)")
+
+# dumpsys netstats
+NETSTATS_BUCKET_PATTERN = re.compile(r"\brb=(\d+).*?\btb=(\d+)")
+NETSTATS_UID_STATS_SECTION = "mAppUidStatsMap:"
+
+# dumpsys display
+DISPLAY_SCREEN_STATE_PATTERN = re.compile(r"\bmScreenState=(\w+)")
+DISPLAY_SCREEN_BRIGHTNESS_PATTERN = re.compile(r"\bmScreenBrightness=(-?[\d.]+)")
+
+# dumpsys activity / window
+ACTIVITY_RESUMED_PATTERN = re.compile(r"\b(?:mResumedActivity|ResumedActivity|topResumedActivity)[:=]\s*ActivityRecord\{\S+ u\d+ ([^/\s]+)/([^\s}]+)")
+ACTIVITY_FOCUS_PATTERN = re.compile(r"\bmCurrentFocus=Window\{\S+ u\d+ ([^/\s}]+)")
+
+# dumpsys gfxinfo
+GFXINFO_FIELD_PATTERNS = {
+    "total_frames": re.compile(r"^Total frames rendered: (\d+)", re.MULTILINE),
+    "janky_frames": re.compile(r"^Janky frames: (\d+)", re.MULTILINE),
+    "percentile_50_ms": re.compile(r"^50th percentile: (\d+)ms", re.MULTILINE),
+    "percentile_90_ms": re.compile(r"^90th percentile: (\d+)ms", re.MULTILINE),
+    "percentile_95_ms": re.compile(r"^95th percentile: (\d+)ms", re.MULTILINE),
+    "percentile_99_ms": re.compile(r"^99th percentile: (\d+)ms", re.MULTILINE),
+    "missed_vsync": re.compile(r"^Number Missed Vsync: (\d+)", re.MULTILINE),
+    "high_input_latency": re.compile(r"^Number High input latency: (\d+)", re.MULTILINE),
+    "slow_ui_thread": re.compile(r"^Number Slow UI thread: (\d+)", re.MULTILINE),
+    "slow_bitmap_uploads": re.compile(r"^Number Slow bitmap uploads: (\d+)", re.MULTILINE),
+    "slow_draw_commands": re.compile(r"^Number Slow issue draw commands: (\d+)", re.MULTILINE),
+    "frame_deadline_missed": re.compile(r"^Number Frame deadline missed: (\d+)", re.MULTILINE),
+}
+
+
+def parse_battery(text):
+    """
+    Parse the output of `dumpsys battery`.
+
+    Values are converted to int, float or bool where possible (e.g. 'level': 85, 'present': True),
+    and kept as strings otherwise (e.g. 'technology': 'Li-ion').
+
+    Args:
+        text (str): Output of `dumpsys battery`
+
+    Returns:
+        dict: {field: value}
+    """
+    battery_info = {}
+    for key, value in BATTERY_FIELD_PATTERN.findall(text):
+        battery_info[key.strip()] = __typed_value(value)
+
+    return battery_info
+
+
+def parse_meminfo(text):
+    """
+    Parse the output of `dumpsys meminfo <pid|package>` (first process only).
+
+    Args:
+        text (str): Output of `dumpsys meminfo`
+
+    Returns:
+        dict: TOTAL row (pss, private_dirty, private_clean, swap_pss, rss, heap_size, heap_alloc, heap_free)
+              and App Summary totals (total_pss, total_rss, total_swap_pss), all in kilobytes.
+              Values missing from the output (e.g. rss before Android 10) are None.
+    """
+    meminfo = dict.fromkeys(["pss", "private_dirty", "private_clean", "swap_pss", "rss",
+                             "heap_size", "heap_alloc", "heap_free",
+                             "total_pss", "total_rss", "total_swap_pss"])
+
+    match = MEMINFO_TOTAL_ROW_PATTERN.search(text)
+    if match:
+        meminfo.update(parse_meminfo_total_row(match.group(0)))
+
+    # App Summary, e.g. 'TOTAL PSS:   80000   TOTAL RSS:  150000   TOTAL SWAP PSS:  100' ('TOTAL:' before Android 10)
+    for kind, value in MEMINFO_SUMMARY_PATTERN.findall(text[match.end():] if match else text):
+        key = "total_" + (kind.strip().lower().replace(" ", "_") if kind else "pss")
+        if meminfo[key] is None:
+            meminfo[key] = int(value)
+
+    return meminfo
+
+
+def parse_meminfo_total_row(line):
+    """
+    Parse the TOTAL row of the `dumpsys meminfo` table. The Rss column exists since Android 10.
+
+    Args:
+        line (str): e.g. '        TOTAL    80000    60000    10000      100   150000    40000    31000     9000'
+
+    Returns:
+        dict: pss, private_dirty, private_clean, swap_pss, rss (None before Android 10), heap_size, heap_alloc
+              and heap_free in kilobytes, or None if the line is not a TOTAL row
+    """
+    parts = line.split()
+    if len(parts) not in [8, 9] or parts[0] != "TOTAL" or not all(part.isdigit() for part in parts[1:]):
+        return None
+
+    values = [int(part) for part in parts[1:]]
+    if len(values) == 7:
+        values.insert(4, None)
+
+    return dict(zip(["pss", "private_dirty", "private_clean", "swap_pss", "rss", "heap_size", "heap_alloc", "heap_free"], values))
+
+
+def parse_netstats(text):
+    """
+    Parse the output of `dumpsys netstats` in a single pass.
+
+    Device totals are the sum of all history buckets (lines with 'rb=' and 'tb=' fields), halved as
+    every bucket is reported twice (per interface and per interface group). Per-UID counters are read
+    from the mAppUidStatsMap section (rows of 'uid rxBytes rxPackets txBytes txPackets'), available since Android 12.
+
+    Args:
+        text (str): Output of `dumpsys netstats`
+
+    Returns:
+        dict: {'rx_bytes': int, 'tx_bytes': int, 'uids': {uid (int): (rx_bytes, tx_bytes)}}
+    """
+    rx_bytes = 0
+    tx_bytes = 0
+    uids = {}
+    in_uid_stats = False
+
+    for line in text.splitlines():
+
+        if "rb=" in line:
+            match = NETSTATS_BUCKET_PATTERN.search(line)
+            if match:
+                rx_bytes += int(match.group(1))
+                tx_bytes += int(match.group(2))
+            continue
+
+        stripped = line.strip()
+        if stripped == NETSTATS_UID_STATS_SECTION:
+            in_uid_stats = True
+            continue
+
+        if in_uid_stats:
+            fields = stripped.split()
+
+            # column header
+            if len(fields) > 0 and fields[0] == "uid":
+                continue
+
+            if len(fields) < 5 or not all(field.isdigit() for field in fields[:5]):
+                in_uid_stats = False
+                continue
+
+            # keep the first entry of each uid
+            uid = int(fields[0])
+            if uid not in uids:
+                uids[uid] = (int(fields[1]), int(fields[3]))
+
+    return {
+        "rx_bytes": rx_bytes // 2,
+        "tx_bytes": tx_bytes // 2,
+        "uids": uids,
+    }
+
+
+def parse_display(text):
+    """
+    Parse the output of `dumpsys display` (default display only).
+
+    Args:
+        text (str): Output of `dumpsys display`
+
+    Returns:
+        dict: screen_state (e.g. 'ON', 'OFF', 'DOZE') and screen_brightness (0-255 before Android 11, 0.0-1.0 since),
+              None if missing
+    """
+    screen_state = DISPLAY_SCREEN_STATE_PATTERN.search(text)
+    screen_brightness = DISPLAY_SCREEN_BRIGHTNESS_PATTERN.search(text)
+
+    return {
+        "screen_state": screen_state.group(1) if screen_state else None,
+        "screen_brightness": __typed_value(screen_brightness.group(1)) if screen_brightness else None,
+    }
+
+
+def parse_activity(text):
+    """
+    Parse the output of `dumpsys activity activities` (or `dumpsys window` for the focused window).
+
+    Args:
+        text (str): Output of `dumpsys activity activities` or `dumpsys window`
+
+    Returns:
+        dict: resumed_package and resumed_activity (of the top resumed activity) and focused_package
+              (of the window with input focus), None if missing
+    """
+    resumed = ACTIVITY_RESUMED_PATTERN.search(text)
+    focused = ACTIVITY_FOCUS_PATTERN.search(text)
+
+    return {
+        "resumed_package": resumed.group(1) if resumed else None,
+        "resumed_activity": resumed.group(2) if resumed else None,
+        "focused_package": focused.group(1) if focused else None,
+    }
+
+
+def parse_gfxinfo(text):
+    """
+    Parse the output of `dumpsys gfxinfo <package>` (process-wide stats, i.e. the first occurrence of each field).
+
+    Args:
+        text (str): Output of `dumpsys gfxinfo <package>`
+
+    Returns:
+        dict: total_frames, janky_frames, janky_ratio, percentile_{50,90,95,99}_ms and the jank cause counters
+              (missed_vsync, high_input_latency, slow_ui_thread, slow_bitmap_uploads, slow_draw_commands,
+              frame_deadline_missed since Android 12), None if missing
+    """
+    gfxinfo = {}
+    for field, pattern in GFXINFO_FIELD_PATTERNS.items():
+        match = pattern.search(text)
+        gfxinfo[field] = int(match.group(1)) if match else None
+
+    total_frames = gfxinfo["total_frames"]
+    janky_frames = gfxinfo["janky_frames"]
+    gfxinfo["janky_ratio"] = janky_frames / total_frames if total_frames and janky_frames is not None else None
+
+    return gfxinfo
+
+
+# convert a dumpsys value into int, float or bool where possible
+def __typed_value(value):
+
+    if INTEGER_PATTERN.match(value):
+        return int(value)
+
+    if FLOAT_PATTERN.match(value):
+        return float(value)
+
+    if value in ["true", "false"]:
+        return value == "true"
+
+    return value
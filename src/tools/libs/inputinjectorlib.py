@@ -0,0 +1,262 @@
+# Note:   Resident on-device input injector (`monkey --port`), driven with gesture programs over an adb-forwarded socket
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import atexit
+import math
+import socket
+import subprocess
+import threading
+
+from libs import tools
+from libs import constants
+from libs import logger as blade_logger
+
+
+class InputInjectorError(Exception):
+    """Raised when the input injector is not running or rejects a command."""
+
+
+class InputInjector:
+
+    def __init__(self, adb_identifier, device_port=constants.INPUT_INJECTOR_DEVICE_PORT, client=None):
+        """
+        Inject input events through a single, long-running `monkey --port` process on the device, instead of
+        starting a new `input` process (and JVM) for every event.
+
+        Gestures are sent as programs: lists of monkey commands ('touch down x y', 'touch move x y',
+        'touch up x y', 'sleep ms', 'press keycode', etc.) written to the socket at once and executed in order
+        on the device, so that the timing between events does not depend on the adb transport.
+
+        Note that monkey registers itself as the activity controller: while the injector runs,
+        ActivityManager.isUserAMonkey() returns true on the device and apps may behave differently (e.g. skip
+        dialogs or animations). It is therefore opt-in, per experiment (see adb_commands.setup_device).
+
+        Args:
+            adb_identifier (str): Device serial or ip:port
+            device_port (int): Port of the injector on the device
+            client (adbclientlib.AdbClient, optional): Set up the port forward over the adb server protocol instead of the adb binary
+        """
+        self.adb_identifier = adb_identifier
+        self.device_port = device_port
+        self.client = client
+        self.local_port = None
+        self.process = None
+        self.sock = None
+        self.reader = None
+        self.lock = threading.Lock()
+        self.pid_filename = constants.INPUT_INJECTOR_DEVICE_PID_FILENAME.format(port=device_port)
+        self.stop_registered = False
+
+    def start(self, timeout=constants.INPUT_INJECTOR_STARTUP_TIMEOUT):
+        """
+        Start the injector on the device and connect to it.
+
+        Args:
+            timeout (float): Seconds to wait for the injector to accept connections
+
+        Raises:
+            InputInjectorError: If the injector could not be started
+        """
+        if self.sock is not None:
+            return
+
+        # a previous injector on this port (e.g. of a crashed run) would hold it. Other monkey processes are
+        # left running.
+        self.__kill_device_process()
+
+        # record the PID of the injector (the shell is replaced by monkey, keeping its PID)
+        self.process = subprocess.Popen(["adb", "-s", self.adb_identifier, "shell",
+                                         f"echo $$ > {self.pid_filename}; exec monkey --port {self.device_port}"],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not self.stop_registered:
+            atexit.register(self.stop)
+            self.stop_registered = True
+
+        self.local_port = _get_free_port()
+        if self.client is not None:
+            self.client.forward(self.adb_identifier, f"tcp:{self.local_port}", f"tcp:{self.device_port}")
+        else:
+            subprocess.run(["adb", "-s", self.adb_identifier, "forward", f"tcp:{self.local_port}", f"tcp:{self.device_port}"],
+                           stdout=subprocess.DEVNULL, check=True)
+
+        # the forward accepts connections before the injector listens: wait for an actual reply
+        if not tools.wait_until(self.__connect, timeout, exceptions=(OSError, InputInjectorError)):
+            self.stop()
+            blade_logger.logger.error(f"Error: Could not start the input injector on device '{self.adb_identifier}'.")
+            raise InputInjectorError(f"Could not start the input injector on device '{self.adb_identifier}'.")
+
+    def stop(self):
+        """
+        Stop the injector on the device and remove the port forward.
+        """
+        with self.lock:
+            if self.sock is not None:
+                try:
+                    self.sock.sendall(b"quit\n")
+                except OSError:
+                    pass
+                self.reader.close()
+                self.sock.close()
+                self.sock = None
+
+        if self.local_port is not None:
+            if self.client is not None:
+                try:
+                    self.client.remove_forward(self.adb_identifier, f"tcp:{self.local_port}")
+                except Exception as e:
+                    blade_logger.logger.debug(f"Could not remove forward: {e}")
+            else:
+                subprocess.run(["adb", "-s", self.adb_identifier, "forward", "--remove", f"tcp:{self.local_port}"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.local_port = None
+
+        if self.process is not None:
+            self.__kill_device_process()
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process = None
+
+    def is_running(self):
+        """
+        Returns:
+            bool: True if connected to the injector
+        """
+        return self.sock is not None
+
+    def run(self, program):
+        """
+        Execute a gesture program on the device.
+
+        Args:
+            program (list): Monkey commands (e.g. from tap_program or swipe_program)
+
+        Returns:
+            list: One response per command (e.g. 'OK')
+
+        Raises:
+            InputInjectorError: If the injector is not running or a command failed
+        """
+        with self.lock:
+            if self.sock is None:
+                raise InputInjectorError(f"Input injector of device '{self.adb_identifier}' is not running.")
+
+            # wait for at least the sleeps of the program
+            self.sock.settimeout(constants.INPUT_INJECTOR_RESPONSE_TIMEOUT + get_program_duration(program) / 1000)
+
+            try:
+                self.sock.sendall("".join(f"{command}\n" for command in program).encode())
+                responses = [self.reader.readline().decode().strip() for _ in program]
+            except OSError as e:
+                raise InputInjectorError(f"Input injector of device '{self.adb_identifier}' failed: {e}")
+
+        for command, response in zip(program, responses):
+            if not response.startswith("OK"):
+                raise InputInjectorError(f"Input injector rejected '{command}': {response or 'connection closed'}")
+
+        return responses
+
+    def tap(self, x, y):
+        self.run(tap_program(x, y))
+
+    def long_tap(self, x, y, duration=constants.INPUT_INJECTOR_LONG_TAP_DURATION):
+        self.run(swipe_program([(x, y), (x, y)], duration))
+
+    def swipe(self, from_x, from_y, to_x, to_y, duration=1000):
+        self.run(swipe_program([(from_x, from_y), (to_x, to_y)], duration))
+
+    def press_key(self, key):
+        self.run([f"press {key}"])
+
+    def roll(self, dx, dy):
+        self.run([f"trackball {dx} {dy}"])
+
+    def __kill_device_process(self):
+
+        # kill the injector recorded for this port, only if that PID is still a monkey process
+        command = (f"pid=$(cat {self.pid_filename} 2>/dev/null) && grep -q com.android.commands.monkey /proc/$pid/cmdline "
+                   f"2>/dev/null && kill $pid; rm -f {self.pid_filename}")
+        subprocess.run(["adb", "-s", self.adb_identifier, "shell", command],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def __connect(self):
+
+        sock = socket.create_connection(("127.0.0.1", self.local_port), timeout=constants.INPUT_INJECTOR_RESPONSE_TIMEOUT)
+        reader = sock.makefile("rb")
+
+        # harmless query, answered only once the injector is listening. Close the connection on any failure
+        # (e.g. a timeout), since the handshake is retried until the injector is up.
+        try:
+            sock.sendall(b"getvar build.version.sdk\n")
+            response = reader.readline().decode().strip()
+            if not response.startswith("OK"):
+                raise InputInjectorError(f"Unexpected response '{response}'.")
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        except Exception:
+            reader.close()
+            sock.close()
+            raise
+
+        self.sock = sock
+        self.reader = reader
+        return True
+
+
+# returns a program tapping at x, y
+def tap_program(x, y):
+    return [f"tap {int(x)} {int(y)}"]
+
+
+# returns a program dragging a finger along a path of (x, y) points at a constant speed, over duration milliseconds.
+# Move events are sent every event_interval milliseconds, timed on the device.
+def swipe_program(points, duration, event_interval=constants.INPUT_INJECTOR_EVENT_INTERVAL):
+
+    # cumulative length along the path, to place the move events at a constant speed
+    lengths = [0]
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        lengths.append(lengths[-1] + math.hypot(x2 - x1, y2 - y1))
+
+    steps = max(1, round(duration / event_interval))
+    program = [f"touch down {int(points[0][0])} {int(points[0][1])}"]
+
+    elapsed_time = 0
+    segment = 0
+    for step in range(1, steps + 1):
+        program.append(f"sleep {round(step * duration / steps) - elapsed_time}")
+        elapsed_time = round(step * duration / steps)
+
+        position = lengths[-1] * step / steps
+        while segment < len(points) - 2 and lengths[segment + 1] < position:
+            segment += 1
+        segment_length = lengths[segment + 1] - lengths[segment]
+        ratio = (position - lengths[segment]) / segment_length if segment_length > 0 else 1
+        (x1, y1), (x2, y2) = points[segment], points[segment + 1]
+        program.append(f"touch move {round(x1 + (x2 - x1) * ratio)} {round(y1 + (y2 - y1) * ratio)}")
+
+    program.append(f"touch up {int(points[-1][0])} {int(points[-1][1])}")
+    return program
+
+
+# returns a program repeating a swipe (e.g. a scroll) count times, pausing pause milliseconds in between
+def repeat_program(program, count, pause):
+
+    repeated = []
+    for i in range(count):
+        if i > 0:
+            repeated.append(f"sleep {int(pause)}")
+        repeated.extend(program)
+
+    return repeated
+
+
+# returns the total duration of the sleeps of a program, in milliseconds
+def get_program_duration(program):
+    return sum(int(command.split()[1]) for command in program if command.startswith("sleep "))
+
+
+# returns a free local TCP port
+def _get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
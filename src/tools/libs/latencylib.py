@@ -0,0 +1,332 @@
+# Note:   In-memory latency histograms of automation operations (adb commands, adblib helpers, etc.)
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import bisect
+import contextlib
+import csv
+import functools
+import http.server
+import io
+import json
+import os
+import threading
+import time
+
+from libs import constants
+from libs import logger as blade_logger
+
+# phases of an operation: 'total' is always recorded, the others when the executing layer can measure them
+#   spawn:     starting the client (adb process, shell session or adb server connection)
+#   transport: time not spent in spawn or on-device execution (adb client/server/device round trip)
+#   execution: on-device execution time
+PHASES = ["total", "spawn", "transport", "execution"]
+
+# measurements in progress in the current thread (innermost last)
+__local = threading.local()
+
+
+class LatencyHistogram:
+
+    def __init__(self, buckets=constants.LATENCY_HISTOGRAM_BUCKETS):
+        """
+        Histogram of durations with fixed bucket upper bounds, plus count, sum, min and max.
+
+        Args:
+            buckets (list): Sorted bucket upper bounds in seconds. Larger durations go into an overflow bucket
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, duration):
+        self.counts[bisect.bisect_left(self.buckets, duration)] += 1
+        self.count += 1
+        self.sum += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = duration if self.max is None else max(self.max, duration)
+
+    def get_percentile(self, percentile):
+        """
+        Args:
+            percentile (float): Percentile in [0, 100]
+
+        Returns:
+            float: Upper bound of the bucket holding the percentile (capped to the max), or None if empty
+        """
+        if self.count == 0:
+            return None
+
+        rank = percentile / 100 * self.count
+        cumulative_count = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative_count += count
+            if cumulative_count >= rank:
+                return min(bucket, self.max)
+
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count > 0 else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.get_percentile(50),
+            "p90": self.get_percentile(90),
+            "p99": self.get_percentile(99),
+            "buckets": {str(bucket): count for bucket, count in zip(self.buckets + ["inf"], self.counts)},
+        }
+
+
+class LatencyRecorder:
+
+    def __init__(self, buckets=constants.LATENCY_HISTOGRAM_BUCKETS):
+        """
+        Record per-operation latency histograms (one per phase), successes, failures and retries.
+
+        Args:
+            buckets (list): Sorted bucket upper bounds of the histograms, in seconds
+        """
+        self.buckets = buckets
+        self.operations = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def record(self, operation, phases, success=True, retries=0):
+        """
+        Args:
+            operation (str): Operation type, e.g. 'shell dumpsys battery'
+            phases (dict): Phase name to duration in seconds (see PHASES)
+            success (bool): Whether the operation succeeded
+            retries (int): Number of retries (e.g. fallbacks to another backend, or repeated checks)
+        """
+        with self.lock:
+            if operation not in self.operations:
+                self.operations[operation] = {
+                    "successes": 0,
+                    "failures": 0,
+                    "retries": 0,
+                    "phases": {phase: LatencyHistogram(self.buckets) for phase in PHASES},
+                }
+
+            entry = self.operations[operation]
+            entry["successes" if success else "failures"] += 1
+            entry["retries"] += retries
+            for phase, duration in phases.items():
+                entry["phases"][phase].add(duration)
+
+    def reset(self):
+        """
+        Drop all recorded measurements (e.g. at the start of a run).
+        """
+        with self.lock:
+            self.operations = {}
+
+    def get_summary(self):
+        """
+        Returns:
+            dict: Operation to successes, failures, retries and per-phase histograms (see LatencyHistogram.to_dict)
+        """
+        with self.lock:
+            return {
+                operation: {
+                    "successes": entry["successes"],
+                    "failures": entry["failures"],
+                    "retries": entry["retries"],
+                    "phases": {phase: histogram.to_dict() for phase, histogram in entry["phases"].items()},
+                }
+                for operation, entry in sorted(self.operations.items())
+            }
+
+    def save_json(self, filename):
+        """
+        Write the summary (including bucket counts) to a json file.
+
+        Args:
+            filename (str): Output json file
+        """
+        with open(filename, "w") as f:
+            json.dump(self.get_summary(), f, indent=4)
+
+    def save_csv(self, filename):
+        """
+        Write the summary to a csv file, one row per operation and phase (without bucket counts).
+
+        Args:
+            filename (str): Output csv file
+        """
+        with open(filename, "w", newline="") as f:
+            f.write(self.get_csv())
+
+    def get_csv(self):
+        """
+        Returns:
+            str: The summary in csv format, one row per operation and phase (without bucket counts)
+        """
+        f = io.StringIO()
+        writer = csv.writer(f)
+        writer.writerow(["operation", "phase", "successes", "failures", "retries",
+                         "count", "mean", "min", "max", "p50", "p90", "p99"])
+
+        for operation, entry in self.get_summary().items():
+            for phase, histogram in entry["phases"].items():
+                if histogram["count"] == 0:
+                    continue
+                writer.writerow([operation, phase, entry["successes"], entry["failures"], entry["retries"]] +
+                                [histogram[key] for key in ["count", "mean", "min", "max", "p50", "p90", "p99"]])
+
+        return f.getvalue()
+
+    def start_server(self, port=constants.LATENCY_SERVER_DEFAULT_PORT, host="127.0.0.1"):
+        """
+        Expose the live summary over http in a background thread ('/' or '/json' as json, '/csv' as csv).
+
+        Args:
+            port (int): Port to listen to (0 for any free port)
+            host (str): Address to listen to
+
+        Returns:
+            int: Port of the server
+        """
+        if self.server is not None:
+            return self.server.server_address[1]
+
+        recorder = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path in ["/", "/json"]:
+                    body, content_type = json.dumps(recorder.get_summary(), indent=4).encode(), "application/json"
+                elif self.path == "/csv":
+                    body, content_type = recorder.get_csv().encode(), "text/csv"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                blade_logger.logger.debug(f"latency server: {format % args}")
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="latency-server", daemon=True).start()
+
+        return self.server.server_address[1]
+
+    def stop_server(self):
+        """
+        Stop the http server started by start_server().
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# recorder shared by all operations of this process
+recorder = LatencyRecorder()
+
+
+# measure an operation, e.g. `with latencylib.measure("shell dumpsys battery"): ...`. The operation fails if an
+# exception is raised or set_failed is called. Inner layers can attach phases and retries with add_time, set_time
+# and add_retry.
+@contextlib.contextmanager
+def measure(operation):
+
+    measurement = {"phases": {}, "retries": 0, "failed": False}
+    stack = __get_stack()
+    stack.append(measurement)
+
+    start_time = time.perf_counter()
+    success = False
+    try:
+        yield measurement
+        success = not measurement["failed"]
+
+    finally:
+        stack.pop()
+        measurement["phases"]["total"] = time.perf_counter() - start_time
+        record(operation, measurement["phases"], success, measurement["retries"])
+
+
+# decorator measuring every call of a function as operation '<module>.<function>', e.g. 'adblib.install_application'
+def measured(function):
+
+    operation = f"{function.__module__.split('.')[-1]}.{function.__name__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with measure(operation):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+# record a finished operation (e.g. measured outside of measure(), such as in coroutines). The transport phase is
+# derived from the total, spawn and execution phases.
+def record(operation, phases, success=True, retries=0):
+    phases["transport"] = max(phases["total"] - phases.get("spawn", 0) - phases.get("execution", 0), 0)
+    recorder.record(operation, phases, success, retries)
+
+
+# add a duration (in seconds) to a phase of the innermost measurement of this thread, if any
+def add_time(phase, duration):
+    measurement = __get_current()
+    if measurement is not None:
+        measurement["phases"][phase] = measurement["phases"].get(phase, 0) + duration
+
+
+# set the duration (in seconds) of a phase of the innermost measurement of this thread, if any
+def set_time(phase, duration):
+    measurement = __get_current()
+    if measurement is not None:
+        measurement["phases"][phase] = duration
+
+
+# count a retry in the innermost measurement of this thread, if any
+def add_retry():
+    measurement = __get_current()
+    if measurement is not None:
+        measurement["retries"] += 1
+
+
+# mark the innermost measurement of this thread (if any) as failed, for failures that are not raised (e.g. a
+# non-zero exit code that is only logged)
+def set_failed():
+    measurement = __get_current()
+    if measurement is not None:
+        measurement["failed"] = True
+
+
+# record the operations of a block (e.g. a measurement phase) from scratch, and save their summary into
+# output_path as <name>.json and <name>.csv when the block exits (also on errors)
+@contextlib.contextmanager
+def saved(output_path, name):
+
+    recorder.reset()
+    try:
+        yield recorder
+
+    finally:
+        recorder.save_json(os.path.join(output_path, f"{name}.json"))
+        recorder.save_csv(os.path.join(output_path, f"{name}.csv"))
+
+
+def __get_stack():
+    if not hasattr(__local, "stack"):
+        __local.stack = []
+    return __local.stack
+
+
+def __get_current():
+    stack = __get_stack()
+    return stack[-1] if stack else None
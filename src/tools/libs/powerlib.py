@@ -2,8 +2,19 @@
 # Author: Kleomenis Katevas (kkatevas@brave.com)
 # Date:   06/02/2023
 
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from fastparquet import ParquetFile
+from fastparquet import write as write_parquet
+
+from libs import tools
+from libs import constants
 from libs import logger as blade_logger
 
+
 def compute_power_performance(df, timestamp_col='timestamp', current_col='current (mA)', voltage_col='voltage (V)'):
     # input is a df with columns for timestamp, current, voltage
     # column names can be customized via parameters
@@ -39,3 +50,609 @@ def compute_power_performance(df, timestamp_col='timestamp', current_col='curren
     total_discharge_mAh = discharge.sum()  # in mAh
 
     return total_energy_mWh, total_discharge_mAh
+
+
+def read_monsoon_start_time(filename):
+    # returns the epoch start time of a Monsoon capture (or None if unknown).
+    # Parquet captures store it as metadata; otherwise the `.t_monsoon` sync barrier next to the capture is used.
+
+    if filename.endswith(".parquet"):
+        start_time = ParquetFile(filename).key_value_metadata.get("start_time")
+        if start_time:
+            return float(start_time)
+
+    capture_path = os.path.dirname(os.path.abspath(filename))
+    if os.path.exists(os.path.join(capture_path, ".t_monsoon")):
+        return float(tools.read_value_from_file(".t_monsoon", custom_path=capture_path))
+
+    return None
+
+
+def iter_capture_chunks(filename, columns=None, chunk_size=constants.ANALYSIS_CSV_CHUNK_SIZE):
+    # yields a capture (csv or parquet) as a sequence of DataFrames, so that it never needs to fit in memory.
+    # Parquet captures are read one row group at a time, csv captures in chunks of `chunk_size` rows.
+
+    if filename.endswith(".parquet"):
+        parquet_file = ParquetFile(filename)
+        for chunk in parquet_file.iter_row_groups(columns=columns):
+            yield chunk
+
+    elif filename.endswith(".csv"):
+        for chunk in pd.read_csv(filename, usecols=columns, chunksize=chunk_size):
+            yield chunk
+
+    else:
+        blade_logger.logger.error(f"Error: Unsupported capture format: '{filename}'")
+        raise ValueError(f"Unsupported capture format: '{filename}'")
+
+
+def compute_capture_power_performance(filename, timestamp_col=constants.MONSOON_COLUMN_NAMES[0], current_col=constants.MONSOON_COLUMN_NAMES[1], voltage_col=constants.MONSOON_COLUMN_NAMES[2]):
+    # streaming equivalent of compute_power_performance() for a capture file (csv or parquet).
+    # Returns (total_energy_mWh, total_discharge_mAh, duration_sec, samples).
+
+    totals, _ = __integrate_capture(filename, [], timestamp_col, current_col, voltage_col)
+    return totals
+
+
+def compute_capture_power_performance_windows(filename, windows, timestamp_col=constants.MONSOON_COLUMN_NAMES[0], current_col=constants.MONSOON_COLUMN_NAMES[1], voltage_col=constants.MONSOON_COLUMN_NAMES[2]):
+    # as compute_capture_power_performance(), also computing (energy_mWh, discharge_mAh) of the samples within each
+    # (t0, t1) window (capture time, in seconds) as compute_power_performance_between() would, in the same single
+    # pass over the capture (e.g. for all stages of a run).
+    # Returns ((total_energy_mWh, total_discharge_mAh, duration_sec, samples), [(energy_mWh, discharge_mAh), ...]).
+
+    if any(t1 < t0 for t0, t1 in windows):
+        blade_logger.logger.error("Error: t1 must be greater than or equal to t0")
+        raise ValueError("t1 must be greater than or equal to t0")
+
+    return __integrate_capture(filename, windows, timestamp_col, current_col, voltage_col)
+
+
+def compute_power_performance_between(filename, t0, t1, timestamp_col=constants.MONSOON_COLUMN_NAMES[0], current_col=constants.MONSOON_COLUMN_NAMES[1], voltage_col=constants.MONSOON_COLUMN_NAMES[2]):
+    # computes (total_energy_mWh, total_discharge_mAh) of the samples between t0 and t1 (capture time, in seconds).
+    # For Parquet captures, only row groups whose time statistics overlap [t0, t1] are read.
+
+    if t1 < t0:
+        blade_logger.logger.error("Error: t1 must be greater than or equal to t0")
+        raise ValueError("t1 must be greater than or equal to t0")
+
+    columns = [timestamp_col, current_col, voltage_col]
+    chunks = []
+
+    if filename.endswith(".parquet"):
+        parquet_file = ParquetFile(filename)
+        row_groups = __select_row_groups(parquet_file, timestamp_col, t0, t1)
+        blade_logger.logger.debug(f"Reading {len(row_groups)} of {len(parquet_file.row_groups)} row groups")
+        for row_group in row_groups:
+            chunks.append(parquet_file[row_group].to_pandas(columns=columns))
+
+    else:
+        # no statistics available: stream through the capture, stopping once past t1
+        for chunk in iter_capture_chunks(filename, columns=columns):
+            if len(chunk) == 0 or chunk[timestamp_col].iloc[-1] < t0:
+                continue
+            chunks.append(chunk)
+            if chunk[timestamp_col].iloc[-1] > t1:
+                break
+
+    if len(chunks) == 0:
+        return 0.0, 0.0
+
+    df = pd.concat(chunks, ignore_index=True)
+    df = df[(df[timestamp_col] >= t0) & (df[timestamp_col] <= t1)]
+
+    return compute_power_performance(df, timestamp_col=timestamp_col, current_col=current_col, voltage_col=voltage_col)
+
+
+def write_summary_pyramid(filename, resolutions=constants.ANALYSIS_PYRAMID_RESOLUTIONS, output_path=None):
+    # precomputes min/max/mean power and energy per time bin, at several resolutions (in seconds), and stores
+    # them as a sidecar directory of .npy files next to the capture (`<capture>.pyramid`). Returns the sidecar path.
+    # The capture is reduced one chunk at a time: finished bins are appended to the .npy files as they are
+    # produced, and only the last (possibly partial) bin of every tier is carried over to the next chunk.
+
+    if output_path is None:
+        output_path = filename + constants.ANALYSIS_PYRAMID_SUFFIX
+
+    resolutions = sorted(resolutions)
+    columns = constants.MONSOON_COLUMN_NAMES
+    dtypes = [np.int64, np.float64, np.float64, np.float64, np.float64, np.int64]
+    carries = [[np.empty(0, dtype=dtype) for dtype in dtypes] for _ in resolutions]
+    prev_timestamp = None
+
+    tools.ensure_path(output_path, clear=True)
+    writers = [[_NpyWriter(os.path.join(output_path, f"{resolution:g}_{name}.npy"), dtype)
+                for name, dtype in zip(constants.ANALYSIS_PYRAMID_FIELDS, dtypes)] for resolution in resolutions]
+
+    try:
+        for chunk in iter_capture_chunks(filename, columns=columns):
+            if len(chunk) == 0:
+                continue
+
+            timestamps = chunk[columns[0]].to_numpy(dtype=np.float64)
+            power = chunk[columns[1]].to_numpy(dtype=np.float64) * chunk[columns[2]].to_numpy(dtype=np.float64)  # in mW
+            time_diff = np.diff(timestamps, prepend=timestamps[0] if prev_timestamp is None else prev_timestamp)
+            energy = power * time_diff / 3600  # in mWh
+            counts = np.ones(len(power), dtype=np.int64)
+            prev_timestamp = timestamps[-1]
+
+            for i, resolution in enumerate(resolutions):
+                bin_index = np.floor(timestamps / resolution).astype(np.int64)
+                reduced = __merge_bins(bin_index, power, power, power, energy, counts)
+
+                # the carried bin may continue in this chunk: merge it, then keep the new last bin open
+                merged = __merge_bins(*[np.concatenate(values) for values in zip(carries[i], reduced)])
+                for writer, values in zip(writers[i], merged):
+                    writer.append(values[:-1])
+                carries[i] = [values[-1:] for values in merged]
+
+        for tier_writers, carry in zip(writers, carries):
+            for writer, values in zip(tier_writers, carry):
+                writer.append(values)
+
+    finally:
+        for tier_writers in writers:
+            for writer in tier_writers:
+                writer.close()
+
+    with open(os.path.join(output_path, "resolutions.json"), "w", encoding="utf-8") as f:
+        json.dump(resolutions, f)
+
+    return output_path
+
+
+def read_power_envelope(filename, t0, t1, n_points, pyramid_path=None, build=False):
+    # returns the power envelope (min/max/mean power, energy) between t0 and t1 (capture time, in seconds) at n_points,
+    # answered from the coarsest pyramid tier that still resolves them. Empty points (no samples) are omitted.
+    # A missing pyramid is only built (see write_summary_pyramid) if build is set.
+
+    if t1 <= t0 or n_points < 1:
+        blade_logger.logger.error("Error: Envelope requires t1 > t0 and n_points >= 1")
+        raise ValueError("Envelope requires t1 > t0 and n_points >= 1")
+
+    if pyramid_path is None:
+        pyramid_path = filename + constants.ANALYSIS_PYRAMID_SUFFIX
+
+    if not os.path.exists(os.path.join(pyramid_path, "resolutions.json")):
+        if not build:
+            blade_logger.logger.error(f"Error: Summary pyramid not found at '{pyramid_path}'.")
+            raise FileNotFoundError(f"Summary pyramid not found at '{pyramid_path}'")
+
+        blade_logger.logger.info(f"Summary pyramid not found, building it at '{pyramid_path}'...")
+        write_summary_pyramid(filename, output_path=pyramid_path)
+
+    with open(os.path.join(pyramid_path, "resolutions.json"), encoding="utf-8") as f:
+        resolutions = np.array(json.load(f))
+
+    # coarsest tier that is still finer than the requested step (or the finest available)
+    step = (t1 - t0) / n_points
+    sufficient = resolutions[resolutions <= step]
+    resolution = sufficient.max() if len(sufficient) > 0 else resolutions.min()
+
+    # memory-map the tier and only touch the bins between t0 and t1
+    tier = [np.load(os.path.join(pyramid_path, f"{resolution:g}_{name}.npy"), mmap_mode="r") for name in constants.ANALYSIS_PYRAMID_FIELDS]
+    start = np.searchsorted(tier[0], np.floor(t0 / resolution), side="left")
+    end = np.searchsorted(tier[0], np.floor(t1 / resolution), side="right")
+    bin_index, min_power, max_power, sum_power, energy, counts = [np.asarray(values[start:end]) for values in tier]
+
+    point_index = np.clip(((bin_index * resolution - t0) / step).astype(np.int64), 0, n_points - 1)
+    point_index, min_power, max_power, sum_power, energy, counts = __merge_bins(point_index, min_power, max_power, sum_power, energy, counts)
+
+    return pd.DataFrame({
+        "time (sec)": t0 + point_index * step,
+        "min power (mW)": min_power,
+        "max power (mW)": max_power,
+        "mean power (mW)": sum_power / counts,
+        "energy (mWh)": energy,
+        "samples": counts,
+    })
+
+
+def export_power_profile(filename, interval=constants.ANALYSIS_PROFILE_DEFAULT_INTERVAL, output_file=None):
+    # bins a capture into fixed intervals (in seconds) and writes a compact Parquet profile next to it, with
+    # mean power, energy, mean/max current and sample count per bin. Returns the profile filename.
+
+    if interval <= 0:
+        blade_logger.logger.error("Error: Interval must be greater than 0")
+        raise ValueError("Interval must be greater than 0")
+
+    if output_file is None:
+        output_file = get_power_profile_filename(filename, interval)
+
+    columns = constants.MONSOON_COLUMN_NAMES
+    bins = []
+    prev_timestamp = None
+
+    for chunk in iter_capture_chunks(filename, columns=columns):
+        if len(chunk) == 0:
+            continue
+
+        timestamps = chunk[columns[0]].to_numpy(dtype=np.float64)
+        current = chunk[columns[1]].to_numpy(dtype=np.float64)
+        power = current * chunk[columns[2]].to_numpy(dtype=np.float64)  # in mW
+        time_diff = np.diff(timestamps, prepend=timestamps[0] if prev_timestamp is None else prev_timestamp)
+        prev_timestamp = timestamps[-1]
+
+        # integer bin indexes, relative to the first bin of the chunk
+        bin_index = np.floor(timestamps / interval).astype(np.int64)
+        first_bin = bin_index[0]
+        local_index = bin_index - first_bin
+        counts = np.bincount(local_index)
+        occupied = np.flatnonzero(counts)
+
+        starts = np.flatnonzero(np.diff(local_index, prepend=-1))
+        bins.append((
+            occupied + first_bin,
+            counts[occupied],
+            np.bincount(local_index, weights=power)[occupied],
+            np.bincount(local_index, weights=power * time_diff / 3600)[occupied],  # in mWh
+            np.bincount(local_index, weights=current)[occupied],
+            np.maximum.reduceat(current, starts),
+        ))
+
+    if bins:
+        bin_index, counts, sum_power, energy, sum_current, max_current = [np.concatenate(values) for values in zip(*bins)]
+
+        # bins split across chunk boundaries
+        starts = np.flatnonzero(np.diff(bin_index, prepend=bin_index[0] - 1))
+        bin_index = bin_index[starts]
+        counts, sum_power, energy, sum_current = [np.add.reduceat(values, starts) for values in (counts, sum_power, energy, sum_current)]
+        max_current = np.maximum.reduceat(max_current, starts)
+
+    else:
+        bin_index, counts, sum_power, energy, sum_current, max_current = [np.empty(0) for _ in range(6)]
+
+    profile = pd.DataFrame({
+        "time (sec)": bin_index * interval,
+        "mean power (mW)": sum_power / counts,
+        "energy (mWh)": energy,
+        "mean current (mA)": sum_current / counts,
+        "max current (mA)": max_current,
+        "samples": counts.astype(np.int64),
+    })
+    write_parquet(output_file, profile, compression=constants.MONSOON_PARQUET_COMPRESSION, write_index=False)
+
+    return output_file
+
+
+def read_power_profile(filename, interval=constants.ANALYSIS_PROFILE_DEFAULT_INTERVAL):
+    # loads the power profile of a capture at the given interval, exporting it first if needed
+
+    profile_file = get_power_profile_filename(filename, interval)
+    if not os.path.exists(profile_file) or os.path.getmtime(profile_file) < os.path.getmtime(filename):
+        export_power_profile(filename, interval=interval, output_file=profile_file)
+
+    return ParquetFile(profile_file).to_pandas()
+
+
+def get_power_profile_filename(filename, interval):
+    # e.g. measurements_monsoon.parquet -> measurements_monsoon_profile_1s.parquet
+    return f"{os.path.splitext(filename)[0]}_profile_{interval:g}s.parquet"
+
+
+def segment_phases(filename, resolution=constants.ANALYSIS_SEGMENTATION_DEFAULT_RESOLUTION, min_duration=constants.ANALYSIS_SEGMENTATION_DEFAULT_MIN_DURATION, max_phases=constants.ANALYSIS_SEGMENTATION_DEFAULT_MAX_PHASES, penalty=None):
+    # splits a capture into phases of roughly constant power (e.g. boot, idle, app launch, workload, teardown), using
+    # binary segmentation on a decimated power profile (see export_power_profile()). Returns one row per phase with its
+    # time boundaries (capture time, in seconds), mean power, energy, a power level label ('low', 'medium' or 'high')
+    # and whether it is steady. penalty is the minimum cost reduction (in mW^2) for a split; by default it is derived
+    # from the noise level of the profile.
+
+    profile = read_power_profile(filename, interval=resolution)
+    columns = ["phase", "time_start", "time_end", "duration_sec", "mean_power_mW", "std_power_mW", "energy_mWh", "level", "steady"]
+    if len(profile) == 0:
+        return pd.DataFrame(columns=columns)
+
+    power = profile["mean power (mW)"].to_numpy(dtype=np.float64)
+    min_size = max(1, int(np.ceil(min_duration / resolution)))
+
+    if penalty is None:
+        # BIC-like penalty, with the noise variance estimated robustly from first differences
+        sigma = np.median(np.abs(np.diff(power))) / 0.6745 / np.sqrt(2) if len(power) > 1 else 0.0
+        penalty = 2 * np.log(len(power)) * max(sigma ** 2, np.finfo(np.float64).eps)
+
+    boundaries = __binary_segmentation(power, min_size, max_phases, penalty)
+
+    # per-phase statistics, using the exact energy of each bin
+    starts = np.array(boundaries[:-1])
+    ends = np.array(boundaries[1:])
+    times = profile["time (sec)"].to_numpy(dtype=np.float64)
+    energy = np.add.reduceat(profile["energy (mWh)"].to_numpy(dtype=np.float64), starts)
+    mean_power = np.add.reduceat(power, starts) / (ends - starts)
+    std_power = np.sqrt(np.maximum(np.add.reduceat(power ** 2, starts) / (ends - starts) - mean_power ** 2, 0))
+
+    # power level relative to the range of phase means
+    power_range = mean_power.max() - mean_power.min()
+    relative_power = (mean_power - mean_power.min()) / power_range if power_range > 0 else np.zeros(len(mean_power))
+    levels = np.array(["low", "medium", "high"])[np.minimum((relative_power * 3).astype(np.int64), 2)]
+
+    phases = pd.DataFrame({
+        "phase": np.arange(len(starts)),
+        "time_start": times[starts],
+        "time_end": times[ends - 1] + resolution,
+        "mean_power_mW": mean_power,
+        "std_power_mW": std_power,
+        "energy_mWh": energy,
+        "level": levels,
+        "steady": std_power <= constants.ANALYSIS_SEGMENTATION_STEADY_MAX_CV * mean_power,
+    })
+    phases.insert(3, "duration_sec", phases["time_end"] - phases["time_start"])
+
+    return phases[columns]
+
+
+def get_steady_state_windows(phases, min_duration=constants.ANALYSIS_SEGMENTATION_DEFAULT_MIN_DURATION, level=None):
+    # filters the output of segment_phases() down to steady phases lasting at least min_duration seconds,
+    # optionally of a given power level ('low', 'medium' or 'high')
+
+    windows = phases[phases["steady"] & (phases["duration_sec"] >= min_duration)]
+    if level is not None:
+        windows = windows[windows["level"] == level]
+
+    return windows
+
+
+def normalize_timestamps(df, source, timestamp_col=None, start_time=None):
+    # returns a copy of df with its timestamps converted into a float 'timestamp' column in epoch seconds.
+    # source is one of 'adb' (epoch seconds), 'memory' (epoch milliseconds) or 'monsoon' (seconds since start_time).
+
+    if source == "adb":
+        timestamp_col = timestamp_col or "timestamp"
+        timestamps = df[timestamp_col].to_numpy(dtype=np.float64)
+
+    elif source == "memory":
+        timestamp_col = timestamp_col or "timestamp"
+        timestamps = df[timestamp_col].to_numpy(dtype=np.float64) / 1000
+
+    elif source == "monsoon":
+        timestamp_col = timestamp_col or constants.MONSOON_COLUMN_NAMES[0]
+        if start_time is None:
+            blade_logger.logger.error("Error: Monsoon timestamps require the capture's start_time")
+            raise ValueError("Monsoon timestamps require the capture's start_time")
+        timestamps = df[timestamp_col].to_numpy(dtype=np.float64) + start_time
+
+    else:
+        blade_logger.logger.error(f"Error: Unknown timestamp source: '{source}'")
+        raise ValueError(f"Unknown timestamp source: '{source}'")
+
+    df = df.drop(columns=[timestamp_col])
+    df.insert(0, "timestamp", timestamps)
+    return df
+
+
+def asof_join(target_times, source_times, source_values, method="previous", tolerance=None):
+    # aligns source_values (1d or 2d, one row per source time) onto target_times. Both time arrays must be sorted.
+    # method is one of 'previous' (last sample at or before), 'next', 'nearest' or 'linear' (interpolation).
+    # Target times without a matching sample (or further than tolerance seconds from it) are set to NaN.
+
+    target_times = np.asarray(target_times, dtype=np.float64)
+    source_times = np.asarray(source_times, dtype=np.float64)
+    source_values = np.asarray(source_values, dtype=np.float64)
+    n_sources = len(source_times)
+
+    if n_sources == 0:
+        return np.full((len(target_times),) + source_values.shape[1:], np.nan)
+
+    if method == "previous":
+        index = np.searchsorted(source_times, target_times, side="right") - 1
+        invalid = index < 0
+        index = np.clip(index, 0, n_sources - 1)
+        distance = None if tolerance is None else target_times - source_times[index]
+
+    elif method == "next":
+        index = np.searchsorted(source_times, target_times, side="left")
+        invalid = index >= n_sources
+        index = np.clip(index, 0, n_sources - 1)
+        distance = None if tolerance is None else source_times[index] - target_times
+
+    elif method in ("nearest", "linear"):
+        lower = np.clip(np.searchsorted(source_times, target_times, side="right") - 1, 0, n_sources - 1)
+        upper = np.minimum(lower + 1, n_sources - 1)
+        lower_distance = np.abs(target_times - source_times[lower])
+        upper_distance = np.abs(source_times[upper] - target_times)
+
+        if method == "nearest":
+            use_upper = upper_distance < lower_distance
+            index = np.where(use_upper, upper, lower)
+            distance = np.where(use_upper, upper_distance, lower_distance)
+            invalid = np.zeros(len(target_times), dtype=bool)
+
+        else:
+            # interpolate between the surrounding samples, only within the source time range
+            span = source_times[upper] - source_times[lower]
+            weight = np.divide(target_times - source_times[lower], span, out=np.zeros_like(span), where=span > 0)
+            weight = weight.reshape((-1,) + (1,) * (source_values.ndim - 1))
+            lower_values = source_values[lower]
+            result = lower_values + weight * (source_values[upper] - lower_values)
+
+            invalid = (target_times < source_times[0]) | (target_times > source_times[-1])
+            if tolerance is not None:
+                invalid |= np.minimum(lower_distance, upper_distance) > tolerance
+            if invalid.any():
+                result[invalid] = np.nan
+            return result
+
+    else:
+        blade_logger.logger.error(f"Error: Unknown as-of join method: '{method}'")
+        raise ValueError(f"Unknown as-of join method: '{method}'")
+
+    result = source_values[index]
+    if tolerance is not None:
+        invalid |= distance > tolerance
+    if invalid.any():
+        result[invalid] = np.nan
+    return result
+
+
+def align_measurements(timeline, measurements, method="previous", tolerance=None):
+    # as-of joins several measurement streams onto a common timeline (epoch seconds, sorted).
+    # measurements maps a name (e.g. 'adb', 'memory') to a DataFrame with a 'timestamp' column in epoch
+    # seconds (see normalize_timestamps()). Columns are prefixed by the stream's name in the result.
+
+    aligned = pd.DataFrame({"timestamp": np.asarray(timeline, dtype=np.float64)})
+
+    for name, df in measurements.items():
+        df = df.sort_values("timestamp", kind="stable")
+        value_cols = [column for column in df.columns if column != "timestamp"]
+        values = df[value_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        joined = asof_join(aligned["timestamp"].to_numpy(), df["timestamp"].to_numpy(), values, method=method, tolerance=tolerance)
+
+        for column_index, column in enumerate(value_cols):
+            aligned[f"{name}_{column}"] = joined[:, column_index]
+
+    return aligned
+
+
+def __integrate_capture(filename, windows, timestamp_col, current_col, voltage_col):
+    # single streaming pass over a capture, integrating energy and discharge over the whole capture and over each
+    # (t0, t1) window. Every sample integrates the interval since the previous sample, so the first sample within
+    # a window (whose interval starts before t0) is not counted, as in compute_power_performance_between().
+
+    columns = [timestamp_col, current_col, voltage_col]
+
+    total_energy_mWh = 0.0
+    total_discharge_mAh = 0.0
+    first_timestamp = None
+    prev_timestamp = None
+    samples = 0
+
+    window_starts = np.array([t0 for t0, _ in windows], dtype=np.float64)
+    window_ends = np.array([t1 for _, t1 in windows], dtype=np.float64)
+    window_energy = np.zeros(len(windows))
+    window_discharge = np.zeros(len(windows))
+
+    for chunk in iter_capture_chunks(filename, columns=columns):
+        if len(chunk) == 0:
+            continue
+
+        timestamps = chunk[timestamp_col].to_numpy(dtype=np.float64)
+        current = chunk[current_col].to_numpy(dtype=np.float64)
+        voltage = chunk[voltage_col].to_numpy(dtype=np.float64)
+
+        # carry the last timestamp of the previous chunk over, so that chunk boundaries are integrated too
+        prev_timestamps = np.concatenate(([timestamps[0] if prev_timestamp is None else prev_timestamp], timestamps[:-1]))
+        time_diff = timestamps - prev_timestamps
+        if np.any(time_diff < 0):
+            blade_logger.logger.error("Timestamps are not in increasing order")
+            raise ValueError("Timestamps are not in increasing order")
+        time_diff /= 3600  # in hours
+
+        energy = current * voltage * time_diff  # in mWh
+        discharge = current * time_diff  # in mAh
+        total_energy_mWh += energy.sum()
+        total_discharge_mAh += discharge.sum()
+
+        if len(windows) > 0:
+            # samples [start, end) of the chunk within each window, using cumulative sums (timestamps are sorted)
+            start = np.searchsorted(timestamps, window_starts, side="left")
+            end = np.searchsorted(timestamps, window_ends, side="right")
+            start += (start < len(timestamps)) & (prev_timestamps[np.minimum(start, len(timestamps) - 1)] < window_starts)
+            start = np.minimum(start, end)
+
+            cumulative_energy = np.concatenate(([0.0], np.cumsum(energy)))
+            cumulative_discharge = np.concatenate(([0.0], np.cumsum(discharge)))
+            window_energy += cumulative_energy[end] - cumulative_energy[start]
+            window_discharge += cumulative_discharge[end] - cumulative_discharge[start]
+
+        if first_timestamp is None:
+            first_timestamp = timestamps[0]
+        prev_timestamp = timestamps[-1]
+        samples += len(timestamps)
+
+    duration = 0.0 if first_timestamp is None else prev_timestamp - first_timestamp
+
+    totals = (total_energy_mWh, total_discharge_mAh, duration, samples)
+    return totals, list(zip(window_energy.tolist(), window_discharge.tolist()))
+
+
+def __select_row_groups(parquet_file, timestamp_col, t0, t1):
+    # returns the indexes of the row groups overlapping [t0, t1]. Row groups without statistics are always selected.
+    statistics = parquet_file.statistics
+    min_times = np.array([np.nan if value is None else value for value in statistics["min"][timestamp_col]], dtype=np.float64)
+    max_times = np.array([np.nan if value is None else value for value in statistics["max"][timestamp_col]], dtype=np.float64)
+
+    return np.flatnonzero(~(max_times < t0) & ~(min_times > t1)).tolist()
+
+
+def __binary_segmentation(values, min_size, max_segments, penalty):
+    # greedy binary segmentation minimizing the squared error to each segment's mean.
+    # Returns the segment boundaries (indexes, including 0 and len(values)).
+    cumsum = np.concatenate([[0.0], np.cumsum(values)])
+    cumsum_sq = np.concatenate([[0.0], np.cumsum(values ** 2)])
+
+    def cost(start, end):
+        # squared error of values[start:end] (vectorized over numpy arrays of start/end)
+        n = end - start
+        total = cumsum[end] - cumsum[start]
+        return (cumsum_sq[end] - cumsum_sq[start]) - total ** 2 / n
+
+    def best_split(start, end):
+        # returns (gain, split) of the best split of values[start:end], or (0, None) if too short
+        if end - start < 2 * min_size:
+            return 0.0, None
+        splits = np.arange(start + min_size, end - min_size + 1)
+        split_costs = cost(start, splits) + cost(splits, end)
+        best = np.argmin(split_costs)
+        return cost(start, end) - split_costs[best], splits[best]
+
+    boundaries = [0, len(values)]
+    candidates = {(0, len(values)): best_split(0, len(values))}
+
+    while len(boundaries) - 1 < max_segments:
+        (start, end), (gain, split) = max(candidates.items(), key=lambda item: item[1][0])
+        if split is None or gain <= penalty:
+            break
+
+        del candidates[(start, end)]
+        candidates[(start, split)] = best_split(start, split)
+        candidates[(split, end)] = best_split(split, end)
+        boundaries.append(int(split))
+        boundaries.sort()
+
+    return boundaries
+
+
+def __merge_bins(bin_index, min_values, max_values, sum_values, energy, counts):
+    # reduces consecutive entries that share the same (sorted) bin index
+    if len(bin_index) == 0:
+        return bin_index, min_values, max_values, sum_values, energy, counts
+
+    starts = np.flatnonzero(np.diff(bin_index, prepend=bin_index[0] - 1))
+    return (
+        bin_index[starts],
+        np.minimum.reduceat(min_values, starts),
+        np.maximum.reduceat(max_values, starts),
+        np.add.reduceat(sum_values, starts),
+        np.add.reduceat(energy, starts),
+        np.add.reduceat(counts, starts),
+    )
+
+
+class _NpyWriter:
+
+    # 1-D .npy file written incrementally: the header is rewritten with the final length on close. numpy pads the
+    # header so that the length can grow in place (see numpy.lib.format).
+    def __init__(self, filename, dtype):
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.file = open(filename, "wb")
+        self.header_size = self.__write_header()
+
+    def append(self, values):
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.length += len(values)
+
+    def close(self):
+        if self.file.closed:
+            return
+
+        self.file.seek(0)
+        if self.__write_header() != self.header_size:
+            self.file.close()
+            raise ValueError(f"Could not update the header of '{self.file.name}'")
+        self.file.close()
+
+    def __write_header(self):
+        start = self.file.tell()
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (self.length,)}
+        np.lib.format.write_array_header_1_0(self.file, header)
+        size = self.file.tell() - start
+        self.file.seek(0, os.SEEK_END)
+        return size
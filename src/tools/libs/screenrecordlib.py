@@ -0,0 +1,330 @@
+# Note:   Continuous screen recording streamed to the host (`screenrecord` over exec-out) into rolling H.264 segments
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import csv
+import os
+import socket
+import subprocess
+import threading
+import time
+
+from libs import tools
+from libs import constants
+from libs import logger as blade_logger
+
+# H.264 NAL unit types (see ITU-T H.264, Table 7-1)
+NAL_TYPE_SLICE = 1
+NAL_TYPE_IDR_SLICE = 5
+NAL_TYPE_SPS = 7
+NAL_TYPE_PPS = 8
+
+START_CODE = b"\x00\x00\x00\x01"
+
+
+class ScreenRecorder:
+
+    def __init__(self, adb_identifier, output_path, prefix="screenrecord",
+                 segment_duration=constants.SCREEN_RECORD_DEFAULT_SEGMENT_DURATION,
+                 max_segments=constants.SCREEN_RECORD_DEFAULT_MAX_SEGMENTS,
+                 bit_rate=None, size=None, client=None):
+        """
+        Record the device screen continuously, streaming raw H.264 from `screenrecord` to the host
+        (nothing is written to the device storage).
+
+        The stream is split into segments of about segment_duration seconds (`<prefix>_<index>.h264`),
+        each starting at a key frame with the stream's SPS/PPS so that it can be decoded on its own.
+        Every segment has an index (`<prefix>_<index>.csv`) with the host arrival time and byte offset of
+        each frame. Only the last max_segments segments are kept. `screenrecord` is restarted when it
+        reaches its time limit.
+
+        Args:
+            adb_identifier (str): Device serial or ip:port
+            output_path (str): Folder of the segments
+            prefix (str): Filename prefix of the segments
+            segment_duration (float): Target duration of a segment, in seconds
+            max_segments (int): Number of segments kept (older ones are deleted), or None to keep all
+            bit_rate (int, optional): Video bit rate in bits per second (screenrecord --bit-rate)
+            size (str, optional): Video size, e.g. '720x1280' (screenrecord --size)
+            client (adbclientlib.AdbClient, optional): Stream over the adb server protocol instead of the adb binary
+        """
+        self.adb_identifier = adb_identifier
+        self.output_path = output_path
+        self.prefix = prefix
+        self.segment_duration = segment_duration
+        self.max_segments = max_segments
+        self.client = client
+
+        self.command = "screenrecord --output-format=h264"
+        if bit_rate is not None:
+            self.command += f" --bit-rate {int(bit_rate)}"
+        if size is not None:
+            self.command += f" --size {size}"
+        self.command += " -"
+
+        self.thread = None
+        self.stream = None
+        self.stream_lock = threading.Lock()  # guards replacing the stream against stop()
+        self.recording = False
+        self.segments = []
+        self.frames = 0
+
+    def start(self):
+        """
+        Start recording in a background thread.
+        """
+        if self.recording:
+            blade_logger.logger.warning("Warning: Screen recording already started.")
+            return
+
+        tools.ensure_path(self.output_path)
+        self.recording = True
+        self.thread = threading.Thread(target=self.__record, name="screen-recorder", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=constants.SCREEN_RECORD_STOP_TIMEOUT):
+        """
+        Stop recording and close the current segment.
+
+        Returns:
+            list: Filenames of the kept segments, oldest first
+        """
+        with self.stream_lock:
+            self.recording = False
+            if self.stream is not None:
+                self.stream.close()
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                blade_logger.logger.warning("Warning: Screen recording did not stop in time.")
+            self.thread = None
+
+        return list(self.segments)
+
+    def __record(self):
+
+        writer = _SegmentWriter(self)
+        try:
+            while self.recording:
+                stream = _open_stream(self.adb_identifier, self.command, self.client)
+
+                # stop() may have been called while the stream was opening
+                with self.stream_lock:
+                    if not self.recording:
+                        stream.close()
+                        break
+                    self.stream = stream
+
+                try:
+                    self.__read_stream(stream, writer)
+                finally:
+                    with self.stream_lock:
+                        self.stream = None
+                    stream.close()
+
+                # screenrecord reached its time limit (or the device went away)
+                if self.recording:
+                    blade_logger.logger.info("screenrecord exited, restarting.")
+                    time.sleep(constants.ADB_COMMANDS_EXECUTION_TIMEOUT)
+
+        except Exception as e:
+            blade_logger.logger.error(f"Error: Screen recording failed: {e}")
+            self.recording = False
+
+        finally:
+            writer.close()
+
+    def __read_stream(self, stream, writer):
+
+        splitter = _NalUnitSplitter()
+        while True:
+            chunk = stream.read(constants.SCREEN_RECORD_READ_SIZE)
+            if not chunk:
+                break
+
+            # a NAL unit is complete once the next start code arrives
+            for nal_unit in splitter.feed(chunk):
+                writer.write(nal_unit, time.time())
+
+        # the last NAL unit is complete once the stream ends
+        for nal_unit in splitter.flush():
+            writer.write(nal_unit, time.time())
+
+
+class _SegmentWriter:
+
+    # writes NAL units into rolling segment files and their frame indexes
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.index = 0
+        self.file = None
+        self.index_file = None
+        self.index_writer = None
+        self.offset = 0
+        self.segment_start_time = None
+        self.parameter_sets = {}  # NAL type (SPS/PPS) -> latest NAL unit
+
+    def write(self, nal_unit, timestamp):
+
+        nal_type = nal_unit[0] & 0x1F
+        if nal_type in [NAL_TYPE_SPS, NAL_TYPE_PPS]:
+            # a new stream (e.g. after a restart) starts with new parameter sets: start a new segment at its key frame
+            if nal_type == NAL_TYPE_SPS and nal_unit != self.parameter_sets.get(NAL_TYPE_SPS):
+                self.segment_start_time = None
+            self.parameter_sets[nal_type] = nal_unit
+            return
+
+        if nal_type == NAL_TYPE_IDR_SLICE and self.__segment_expired(timestamp):
+            self.__open_segment(timestamp)
+
+        # frames before the first key frame cannot be decoded
+        if self.file is None:
+            return
+
+        if nal_type in [NAL_TYPE_SLICE, NAL_TYPE_IDR_SLICE]:
+            self.index_writer.writerow([timestamp, self.offset, int(nal_type == NAL_TYPE_IDR_SLICE)])
+            self.recorder.frames += 1
+
+        self.file.write(START_CODE)
+        self.file.write(nal_unit)
+        self.offset += len(START_CODE) + len(nal_unit)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.index_file.close()
+            self.file = None
+
+    def __segment_expired(self, timestamp):
+        return self.segment_start_time is None or timestamp - self.segment_start_time >= self.recorder.segment_duration
+
+    def __open_segment(self, timestamp):
+
+        self.close()
+        self.index += 1
+        filename = os.path.join(self.recorder.output_path, f"{self.recorder.prefix}_{self.index:05d}.h264")
+        self.file = open(filename, "wb")
+        self.index_file = open(filename[:-len(".h264")] + ".csv", "w", newline="")
+        self.index_writer = csv.writer(self.index_file)
+        self.index_writer.writerow(["timestamp", "offset", "keyframe"])
+        self.offset = 0
+        self.segment_start_time = timestamp
+
+        # make the segment decodable on its own
+        for nal_type in [NAL_TYPE_SPS, NAL_TYPE_PPS]:
+            if nal_type in self.parameter_sets:
+                self.file.write(START_CODE + self.parameter_sets[nal_type])
+                self.offset += len(START_CODE) + len(self.parameter_sets[nal_type])
+
+        # drop the oldest segments
+        self.recorder.segments.append(filename)
+        max_segments = self.recorder.max_segments
+        while max_segments is not None and len(self.recorder.segments) > max_segments:
+            oldest = self.recorder.segments.pop(0)
+            for path in [oldest, oldest[:-len(".h264")] + ".csv"]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class _ProcessStream:
+
+    # stdout of an `adb exec-out` process
+    def __init__(self, adb_identifier, command):
+        self.process = subprocess.Popen(["adb", "-s", adb_identifier, "exec-out", command], stdout=subprocess.PIPE)
+
+    def read(self, size):
+        return self.process.stdout.read1(size)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(constants.SCREEN_RECORD_STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class _SocketStream:
+
+    # exec stream of the adb server protocol (see adbclientlib.AdbClient.open_exec_stream)
+    def __init__(self, client, adb_identifier, command):
+        self.sock = client.open_exec_stream(adb_identifier, command)
+
+    def read(self, size):
+        try:
+            return self.sock.recv(size)
+        except OSError:
+            return b""
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+# open a stream of the raw stdout of a device command
+def _open_stream(adb_identifier, command, client=None):
+    if client is not None:
+        return _SocketStream(client, adb_identifier, command)
+    return _ProcessStream(adb_identifier, command)
+
+
+class _NalUnitSplitter:
+
+    # splits an Annex B byte stream, read in chunks, into NAL units (without start codes). Chunks are appended to a
+    # single buffer and the search for start codes resumes where the previous one stopped, so that a large NAL unit
+    # (e.g. a key frame spanning many chunks) is neither copied nor scanned again for every chunk.
+    def __init__(self):
+        self.buffer = bytearray()
+        self.start = -1  # position of the start code of the current NAL unit, or -1 before the first one
+        self.search_offset = 0
+
+    # returns the NAL units completed by a chunk
+    def feed(self, chunk):
+
+        self.buffer += chunk
+        nal_units = []
+        while True:
+            position = self.buffer.find(b"\x00\x00\x01", self.search_offset)
+            if position == -1:
+                break
+
+            if self.start != -1:
+                self.__append_nal_unit(nal_units, position)
+            self.start = position
+            self.search_offset = position + 3
+
+        # a start code may span the end of the chunk
+        self.search_offset = max(len(self.buffer) - 2, self.start + 3 if self.start != -1 else 0)
+
+        # drop the bytes of the completed NAL units (or before the first start code)
+        consumed = self.start if self.start != -1 else self.search_offset
+        if consumed > 0:
+            del self.buffer[:consumed]
+            self.search_offset -= consumed
+            if self.start != -1:
+                self.start = 0
+
+        return nal_units
+
+    # returns the last NAL unit, complete once the stream ends
+    def flush(self):
+
+        nal_units = []
+        if self.start != -1:
+            self.__append_nal_unit(nal_units, len(self.buffer))
+
+        self.buffer = bytearray()
+        self.start = -1
+        self.search_offset = 0
+        return nal_units
+
+    def __append_nal_unit(self, nal_units, end):
+
+        # zero bytes before the next 3-byte start code belong to it (4-byte start codes)
+        nal_unit = bytes(self.buffer[self.start + 3:end]).rstrip(b"\x00")
+        if nal_unit:
+            nal_units.append(nal_unit)
@@ -0,0 +1,187 @@
+# Note:   Statistics for comparing runs (bootstrap confidence intervals and permutation tests)
+# Author: Kleomenis Katevas (kkatevas@brave.com)
+# Date:   19/10/2026
+
+import numpy as np
+import pandas as pd
+
+from libs import constants
+from libs import logger as blade_logger
+
+
+def bootstrap_ci(samples, statistic=np.mean, n_resamples=constants.STATS_DEFAULT_RESAMPLES, confidence=constants.STATS_DEFAULT_CONFIDENCE, seed=None):
+    """
+    Compute a percentile bootstrap confidence interval of a statistic.
+
+    Resamples are drawn as index matrices (one resample per row) and reduced in batches.
+
+    Args:
+        samples (array-like): Observations (e.g. energy of each repetition)
+        statistic (callable): Vectorized statistic accepting an 'axis' argument (e.g. np.mean, np.median)
+        n_resamples (int): Number of bootstrap resamples
+        confidence (float): Confidence level of the interval
+        seed (int, optional): Seed for reproducible resampling
+
+    Returns:
+        tuple: (estimate, ci_low, ci_high)
+    """
+    samples = __as_samples(samples)
+    rng = np.random.default_rng(seed)
+
+    resampled = np.empty(n_resamples)
+    for start, end in __batches(n_resamples, len(samples)):
+        indexes = rng.integers(0, len(samples), size=(end - start, len(samples)))
+        resampled[start:end] = statistic(samples[indexes], axis=1)
+
+    ci_low, ci_high = __percentile_interval(resampled, confidence)
+    return statistic(samples), ci_low, ci_high
+
+
+def bootstrap_diff_ci(a, b, statistic=np.mean, n_resamples=constants.STATS_DEFAULT_RESAMPLES, confidence=constants.STATS_DEFAULT_CONFIDENCE, seed=None):
+    """
+    Compute a percentile bootstrap confidence interval of statistic(a) - statistic(b).
+
+    Both groups are resampled independently, as matrices, and reduced in batches.
+
+    Args:
+        a (array-like): Observations of the first group
+        b (array-like): Observations of the second group (e.g. the baseline)
+        statistic (callable): Vectorized statistic accepting an 'axis' argument (e.g. np.mean, np.median)
+        n_resamples (int): Number of bootstrap resamples
+        confidence (float): Confidence level of the interval
+        seed (int, optional): Seed for reproducible resampling
+
+    Returns:
+        tuple: (difference, ci_low, ci_high)
+    """
+    a = __as_samples(a)
+    b = __as_samples(b)
+    rng = np.random.default_rng(seed)
+
+    resampled = np.empty(n_resamples)
+    for start, end in __batches(n_resamples, len(a) + len(b)):
+        indexes_a = rng.integers(0, len(a), size=(end - start, len(a)))
+        indexes_b = rng.integers(0, len(b), size=(end - start, len(b)))
+        resampled[start:end] = statistic(a[indexes_a], axis=1) - statistic(b[indexes_b], axis=1)
+
+    ci_low, ci_high = __percentile_interval(resampled, confidence)
+    return statistic(a) - statistic(b), ci_low, ci_high
+
+
+def permutation_test(a, b, statistic=np.mean, n_permutations=constants.STATS_DEFAULT_RESAMPLES, alternative="two-sided", seed=None):
+    """
+    Test whether statistic(a) - statistic(b) differs from zero, by permuting the group labels.
+
+    Permutations are drawn as matrices (one shuffled copy of the pooled observations per row) and reduced in batches.
+
+    Args:
+        a (array-like): Observations of the first group
+        b (array-like): Observations of the second group (e.g. the baseline)
+        statistic (callable): Vectorized statistic accepting an 'axis' argument (e.g. np.mean, np.median)
+        n_permutations (int): Number of random permutations
+        alternative (str): 'two-sided', 'greater' (a > b) or 'less' (a < b)
+        seed (int, optional): Seed for reproducible permutations
+
+    Returns:
+        tuple: (observed_difference, p_value)
+    """
+    if alternative not in ["two-sided", "greater", "less"]:
+        blade_logger.logger.error(f"Error: Unknown alternative: '{alternative}'")
+        raise ValueError(f"Unknown alternative: '{alternative}'")
+
+    a = __as_samples(a)
+    b = __as_samples(b)
+    rng = np.random.default_rng(seed)
+    pooled = np.concatenate([a, b])
+    observed = statistic(a) - statistic(b)
+
+    extreme = 0
+    for start, end in __batches(n_permutations, len(pooled)):
+        permuted = rng.permuted(np.broadcast_to(pooled, (end - start, len(pooled))), axis=1)
+        differences = statistic(permuted[:, :len(a)], axis=1) - statistic(permuted[:, len(a):], axis=1)
+
+        if alternative == "two-sided":
+            extreme += np.count_nonzero(np.abs(differences) >= abs(observed))
+        elif alternative == "greater":
+            extreme += np.count_nonzero(differences >= observed)
+        else:
+            extreme += np.count_nonzero(differences <= observed)
+
+    # include the observed labelling, so that the p-value is never zero
+    p_value = (extreme + 1) / (n_permutations + 1)
+    return observed, p_value
+
+
+def compare_groups(df, group_col, value_col, baseline, statistic=np.mean, n_resamples=constants.STATS_DEFAULT_RESAMPLES, confidence=constants.STATS_DEFAULT_CONFIDENCE, seed=None):
+    """
+    Compare every group of a summary table against a baseline group (e.g. browsers against Brave).
+
+    Args:
+        df (pandas.DataFrame): Table with one row per repetition (e.g. the campaign summary)
+        group_col (str): Column identifying the group (e.g. browser)
+        value_col (str): Column to compare (e.g. 'energy_mWh')
+        baseline: Value of group_col used as baseline
+        statistic (callable): Vectorized statistic accepting an 'axis' argument (e.g. np.mean, np.median)
+        n_resamples (int): Number of bootstrap resamples and random permutations
+        confidence (float): Confidence level of the intervals
+        seed (int, optional): Seed for reproducible resampling
+
+    Returns:
+        pandas.DataFrame: One row per non-baseline group, with the difference to the baseline, its
+                          confidence interval, the relative difference and the permutation test p-value
+    """
+    groups = {group: values[value_col].dropna().to_numpy() for group, values in df.groupby(group_col, sort=True)}
+    if baseline not in groups:
+        blade_logger.logger.error(f"Error: Baseline '{baseline}' not found in column '{group_col}'")
+        raise ValueError(f"Baseline '{baseline}' not found in column '{group_col}'")
+
+    baseline_values = groups[baseline]
+    baseline_statistic = statistic(baseline_values)
+
+    rows = []
+    for group, values in groups.items():
+        if group == baseline:
+            continue
+
+        difference, ci_low, ci_high = bootstrap_diff_ci(values, baseline_values, statistic=statistic, n_resamples=n_resamples, confidence=confidence, seed=seed)
+        _, p_value = permutation_test(values, baseline_values, statistic=statistic, n_permutations=n_resamples, seed=seed)
+
+        rows.append({
+            group_col: group,
+            "n": len(values),
+            "value": statistic(values),
+            "baseline_n": len(baseline_values),
+            "baseline_value": baseline_statistic,
+            "difference": difference,
+            "ci_low": ci_low,
+            "ci_high": ci_high,
+            "relative_difference": difference / baseline_statistic if baseline_statistic != 0 else np.nan,
+            "p_value": p_value,
+        })
+
+    return pd.DataFrame(rows)
+
+
+def __as_samples(samples):
+    # converts observations into a 1d float array, dropping NaNs
+    samples = np.asarray(samples, dtype=np.float64).ravel()
+    samples = samples[~np.isnan(samples)]
+
+    if len(samples) == 0:
+        blade_logger.logger.error("Error: At least one observation is required")
+        raise ValueError("At least one observation is required")
+
+    return samples
+
+
+def __batches(n_resamples, n_samples):
+    # yields (start, end) ranges of resamples, so that a batch matrix stays below STATS_MAX_BATCH_ELEMENTS
+    batch_size = max(1, constants.STATS_MAX_BATCH_ELEMENTS // max(1, n_samples))
+    for start in range(0, n_resamples, batch_size):
+        yield start, min(start + batch_size, n_resamples)
+
+
+def __percentile_interval(resampled, confidence):
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(resampled, [alpha, 1 - alpha])
+    return ci_low, ci_high
@@ -1,7 +1,10 @@
 import os
 import socket
 import shutil
+import time
 
+from libs import constants
+from libs import latencylib
 from libs import logger as blade_logger
 
 GLOBAL_PID_FILES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../../.pid_files/")
@@ -63,3 +66,43 @@ def get_local_ip():
     ip = s.getsockname()[0]
     s.close()
     return ip
+
+
+def wait_until(predicate, timeout=constants.WAIT_UNTIL_DEFAULT_TIMEOUT, interval=constants.WAIT_UNTIL_DEFAULT_INTERVAL,
+               backoff=constants.WAIT_UNTIL_DEFAULT_BACKOFF, max_interval=constants.WAIT_UNTIL_DEFAULT_MAX_INTERVAL,
+               exceptions=()):
+    """
+    Poll a predicate until it returns a truthy value or the deadline passes.
+
+    The first check happens immediately. The interval between checks grows by `backoff` after
+    every check (up to `max_interval`), and the last sleep is shortened to the deadline.
+
+    Args:
+        predicate (callable): Function without arguments, e.g. checking a device state
+        timeout (float): Deadline in seconds
+        interval (float): Initial interval between checks, in seconds
+        backoff (float): Multiplier applied to the interval after every check
+        max_interval (float): Maximum interval between checks, in seconds
+        exceptions (tuple): Exception types raised by the predicate that count as 'not yet' (e.g. a transport not yet available)
+
+    Returns:
+        The last value returned by the predicate (falsy if the deadline passed).
+    """
+    deadline = time.monotonic() + timeout
+    result = None
+
+    while True:
+        try:
+            result = predicate()
+        except exceptions as e:
+            blade_logger.logger.debug(f"wait_until: predicate raised {type(e).__name__}: {e}")
+            result = None
+
+        remaining_time = deadline - time.monotonic()
+        if result or remaining_time <= 0:
+            return result
+
+        # repeated checks count as retries of the operation being measured, if any (see latencylib.measure)
+        latencylib.add_retry()
+        time.sleep(min(interval, remaining_time))
+        interval = min(interval * backoff, max_interval)